@@ -0,0 +1,34 @@
+"""
+ASR 引擎状态 API - 实时率、内存占用、自适应解码档位、批量调度、工作进程和管线耗时
+"""
+from fastapi import APIRouter, HTTPException
+import logging
+
+from services.asr_engines import ASR_ENGINES
+from services.transcription_service import transcription_service
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/api/admin/asr/stats")
+async def get_asr_stats():
+    """
+    获取当前 ASR 引擎统计（实时率、内存占用、支持的解码参数）、自适应解码档位及切换记录，
+    以及推理调度、工作进程池、管线各阶段耗时
+    """
+    try:
+        return {
+            "success": True,
+            "engine": transcription_service.asr_engine.get_stats(),
+            "available_engines": list(ASR_ENGINES),
+            "decoding_policy": transcription_service.decoding_policy.get_stats(),
+            "scheduler": transcription_service.inference_scheduler.get_stats(),
+            "workers": transcription_service.worker_pool.get_stats() if transcription_service.worker_pool else None,
+            "pipeline": transcription_service.pipeline.get_stats(),
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Error getting ASR stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,82 @@
+"""
+翻译缓存管理 API - 查看统计、预热和清空
+"""
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+import logging
+
+from services.transcription_service import transcription_service
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class CacheEntry(BaseModel):
+    """预热条目"""
+    source: str  # 中文原文
+    translation: Optional[str] = None  # 已知译文；为空时调用翻译并缓存结果
+
+
+class WarmCacheRequest(BaseModel):
+    """预热请求"""
+    entries: List[CacheEntry]
+
+
+@router.get("/api/admin/translation-cache/stats")
+async def get_translation_cache_stats():
+    """
+    获取翻译缓存命中统计
+    """
+    try:
+        stats = await transcription_service.translation_cache.get_stats()
+        return {"success": True, "stats": stats}
+
+    except Exception as e:
+        logger.error(f"❌ Error getting translation cache stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/admin/translation-cache/warm")
+async def warm_translation_cache(request: WarmCacheRequest):
+    """
+    预热翻译缓存
+
+    带译文的条目直接写入；只有原文的条目调用翻译（命中缓存的不会重复请求）
+    """
+    try:
+        known = [(entry.source, entry.translation) for entry in request.entries if entry.translation]
+        await transcription_service.translation_cache.put_many(known)
+
+        # 并发提交，由翻译批处理器合并为少量请求
+        pending = [entry.source for entry in request.entries if not entry.translation]
+        results = await asyncio.gather(*[
+            transcription_service.translate_to_english(source, 'zh') for source in pending
+        ])
+        # 失败的翻译返回 None，不会写入缓存，不计入
+        translated = sum(result is not None for result in results)
+        failed = len(pending) - translated
+
+        logger.info(f"🔥 Translation cache warmed: {len(known)} stored, {translated} translated, {failed} failed")
+        return {"success": True, "stored": len(known), "translated": translated, "failed": failed}
+
+    except Exception as e:
+        logger.error(f"❌ Error warming translation cache: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/api/admin/translation-cache")
+async def clear_translation_cache():
+    """
+    清空翻译缓存（内存和磁盘）
+    """
+    try:
+        deleted = await transcription_service.translation_cache.clear()
+        logger.info(f"🗑️ Translation cache cleared ({deleted} entries)")
+        return {"success": True, "deleted": deleted}
+
+    except Exception as e:
+        logger.error(f"❌ Error clearing translation cache: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -2,9 +2,13 @@
 笔记 API - 保存和导出笔记
 """
 import logging
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+
+from services.transcript_export import EXPORT_FORMATS, export_stream, list_blocks, store_blocks
+from services.transcript_store import transcript_store
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -17,78 +21,91 @@ class TranscriptItem(BaseModel):
     translatedText: str
     detectedLanguage: str
     startTime: str
+    endTimestamp: Optional[int] = None
 
 
 class NotesData(BaseModel):
-    transcripts: List[TranscriptItem]
+    transcripts: List[TranscriptItem] = []
     notes: str = ""
+    sessionId: Optional[str] = None  # 提供时从服务端转录存储读取，客户端不必上传 transcripts
+    originMs: Optional[int] = None  # 字幕时间轴零点（毫秒时间戳），默认第一块的开始时间
+
+
+class SessionNotes(BaseModel):
+    notes: str = ""
+
 
+def _require_format(fmt: str):
+    """格式不支持时返回 404"""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown export format: {fmt} (available: {', '.join(EXPORT_FORMATS)})"
+        )
 
-@router.post("/api/export/markdown")
-async def export_markdown(data: NotesData):
+
+def _export_response(fmt: str, blocks, notes: str = "", origin_ms: Optional[int] = None) -> StreamingResponse:
+    """边读边写的下载响应"""
+    _require_format(fmt)
+    ext, media_type = EXPORT_FORMATS[fmt]
+    return StreamingResponse(
+        export_stream(fmt, blocks, notes=notes, origin_ms=origin_ms),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="lecture_notes{ext}"'}
+    )
+
+
+@router.post("/api/export/{fmt}")
+async def export_notes(fmt: str, data: NotesData):
     """
-    导出为 Markdown 格式
+    导出笔记和转录（markdown / text / srt / vtt / jsonl）
+
+    提供 sessionId 时从服务端转录存储分页读取；否则使用请求中的 transcripts
     """
     try:
-        # 构建 Markdown 内容
-        md_content = "# 课堂录音笔记\n\n"
-        
-        # 添加笔记内容
-        if data.notes:
-            md_content += "## 📝 我的笔记\n\n"
-            md_content += data.notes + "\n\n"
-        
-        # 添加转录内容
-        md_content += "## 🎤 转录记录\n\n"
-        for item in data.transcripts:
-            md_content += f"### {item.startTime}\n\n"
-            md_content += f"**原文** ({item.detectedLanguage}):\n{item.originalText}\n\n"
-            if item.translatedText:
-                md_content += f"**English**:\n{item.translatedText}\n\n"
-            md_content += "---\n\n"
-        
-        return {
-            "content": md_content,
-            "filename": "lecture_notes.md"
-        }
-        
+        if data.transcripts or not data.sessionId:
+            blocks = list_blocks(item.model_dump(exclude_none=True) for item in data.transcripts)
+        else:
+            blocks = store_blocks(data.sessionId)
+        return _export_response(fmt, blocks, notes=data.notes, origin_ms=data.originMs)
+
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Export markdown failed: {e}")
+        logger.error(f"Export {fmt} failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/api/export/text")
-async def export_text(data: NotesData):
+@router.put("/api/notes/{session_id}")
+async def save_notes(session_id: str, data: SessionNotes):
     """
-    导出为纯文本格式
+    保存会话笔记（GET 导出时写在开头）
     """
     try:
-        # 构建文本内容
-        text_content = "课堂录音笔记\n"
-        text_content += "=" * 50 + "\n\n"
-        
-        # 添加笔记内容
-        if data.notes:
-            text_content += "我的笔记\n"
-            text_content += "-" * 50 + "\n"
-            text_content += data.notes + "\n\n"
-        
-        # 添加转录内容
-        text_content += "转录记录\n"
-        text_content += "-" * 50 + "\n\n"
-        for item in data.transcripts:
-            text_content += f"[{item.startTime}]\n"
-            text_content += f"原文: {item.originalText}\n"
-            if item.translatedText:
-                text_content += f"翻译: {item.translatedText}\n"
-            text_content += "\n"
-        
-        return {
-            "content": text_content,
-            "filename": "lecture_notes.txt"
-        }
-        
+        await transcript_store.save_notes(session_id, data.notes)
+        return {"success": True}
+
     except Exception as e:
-        logger.error(f"Export text failed: {e}")
+        logger.error(f"Save notes failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/api/export/{fmt}")
+async def export_session(
+    fmt: str,
+    session_id: str = Query(..., description="会话 ID"),
+    origin_ms: Optional[int] = Query(None, description="字幕时间轴零点（毫秒时间戳）")
+):
+    """
+    直接下载会话转录和已保存的笔记；浏览器可以边下载边保存，适合很长的课程
+    """
+    try:
+        _require_format(fmt)
+        notes = await transcript_store.get_notes(session_id)
+        return _export_response(fmt, store_blocks(session_id), notes=notes, origin_ms=origin_ms)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Export {fmt} failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
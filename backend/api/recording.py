@@ -1,16 +1,30 @@
 """
-录音文件 API - 上传和下载录音文件（支持本地存储和 S3）
+录音文件 API - 上传和下载录音文件（支持本地存储和 S3、压缩版本和 Range 请求）
 """
 import os
+import re
+import asyncio
+import hashlib
 import logging
+import time
+import wave
 from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse, RedirectResponse
+from email.utils import formatdate
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Tuple
 import boto3
-from botocore.exceptions import ClientError
 from config import settings
+from services.recording_upload import STATE_SUFFIX, MultipartRecordingUpload, resume_pending_uploads
+from services.recording_store import (
+    CircuitBreaker, LocalRecordingStore, S3RecordingStore, StorageUnavailableError
+)
+from services.recording_catalog import recording_catalog
+from services.session_recorder import SessionRecordings
+from services.recording_transcoder import (
+    FALLBACK_FORMATS, MEDIA_TYPES, RAW_FORMAT, RENDITIONS, format_path, recording_format, recording_transcoder
+)
 
 logger = logging.getLogger(__name__)
 
@@ -20,20 +34,223 @@ router = APIRouter()
 RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "../recordings")
 os.makedirs(RECORDINGS_DIR, exist_ok=True)
 
-# 初始化 S3 客户端（如果启用）
-s3_client = None
+# 上传时每次从请求体读取的字节数（单个上传的内存占用与文件大小无关）
+UPLOAD_READ_SIZE = 1024 * 1024
+
+# Range 响应每次从文件读取的字节数
+RANGE_READ_SIZE = 256 * 1024
+
+# 定期清理过期原始录音的间隔（秒）
+RETENTION_SWEEP_INTERVAL_S = 3600
+
+# 录音列表每页条数
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 200
+
+_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+# 录音文件名：recording_{会话ID}_{时间戳}
+_FILENAME_PATTERN = re.compile(r"recording_(.+)_\d{8}_\d{6}")
+
+# 后台任务引用（防止任务在完成前被回收）
+_background_tasks = set()
+
+# 录音存储：本地磁盘（工作副本）+ S3（如果启用）
+local_store = LocalRecordingStore(RECORDINGS_DIR)
+s3_store: Optional[S3RecordingStore] = None
 if settings.USE_S3_STORAGE and settings.AWS_ACCESS_KEY_ID:
     try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
+        s3_store = S3RecordingStore(
+            boto3.client(
+                's3',
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=settings.AWS_REGION,
+                endpoint_url=settings.AWS_S3_ENDPOINT_URL or None  # S3 兼容服务（如 MinIO）
+            ),
+            settings.AWS_S3_BUCKET,
+            cache_ttl_s=settings.RECORDING_STORE_CACHE_TTL_S,
+            breaker=CircuitBreaker(settings.S3_BREAKER_FAILURES, settings.S3_BREAKER_RESET_S),
         )
         logger.info(f"✅ S3 client initialized (bucket: {settings.AWS_S3_BUCKET})")
     except Exception as e:
         logger.error(f"❌ Failed to initialize S3 client: {e}")
-        s3_client = None
+        s3_store = None
+
+
+def _run_in_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _use_s3() -> bool:
+    """本次请求是否使用 S3（熔断打开时各请求各自回退到本地，不修改全局配置）"""
+    return s3_store is not None and s3_store.available
+
+
+def _keeps_raw() -> bool:
+    """原始 WAV 是否长期保留（否则 S3 上只存压缩版本）"""
+    return not recording_transcoder.enabled or recording_transcoder.raw_retention_hours < 0
+
+
+def _session_from_filename(filename: str) -> Optional[str]:
+    match = _FILENAME_PATTERN.fullmatch(os.path.splitext(filename)[0])
+    return match.group(1) if match else None
+
+
+def _wav_duration(filepath: str) -> Optional[float]:
+    """WAV 时长（秒），读取失败时返回 None"""
+    try:
+        with wave.open(filepath, "rb") as f:
+            return f.getnframes() / f.getframerate()
+    except (wave.Error, EOFError, OSError):
+        return None
+
+
+async def _import_existing_recordings():
+    """录音目录为空时（首次启用），导入本地目录和 S3 上已有的录音（只扫描这一次）"""
+    if not await recording_catalog.is_empty():
+        return
+    entries = []
+    if s3_store is not None:
+        try:
+            for obj in await s3_store.list_objects():
+                fmt = recording_format(obj["name"])
+                if fmt is not None:
+                    entries.append({
+                        "filename": format_path(obj["name"], RAW_FORMAT),
+                        "fmt": fmt,
+                        "session_id": _session_from_filename(obj["name"]),
+                        "created_at": obj["modified"],
+                        "size": obj["size"],
+                        "s3": True,
+                    })
+        except StorageUnavailableError as e:
+            logger.error(f"❌ Failed to list S3 recordings for catalog import: {e}")
+    # 本地条目排在后面，同一录音的创建时间和时长以本地文件为准
+    for obj in await local_store.list_objects():
+        fmt = recording_format(obj["name"])
+        if fmt is not None:
+            filepath = local_store.local_path(obj["name"])
+            entries.append({
+                "filename": format_path(obj["name"], RAW_FORMAT),
+                "fmt": fmt,
+                "session_id": _session_from_filename(obj["name"]),
+                "created_at": obj["modified"],
+                "duration": await asyncio.to_thread(_wav_duration, filepath) if fmt == RAW_FORMAT else None,
+                "size": obj["size"],
+                "local": True,
+            })
+    await recording_catalog.record_many(entries)
+    if entries:
+        logger.info(f"📇 Imported {len(entries)} existing recording files into the catalog")
+
+
+@router.on_event("startup")
+async def resume_uploads():
+    """导入已有录音，续传上次进程中断时未完成的 S3 分片上传，补做未完成的转码，并启动原始录音清理"""
+    await _import_existing_recordings()
+    if _use_s3():
+        _run_in_background(resume_pending_uploads(RECORDINGS_DIR, s3_store.client))
+    for filepath in recording_transcoder.pending_recordings(RECORDINGS_DIR, exclude_suffixes=(STATE_SUFFIX,)):
+        _run_in_background(process_recording(filepath))
+    if recording_transcoder.enabled and recording_transcoder.raw_retention_hours >= 0:
+        _run_in_background(_enforce_raw_retention())
+
+
+async def _upload_to_s3(filepath: str, fmt: str, session_id: Optional[str]):
+    metadata = {'upload-time': datetime.now().strftime("%Y%m%d_%H%M%S")}
+    if session_id:
+        metadata['session-id'] = session_id
+    if await s3_store.upload_file(filepath, MEDIA_TYPES[fmt], metadata):
+        await recording_catalog.record(format_path(os.path.basename(filepath), RAW_FORMAT), fmt, s3=True)
+
+
+async def process_recording(filepath: str, session_id: Optional[str] = None, upload_raw: bool = False):
+    """
+    录音写完后的后台处理：上传原始文件（需要时）→ 转码 → 上传压缩版本 → 执行原始文件保留策略
+    """
+    try:
+        if upload_raw and _use_s3():
+            await _upload_to_s3(filepath, RAW_FORMAT, session_id)
+        if not recording_transcoder.enabled:
+            return
+        renditions = await recording_transcoder.transcode(filepath)
+        await recording_catalog.record_many([
+            {"filename": os.path.basename(filepath), "fmt": fmt, "size": os.path.getsize(path), "local": True}
+            for fmt, path in renditions.items()
+        ])
+        if _use_s3():
+            for fmt, rendition_path in renditions.items():
+                await _upload_to_s3(rendition_path, fmt, session_id)
+        if recording_transcoder.can_delete_raw(filepath):
+            await _delete_raw(filepath)
+    except Exception as e:
+        logger.error(f"❌ Failed to process recording {os.path.basename(filepath)}: {e}")
+
+
+async def _delete_raw(filepath: str):
+    """删除原始 WAV（本地和 S3），之后由 FLAC/Opus 版本提供下载"""
+    filename = os.path.basename(filepath)
+    await local_store.delete(filename)
+    deleted_from_s3 = True
+    if s3_store is not None:
+        try:
+            await s3_store.delete(filename)
+        except StorageUnavailableError as e:
+            deleted_from_s3 = False
+            logger.warning(f"⚠️ Failed to delete raw recording from S3 {filename}: {e}")
+    await recording_catalog.record(filename, RAW_FORMAT, local=False, **({"s3": False} if deleted_from_s3 else {}))
+    logger.info(f"🧹 Raw recording removed (compressed copies kept): {filename}")
+
+
+async def _enforce_raw_retention():
+    """定期删除超过保留期、且已有 FLAC 版本的原始 WAV"""
+    while True:
+        for filepath in recording_transcoder.expired_raw_recordings(RECORDINGS_DIR, exclude_suffixes=(STATE_SUFFIX,)):
+            try:
+                await _delete_raw(filepath)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to remove raw recording {os.path.basename(filepath)}: {e}")
+        await asyncio.sleep(RETENTION_SWEEP_INTERVAL_S)
+
+
+async def register_recording(recording: dict, session_id: str) -> dict:
+    """
+    登记服务端录制完成的录音（WebSocket 会话结束时调用）：本地文件即为录音，
+    在后台生成压缩版本；启用 S3 时上传压缩版本（原始文件长期保留时也上传原始文件）
+
+    返回:
+        {"filename", "downloadUrl", "size", "duration"}
+    """
+    filename = recording["filename"]
+    await recording_catalog.record(
+        filename,
+        RAW_FORMAT,
+        session_id=session_id,
+        created_at=time.time(),
+        duration=recording["duration"],
+        size=recording["size"],
+        local=True,
+    )
+    _run_in_background(process_recording(recording["filepath"], session_id, upload_raw=_keeps_raw()))
+    logger.info(f"✅ Session recording registered: {filename} ({recording['size'] / 1024 / 1024:.2f} MB)")
+    return {
+        "filename": filename,
+        "downloadUrl": f"/api/recording/download/{filename}",
+        "size": recording["size"],
+        "duration": recording["duration"],
+    }
+
+
+# 服务端会话录音（WebSocket 重连续写同一文件，stop 或断开超过宽限时间后登记）
+session_recordings = SessionRecordings(
+    RECORDINGS_DIR,
+    register_recording,
+    grace_s=settings.RECORDING_RECONNECT_GRACE_S,
+    buffer_bytes=settings.RECORDING_WRITE_BUFFER_KB * 1024,
+)
 
 
 class UploadResponse(BaseModel):
@@ -53,6 +270,9 @@ async def upload_recording(
     """
     上传录音文件（支持本地存储和 S3）
     
+    请求体分块读取、边读边写入本地文件，启用 S3 时同时在线程池中并行分片上传，
+    内存占用与文件大小无关
+    
     参数:
         audio: 音频文件（WAV格式）
         sessionId: 会话ID
@@ -63,63 +283,60 @@ async def upload_recording(
         # 生成文件名（带时间戳）
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"recording_{sessionId}_{timestamp}.wav"
+        filepath = os.path.join(RECORDINGS_DIR, filename)
         
-        # 读取文件内容
-        contents = await audio.read()
-        file_size = len(contents)
-        
-        download_url = ""
+        # 分块读取并写入本地文件；启用 S3 时同时并行分片上传（S3 失败时保留本地文件）
+        # S3 熔断打开时本次上传只写本地
+        use_s3 = _use_s3()
+        upload = MultipartRecordingUpload(
+            filepath,
+            s3_store.client if use_s3 else None,
+            bucket=settings.AWS_S3_BUCKET,
+            key=f"recordings/{filename}",
+            metadata={
+                'session-id': sessionId,
+                'upload-time': timestamp
+            },
+            part_size=settings.RECORDING_UPLOAD_PART_MB * 1024 * 1024,
+            max_inflight=settings.RECORDING_UPLOAD_CONCURRENCY,
+        )
+        await upload.open()
+        try:
+            while chunk := await audio.read(UPLOAD_READ_SIZE):
+                await upload.write(chunk)
+        except Exception:
+            await upload.abort()
+            raise
+        await upload.complete()
+        file_size = upload.size
+        if use_s3:
+            s3_store.record_upload(filename, upload)
+        await recording_catalog.record(
+            filename,
+            RAW_FORMAT,
+            session_id=sessionId,
+            created_at=time.time(),
+            duration=await asyncio.to_thread(_wav_duration, filepath),
+            size=file_size,
+            local=True,
+            s3=upload.uses_s3,
+        )
+        _run_in_background(process_recording(filepath, sessionId))
         
-        # 如果启用 S3，上传到 S3
-        if settings.USE_S3_STORAGE and s3_client:
+        if upload.uses_s3 and _keeps_raw():
+            # 生成预签名 URL（有效期 7 天；原始文件会按保留策略删除时改用下载接口，由其选择压缩版本）
             try:
-                # 上传到 S3
-                s3_client.put_object(
-                    Bucket=settings.AWS_S3_BUCKET,
-                    Key=f"recordings/{filename}",
-                    Body=contents,
-                    ContentType='audio/wav',
-                    Metadata={
-                        'session-id': sessionId,
-                        'upload-time': timestamp
-                    }
-                )
-                
-                # 生成预签名 URL（有效期 7 天）
-                download_url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': settings.AWS_S3_BUCKET,
-                        'Key': f"recordings/{filename}"
-                    },
-                    ExpiresIn=7 * 24 * 3600  # 7 天
-                )
-                
-                logger.info(f"✅ Recording uploaded to S3: {filename} ({file_size / 1024 / 1024:.2f} MB)")
-                
-                # 同时保存本地备份（可选）
-                filepath = os.path.join(RECORDINGS_DIR, filename)
-                with open(filepath, "wb") as f:
-                    f.write(contents)
-                logger.info(f"💾 Local backup saved: {filename}")
-                
-            except ClientError as e:
-                logger.error(f"❌ S3 upload failed: {e}")
-                # 回退到本地存储
-                settings.USE_S3_STORAGE = False
-        
-        # 本地存储
-        if not settings.USE_S3_STORAGE or not s3_client:
-            filepath = os.path.join(RECORDINGS_DIR, filename)
-            with open(filepath, "wb") as f:
-                f.write(contents)
-            
+                download_url = await s3_store.presigned_url(filename, expires_in=7 * 24 * 3600)  # 7 天
+            except StorageUnavailableError:
+                download_url = f"/api/recording/download/{filename}"
+            logger.info(f"✅ Recording uploaded to S3: {filename} ({file_size / 1024 / 1024:.2f} MB, local backup kept)")
+        else:
             download_url = f"/api/recording/download/{filename}"
             logger.info(f"✅ Recording saved locally: {filename} ({file_size / 1024 / 1024:.2f} MB)")
         
         return UploadResponse(
             success=True,
-            message="录音上传成功" + (" (S3)" if settings.USE_S3_STORAGE else " (本地)"),
+            message="录音上传成功" + (" (S3)" if upload.uses_s3 else " (本地)"),
             filename=filename,
             downloadUrl=download_url,
             size=file_size
@@ -132,51 +349,126 @@ async def upload_recording(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 Range 请求头
+
+    返回:
+        [start, end]（含两端）；多段或格式不对时返回 None（忽略 Range，返回整个文件）
+
+    异常:
+        HTTPException(416): 范围超出文件大小
+    """
+    match = _RANGE_PATTERN.fullmatch(range_header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.group(1), match.group(2)
+    if first == "":
+        # bytes=-N：最后 N 个字节
+        start, end = max(0, size - int(last)), size - 1
+        if int(last) == 0:
+            start = size
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    if start >= size:
+        raise HTTPException(status_code=416, detail="请求范围无效", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def _file_response(request: Request, filepath: str, stat: os.stat_result, media_type: str, filename: str) -> Response:
+    """
+    返回本地文件，支持 Range 请求（播放器可直接跳转到长录音中间，不必下载整个文件）
+    """
+    size = stat.st_size
+    # 与 FileResponse 相同的 ETag 算法，If-Range 可以用整文件响应里的 ETag
+    etag = '"' + hashlib.md5(f"{stat.st_mtime}-{size}".encode(), usedforsecurity=False).hexdigest() + '"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {"Accept-Ranges": "bytes"}
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if range_header and (if_range is None or if_range in (etag, last_modified)):
+        byte_range = _parse_range(range_header, size)
+    if byte_range is None:
+        return FileResponse(filepath, media_type=media_type, filename=filename, headers=headers, stat_result=stat)
+
+    start, end = byte_range
+
+    def read_range():
+        with open(filepath, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(RANGE_READ_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "ETag": etag,
+        "Last-Modified": last_modified,
+    })
+    return StreamingResponse(read_range(), status_code=206, media_type=media_type, headers=headers)
+
+
 @router.get("/api/recording/download/{filename}")
-async def download_recording(filename: str):
+async def download_recording(filename: str, request: Request, format: Optional[str] = None):
     """
-    下载录音文件（优先本地，备选 S3）
+    下载录音文件（优先本地，备选 S3），支持 Range 请求
     
     参数:
         filename: 文件名
+        format: 指定版本（wav/flac/opus）；不指定时返回文件名对应的版本，
+                原始 WAV 已按保留策略删除时改用 FLAC（其次 Opus）
     """
     try:
-        # 优先检查本地文件
-        filepath = os.path.join(RECORDINGS_DIR, filename)
+        requested_format = recording_format(filename)
+        if requested_format is None:
+            raise HTTPException(status_code=404, detail="录音文件不存在")
+        if format is not None:
+            if format not in MEDIA_TYPES:
+                raise HTTPException(status_code=400, detail=f"不支持的格式: {format}")
+            candidates = [format]
+        else:
+            candidates = [requested_format] + [fmt for fmt in FALLBACK_FORMATS if fmt != requested_format]
         
-        if os.path.exists(filepath):
+        # 优先检查本地文件
+        for fmt in candidates:
+            name = format_path(filename, fmt)
+            try:
+                stat = await asyncio.to_thread(os.stat, local_store.local_path(name))
+            except FileNotFoundError:
+                continue
             # 本地文件存在，直接返回
-            logger.info(f"📥 Downloading recording from local: {filename}")
-            return FileResponse(
-                filepath,
-                media_type="audio/wav",
-                filename=filename
-            )
+            logger.info(f"📥 Downloading recording from local: {name}")
+            return _file_response(request, local_store.local_path(name), stat, MEDIA_TYPES[fmt], name)
         
-        # 本地文件不存在，尝试从 S3 下载
-        if settings.USE_S3_STORAGE and s3_client:
-            try:
-                # 检查 S3 上是否有文件
-                s3_client.head_object(
-                    Bucket=settings.AWS_S3_BUCKET,
-                    Key=f"recordings/{filename}"
-                )
-                
-                # 生成预签名 URL
-                url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': settings.AWS_S3_BUCKET,
-                        'Key': f"recordings/{filename}"
-                    },
-                    ExpiresIn=3600  # 1 小时
-                )
-                logger.info(f"📥 Redirecting to S3: {filename}")
+        # 本地文件不存在，尝试从 S3 下载（S3 本身支持 Range；存在性和预签名 URL 有缓存）
+        s3_unavailable = False
+        if s3_store is not None:
+            for fmt in candidates:
+                name = format_path(filename, fmt)
+                try:
+                    if not await s3_store.exists(name):
+                        continue
+                    url = await s3_store.presigned_url(name, expires_in=settings.RECORDING_PRESIGN_EXPIRES_S)
+                except StorageUnavailableError as e:
+                    logger.warning(f"⚠️ S3 unavailable while locating {name}: {e}")
+                    s3_unavailable = True
+                    break
+                logger.info(f"📥 Redirecting to S3: {name}")
                 return RedirectResponse(url=url)
-                
-            except ClientError as e:
-                logger.error(f"❌ S3 download failed: {e}")
-                # S3 也没有，返回 404
+        
+        if s3_unavailable:
+            raise HTTPException(status_code=503, detail="录音存储暂不可用，请稍后重试")
         
         # 本地和 S3 都没有
         raise HTTPException(status_code=404, detail="录音文件不存在")
@@ -188,37 +480,77 @@ async def download_recording(filename: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _parse_date(value: Optional[str], name: str) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} 不是有效的日期: {value}")
+
+
 @router.get("/api/recording/list")
-async def list_recordings():
+async def list_recordings(
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+):
     """
-    列出所有录音文件
+    分页列出录音（按创建时间倒序，从录音目录查询，不扫描文件）
+    
+    参数:
+        limit: 每页条数
+        cursor: 上一页返回的 nextCursor
+        session_id: 只列出该会话的录音
+        since/until: 创建时间范围（ISO 日期或时间，since 含、until 不含）
     """
     try:
-        files = []
+        try:
+            entries, next_cursor = await recording_catalog.list(
+                limit=limit,
+                cursor=cursor,
+                session_id=session_id,
+                since=_parse_date(since, "since"),
+                until=_parse_date(until, "until"),
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="无效的分页游标")
         
-        for filename in os.listdir(RECORDINGS_DIR):
-            if filename.endswith('.wav'):
-                filepath = os.path.join(RECORDINGS_DIR, filename)
-                stat = os.stat(filepath)
-                
-                files.append({
-                    "filename": filename,
-                    "size": stat.st_size,
-                    "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    "downloadUrl": f"/api/recording/download/{filename}"
-                })
-        
-        # 按创建时间倒序排列
-        files.sort(key=lambda x: x['created'], reverse=True)
+        files = []
+        for entry in entries:
+            filename = entry["filename"]
+            files.append({
+                "filename": filename,
+                "sessionId": entry["session_id"],
+                "size": entry["size"],
+                "duration": entry["duration"],
+                "storage": entry["storage"],
+                "created": datetime.fromtimestamp(entry["created_at"]).isoformat(),
+                "downloadUrl": f"/api/recording/download/{filename}",
+                "formats": {
+                    fmt: {
+                        **info,
+                        "downloadUrl": f"/api/recording/download/{filename}?format={fmt}"
+                    }
+                    for fmt, info in entry["formats"].items()
+                }
+            })
         
         logger.info(f"📋 Listed {len(files)} recordings")
         
         return {
             "success": True,
             "count": len(files),
-            "files": files
+            "files": files,
+            "nextCursor": next_cursor,
+            "transcoding": recording_transcoder.get_stats(),
+            "storage": s3_store.get_stats() if s3_store is not None else local_store.get_stats()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Failed to list recordings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -233,19 +565,33 @@ async def delete_recording(filename: str):
         filename: 文件名
     """
     try:
-        filepath = os.path.join(RECORDINGS_DIR, filename)
+        if recording_format(filename) is None:
+            raise HTTPException(status_code=404, detail="录音文件不存在")
         
-        if not os.path.exists(filepath):
+        # 原始文件和所有压缩版本一起删除
+        names = [
+            format_path(filename, fmt)
+            for fmt in [RAW_FORMAT, *RENDITIONS]
+        ]
+        names = [name for name in names if await local_store.exists(name)]
+        if not names:
             raise HTTPException(status_code=404, detail="录音文件不存在")
         
-        os.remove(filepath)
-        logger.info(f"🗑️ Recording deleted: {filename}")
+        for name in names:
+            await local_store.delete(name)
+            # S3 上的副本不删除，目录中仍保留其记录
+            await recording_catalog.record(
+                format_path(filename, RAW_FORMAT), recording_format(name), local=False
+            )
+        logger.info(f"🗑️ Recording deleted: {filename} ({len(names)} files)")
         
         return {
             "success": True,
             "message": "录音文件已删除"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Failed to delete recording: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,12 +1,15 @@
 """
-说话人识别 API - 注册和管理教授声音
+说话人识别 API - 注册和管理教授声音，以及按课程管理多个具名说话人
 """
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel
+from typing import Optional
+import asyncio
 import base64
 import logging
 
 from services.speaker_recognition_service import speaker_recognition_service
+from services.model_loader import model_loader
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +33,52 @@ class SpeakerStatusResponse(BaseModel):
     message: str
 
 
+class EnrollSpeakerRequest(BaseModel):
+    """注册说话人请求"""
+    name: str
+    audioData: str  # Base64 编码的音频数据
+    course: str = "default"
+    role: str = "student"  # professor / assistant / student ...
+    threshold: Optional[float] = None  # 该说话人的相似度阈值（0-1），为空时使用默认值
+
+
+class UpdateSpeakerRequest(BaseModel):
+    """更新说话人请求（只更新提供的字段）"""
+    name: Optional[str] = None
+    audioData: Optional[str] = None  # 提供时重新提取声纹
+    course: Optional[str] = None
+    role: Optional[str] = None
+    threshold: Optional[float] = None
+
+
+class IdentifySpeakerRequest(BaseModel):
+    """识别说话人请求"""
+    audioData: str  # Base64 编码的音频数据
+    course: Optional[str] = None
+    topK: int = 3
+
+
+# 16kHz, 16-bit PCM, mono = 32000 bytes/second
+MIN_ENROLL_BYTES = 32000 * 3  # 3 秒
+
+
+def _require_speaker_model():
+    """声纹模型仍在加载时拒绝提取声纹的请求（否则会用回退特征注册/识别）"""
+    if not model_loader.is_settled("speaker"):
+        raise HTTPException(status_code=503, detail="声纹模型正在加载，请稍后重试")
+
+
+def _decode_enrollment_audio(audio_data: str) -> bytes:
+    """解码注册音频并检查长度（至少 3 秒）"""
+    audio_bytes = base64.b64decode(audio_data)
+    if len(audio_bytes) < MIN_ENROLL_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"音频太短，请录制至少 3 秒的音频（当前: {len(audio_bytes) / 32000:.1f} 秒）"
+        )
+    return audio_bytes
+
+
 @router.post("/api/speaker/register-professor", response_model=RegisterVoiceResponse)
 async def register_professor_voice(request: RegisterVoiceRequest):
     """
@@ -37,6 +86,7 @@ async def register_professor_voice(request: RegisterVoiceRequest):
     
     前端需要发送至少 5-10 秒的教授讲话音频
     """
+    _require_speaker_model()
     try:
         logger.info("📝 Registering professor voice...")
         
@@ -53,7 +103,7 @@ async def register_professor_voice(request: RegisterVoiceRequest):
             )
         
         # 注册声音
-        success = speaker_recognition_service.register_professor_voice(audio_bytes)
+        success = await asyncio.to_thread(speaker_recognition_service.register_professor_voice, audio_bytes)
         
         if success:
             logger.info("✅ Professor voice registered successfully")
@@ -113,3 +163,130 @@ async def clear_professor_voice():
         logger.error(f"❌ Error clearing professor voice: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/api/speakers")
+async def list_speakers(course: Optional[str] = None):
+    """
+    列出已注册的说话人（可按课程过滤）
+    """
+    try:
+        speakers = speaker_recognition_service.registry.list(course=course)
+        return {"success": True, "speakers": speakers, "count": len(speakers)}
+
+    except Exception as e:
+        logger.error(f"❌ Error listing speakers: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/speakers")
+async def enroll_speaker(request: EnrollSpeakerRequest):
+    """
+    注册具名说话人（至少 3 秒音频）
+    """
+    _require_speaker_model()
+    try:
+        audio_bytes = _decode_enrollment_audio(request.audioData)
+        speaker = await asyncio.to_thread(
+            speaker_recognition_service.enroll_speaker,
+            request.name,
+            audio_bytes,
+            course=request.course,
+            role=request.role,
+            threshold=request.threshold
+        )
+        if speaker is None:
+            raise HTTPException(status_code=422, detail="声纹提取失败，请重试或检查音频质量")
+
+        return {"success": True, "speaker": speaker}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error enrolling speaker: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/speakers/{speaker_id}")
+async def get_speaker(speaker_id: str):
+    """
+    获取说话人信息
+    """
+    speaker = speaker_recognition_service.registry.get(speaker_id)
+    if speaker is None:
+        raise HTTPException(status_code=404, detail="说话人不存在")
+    return {"success": True, "speaker": speaker}
+
+
+@router.patch("/api/speakers/{speaker_id}")
+async def update_speaker(speaker_id: str, request: UpdateSpeakerRequest):
+    """
+    更新说话人信息（名字、课程、角色、阈值），提供音频时替换声纹
+    """
+    if request.audioData:
+        _require_speaker_model()
+    try:
+        audio_bytes = _decode_enrollment_audio(request.audioData) if request.audioData else None
+        try:
+            # 提取声纹较慢，放到线程中执行
+            speaker = await asyncio.to_thread(
+                speaker_recognition_service.update_speaker,
+                speaker_id,
+                audio_bytes=audio_bytes,
+                name=request.name,
+                course=request.course,
+                role=request.role,
+                threshold=request.threshold
+            )
+        except ValueError:
+            # 与注册接口一致：声纹提取失败
+            raise HTTPException(status_code=422, detail="声纹提取失败，请重试或检查音频质量")
+        return {"success": True, "speaker": speaker}
+
+    except KeyError:
+        raise HTTPException(status_code=404, detail="说话人不存在")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error updating speaker: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/api/speakers/{speaker_id}")
+async def delete_speaker(speaker_id: str):
+    """
+    删除说话人
+    """
+    try:
+        if not speaker_recognition_service.registry.remove(speaker_id):
+            raise HTTPException(status_code=404, detail="说话人不存在")
+
+        logger.info(f"🗑️ Speaker deleted: {speaker_id}")
+        return {"success": True}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error deleting speaker: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/speakers/identify")
+async def identify_speaker(request: IdentifySpeakerRequest):
+    """
+    返回与音频最相似的 top-k 个已注册说话人（含相似度和是否达到阈值）
+    """
+    _require_speaker_model()
+    try:
+        audio_bytes = base64.b64decode(request.audioData)
+        # 提取声纹较慢，放到线程中执行
+        matches = await asyncio.to_thread(
+            speaker_recognition_service.match_speakers,
+            audio_bytes,
+            course=request.course,
+            top_k=request.topK
+        )
+        return {"success": True, "matches": matches}
+
+    except Exception as e:
+        logger.error(f"❌ Error identifying speaker: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,101 @@
+"""
+转录 API - 读取服务端保存的会话转录（导出、断线重连补齐）和全文检索
+"""
+import logging
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from services.transcript_store import transcript_store
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 每页块数
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# 每页检索结果数
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+
+@router.get("/api/transcripts/{session_id}")
+async def get_transcripts(
+    session_id: str,
+    after: Optional[str] = None,
+    since_ms: Optional[int] = None,
+    until_ms: Optional[int] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    按追加顺序分页读取会话的最终转录块（译文已合并）
+    
+    参数:
+        after: 只返回该块之后的块（客户端传入已有的最后一个块 ID，重连时只取缺失部分）
+        since_ms/until_ms: 块开始时间范围（毫秒时间戳，since 含、until 不含）
+        limit: 每页块数；返回的 nextAfter 不为空时用它作为 after 继续读取
+    """
+    try:
+        try:
+            blocks, next_after = await transcript_store.read(
+                session_id, after=after, since_ms=since_ms, until_ms=until_ms, limit=limit
+            )
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"转录块不存在: {after}")
+        
+        return {
+            "success": True,
+            "sessionId": session_id,
+            "count": len(blocks),
+            "blocks": blocks,
+            "nextAfter": next_after
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Failed to read transcripts for {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/search")
+async def search_transcripts(
+    q: str = Query(..., min_length=1, max_length=200, description="检索内容（中文或英文）"),
+    session_id: Optional[str] = None,
+    since_ms: Optional[int] = None,
+    until_ms: Optional[int] = None,
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
+    """
+    在所有课程的原文和译文中检索，按相关度排序
+    
+    参数:
+        q: 所有检索词都要出现；中文按相邻字匹配（"定义积分" 不会匹配 "积分的定义"）
+        session_id: 只检索某个会话
+        since_ms/until_ms: 块开始时间范围（毫秒时间戳）
+        limit/offset: 分页；hasMore 为 true 时 offset 加 limit 继续
+    
+    返回的每条命中包含会话 ID、转录块（块 ID、时间戳、说话人等）、命中字段、摘要和摘要中的高亮位置
+    """
+    try:
+        start = time.perf_counter()
+        hits, has_more = await transcript_store.search(
+            q, session_id=session_id, since_ms=since_ms, until_ms=until_ms, limit=limit, offset=offset
+        )
+        
+        return {
+            "success": True,
+            "query": q,
+            "count": len(hits),
+            "hits": hits,
+            "hasMore": has_more,
+            "tookMs": round((time.perf_counter() - start) * 1000, 1)
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Transcript search failed ({q!r}): {e}")
+        raise HTTPException(status_code=500, detail=str(e))
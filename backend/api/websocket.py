@@ -2,58 +2,92 @@
 WebSocket API - 实时音频转录
 """
 import json
+import base64
 import logging
 import asyncio
+from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from config import settings
 from services.transcription_service import transcription_service
+from services.model_loader import model_loader
+from services.session_bus import session_bus
+from api.recording import session_recordings
+from services.audio_ingest import AudioIngestSession, BinaryFrameError, FLAG_END_OF_CHUNK
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 class ConnectionManager:
-    """WebSocket 连接管理器"""
+    """
+    WebSocket 连接管理器
+
+    发往会话的消息都经过会话总线：本节点持有的连接订阅自己的会话，
+    其他节点（或本节点的后台翻译任务）发布的事件由总线送到这里再推送给客户端
+    """
 
     def __init__(self):
         self.active_connections: dict[str, WebSocket] = {}
 
     async def connect(self, websocket: WebSocket, session_id: str):
-        """连接 WebSocket"""
+        """连接 WebSocket 并在总线上订阅该会话"""
         await websocket.accept()
         self.active_connections[session_id] = websocket
+        await session_bus.subscribe(session_id, websocket.send_json)
         logger.info(f"WebSocket connected: {session_id}")
 
-    def disconnect(self, session_id: str):
-        """断开连接"""
+    async def disconnect(self, session_id: str):
+        """断开连接并取消订阅"""
         if session_id in self.active_connections:
             del self.active_connections[session_id]
+            await session_bus.unsubscribe(session_id)
             logger.info(f"WebSocket disconnected: {session_id}")
 
     async def send_message(self, session_id: str, message: dict):
-        """发送消息给客户端"""
-        if session_id in self.active_connections:
-            websocket = self.active_connections[session_id]
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.error(f"Failed to send message: {e}")
+        """发送消息给客户端（发布到会话总线，由持有该连接的节点推送）"""
+        try:
+            await session_bus.publish(session_id, message)
+        except Exception as e:
+            logger.error(f"Failed to send message: {e}")
 
 
 manager = ConnectionManager()
 
 
 @router.websocket("/ws/transcribe")
-async def websocket_transcribe(websocket: WebSocket, session_id: str = "default"):
+async def websocket_transcribe(
+    websocket: WebSocket,
+    session_id: str = "default",
+    mode: str = "chunk",
+    course: Optional[str] = None
+):
     """
     WebSocket 端点 - 实时音频转录
     
-    客户端消息格式：
+    连接参数：
+    - session_id: 会话 ID
+    - mode: "chunk"（默认，每个音频块整体转录）或 "streaming"（滚动缓冲区，
+      每秒重解码并推送 isFinal=false 的临时结果，稳定前缀提交为 isFinal=true）
+    - course: 课程 ID（可选），说话人识别只匹配该课程注册的声音
+    
+    模型仍在后台加载时，连接先收到 {"type": "status", "status": "loading_models", ...}，
+    最多等待 MODEL_READY_WAIT_S 秒；超时或加载失败时发送 error 并以 1013（稍后重试）关闭
+    
+    就绪后发送 {"type": "status", "status": "connected", "serverRecording": true/false}；
+    serverRecording 为 false 时（未开启或录音文件无法创建）客户端需自行保存并上传录音
+    
+    客户端消息格式（JSON 文本帧）：
     {
         "type": "audio_chunk",
         "data": "base64_encoded_audio",
         "timestamp": 1234567890
     }
     
+    或二进制帧（无 Base64/JSON 开销）：16 字节小端帧头 + 原始 PCM
+        version(uint8=1) | sample_format(uint8: 1=int16, 2=float32) | flags(uint16: bit0=块结束)
+        | sequence(uint32) | timestamp(uint64, 毫秒)
+    详见 services/audio_ingest.py
+    
     服务端消息格式：
     {
         "type": "transcript",
@@ -70,6 +104,23 @@ async def websocket_transcribe(websocket: WebSocket, session_id: str = "default"
     """
     await manager.connect(websocket, session_id)
 
+    # 模型未就绪时先挂起连接，超时则拒绝
+    if not model_loader.is_ready():
+        await manager.send_message(session_id, {
+            "type": "status",
+            "status": "loading_models",
+            "models": {name: model["state"] for name, model in model_loader.get_status()["models"].items()}
+        })
+        if not await model_loader.wait_ready(settings.MODEL_READY_WAIT_S):
+            logger.warning(f"Rejecting WebSocket {session_id}: models not ready")
+            await manager.send_message(session_id, {
+                "type": "error",
+                "message": "转录模型尚未就绪，请稍后重试"
+            })
+            await manager.disconnect(session_id)
+            await websocket.close(code=1013)
+            return
+
     # 启动 Gemini Live API 会话
     try:
         await transcription_service.start_live_session()
@@ -79,9 +130,12 @@ async def websocket_transcribe(websocket: WebSocket, session_id: str = "default"
             "type": "error",
             "message": f"无法启动转录服务: {str(e)}"
         })
-        manager.disconnect(session_id)
+        await manager.disconnect(session_id)
         return
 
+    if course:
+        transcription_service.session_courses[session_id] = course
+
     # 心跳任务
     async def heartbeat():
         """每 30 秒发送心跳"""
@@ -98,11 +152,99 @@ async def websocket_transcribe(websocket: WebSocket, session_id: str = "default"
     # 启动心跳任务
     heartbeat_task = asyncio.create_task(heartbeat())
 
+    async def process_audio(audio_data):
+        """转录一段音频（Base64 字符串或原始 PCM 字节视图）并推送结果"""
+        try:
+            if mode == "streaming":
+                # 流式模式：可能产生多个块（已提交的最终块 + 临时块）
+                blocks = await transcription_service.transcribe_audio_streaming(
+                    audio_data,
+                    session_id=session_id,
+                    ws_manager=manager
+                )
+                for block in blocks:
+                    await manager.send_message(session_id, {
+                        "type": "transcript",
+                        "data": block
+                    })
+                return
+            
+            # 调用转录服务，传递 session_id 和 manager 用于后台翻译推送
+            # （开启块内说话人分离时，一个音频块按说话人轮次产生多个转录块）
+            blocks = await transcription_service.transcribe_audio(
+                audio_data, 
+                session_id=session_id, 
+                ws_manager=manager
+            )
+
+            # 只有在有转录文本时才发送
+            for transcript_data in blocks:
+                if transcript_data.get("originalText"):
+                    await manager.send_message(session_id, {
+                        "type": "transcript",
+                        "data": transcript_data
+                    })
+
+        except Exception as e:
+            logger.error(f"Transcription error: {e}")
+            await manager.send_message(session_id, {
+                "type": "error",
+                "message": f"转录失败: {str(e)}"
+            })
+
+    # 服务端录音：收到的音频同时追加写入 WAV，结束时登记为录音，客户端无需再上传；
+    # 重连后继续写同一个文件，stop 或断开超过宽限时间才结束。
+    # 录音在这里写入而不是作为 AudioPipeline 的阶段：管线在静音时提前结束、流式模式不经过管线，
+    # 二进制帧也要逐帧写入（块结束前断开不丢音频），而管线只在整块到达后运行
+    recorder = None
+    if settings.SERVER_RECORDING_ENABLED:
+        try:
+            recorder = await session_recordings.attach(session_id)
+        except Exception as e:
+            logger.error(f"❌ Failed to open session recording: {e}")
+
+    # 告诉客户端是否由服务端录音；否则客户端自己保存录音，结束后上传
+    await manager.send_message(session_id, {
+        "type": "status",
+        "status": "connected",
+        "serverRecording": recorder is not None
+    })
+    stopped_by_client = False
+
+    # 二进制音频接入（收到第一个二进制帧时创建）
+    ingest = None
+
     try:
         while True:
-            # 接收客户端消息
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            # 接收客户端消息（文本 JSON 或二进制音频帧）
+            raw = await websocket.receive()
+            if raw["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(raw.get("code", 1000))
+
+            if raw.get("bytes") is not None:
+                if ingest is None:
+                    ingest = AudioIngestSession(session_id, capacity_s=settings.AUDIO_RING_BUFFER_S)
+                try:
+                    header = ingest.ingest(raw["bytes"])
+                except BinaryFrameError as e:
+                    logger.warning(f"Invalid binary frame from {session_id}: {e}")
+                    await manager.send_message(session_id, {
+                        "type": "error",
+                        "message": f"音频帧格式错误: {str(e)}"
+                    })
+                    continue
+
+                # 每帧到达即写入录音，块结束前断开也不会丢失已收到的音频
+                if header and recorder is not None:
+                    await recorder.append(ingest.last_frame())
+
+                # 流式模式逐帧处理；块模式等到块结束标志再整体转录
+                if header and (mode == "streaming" or header["flags"] & FLAG_END_OF_CHUNK):
+                    # 消息串行处理，转录完成前环形缓冲区不会被改写，可直接传视图
+                    await process_audio(ingest.take_chunk())
+                continue
+
+            message = json.loads(raw["text"])
 
             message_type = message.get("type")
 
@@ -110,28 +252,11 @@ async def websocket_transcribe(websocket: WebSocket, session_id: str = "default"
                 # 处理音频块
                 audio_data = message.get("data")  # Base64 编码的音频数据
                 timestamp = message.get("timestamp")
-
-                try:
-                    # 调用转录服务，传递 session_id 和 manager 用于后台翻译推送
-                    transcript_data = await transcription_service.transcribe_audio(
-                        audio_data, 
-                        session_id=session_id, 
-                        ws_manager=manager
-                    )
-
-                    # 只有在有转录文本时才发送
-                    if transcript_data.get("originalText"):
-                        await manager.send_message(session_id, {
-                            "type": "transcript",
-                            "data": transcript_data
-                        })
-
-                except Exception as e:
-                    logger.error(f"Transcription error: {e}")
-                    await manager.send_message(session_id, {
-                        "type": "error",
-                        "message": f"转录失败: {str(e)}"
-                    })
+                if recorder is not None:
+                    # 解码一次，录音和转录共用
+                    audio_data = base64.b64decode(audio_data)
+                    await recorder.append(audio_data)
+                await process_audio(audio_data)
 
             elif message_type == "pong":
                 # 心跳响应
@@ -140,8 +265,18 @@ async def websocket_transcribe(websocket: WebSocket, session_id: str = "default"
             elif message_type == "stop":
                 # 停止录音，关闭 Live API 会话
                 logger.info("Received stop signal, closing live session...")
+                for block in await transcription_service.finish_streaming_session(session_id, ws_manager=manager):
+                    await manager.send_message(session_id, {
+                        "type": "transcript",
+                        "data": block
+                    })
                 await transcription_service.stop_live_session()
-                await manager.send_message(session_id, {"type": "stopped"})
+                stopped = {"type": "stopped"}
+                stopped_by_client = True
+                recording = await session_recordings.finalize(session_id) if recorder is not None else None
+                if recording:
+                    stopped["recording"] = recording
+                await manager.send_message(session_id, stopped)
                 break
 
             else:
@@ -154,8 +289,13 @@ async def websocket_transcribe(websocket: WebSocket, session_id: str = "default"
         import traceback
         traceback.print_exc()
     finally:
-        # 停止 Live API 会话
+        # 停止 Live API 会话（断开时丢弃流式缓冲区中未推送的临时结果）
+        await transcription_service.finish_streaming_session(session_id)
+        transcription_service.session_courses.pop(session_id, None)
         await transcription_service.stop_live_session()
+        if recorder is not None and not stopped_by_client:
+            # 意外断开：等待客户端重连续写，超过宽限时间再结束录音
+            session_recordings.detach(session_id)
         
         # 取消心跳任务
         heartbeat_task.cancel()
@@ -165,5 +305,5 @@ async def websocket_transcribe(websocket: WebSocket, session_id: str = "default"
             pass
 
         # 断开连接
-        manager.disconnect(session_id)
+        await manager.disconnect(session_id)
 
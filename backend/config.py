@@ -8,6 +8,9 @@ load_dotenv()
 
 class Settings:
     """应用配置"""
+    # 本地数据目录（缓存、索引等持久化文件）
+    DATA_DIR: str = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", 8000))
@@ -21,20 +24,139 @@ class Settings:
     # Gemini 模型配置
     GEMINI_LIVE_MODEL: str = "gemini-2.5-flash-lite"
     GEMINI_GENERATION_MODEL: str = "gemini-2.5-flash-lite"
+    GEMINI_API_BASE_URL: str = os.getenv(
+        "GEMINI_API_BASE_URL", "https://aiplatform.googleapis.com/v1/publishers/google/models"
+    )
+    
+    # Gemini HTTP 连接池配置
+    GEMINI_POOL_LIMIT: int = int(os.getenv("GEMINI_POOL_LIMIT", 100))  # 总连接数上限
+    GEMINI_POOL_LIMIT_PER_HOST: int = int(os.getenv("GEMINI_POOL_LIMIT_PER_HOST", 20))  # 每主机连接数上限
+    GEMINI_DNS_CACHE_TTL: int = int(os.getenv("GEMINI_DNS_CACHE_TTL", 300))  # DNS 缓存（秒）
+    GEMINI_MAX_RETRIES: int = int(os.getenv("GEMINI_MAX_RETRIES", 3))  # 429/5xx 最大重试次数
+    GEMINI_RETRY_BASE_DELAY: float = float(os.getenv("GEMINI_RETRY_BASE_DELAY", 0.5))  # 退避基准（秒）
     
     # WebSocket 配置
     WS_HEARTBEAT_INTERVAL: int = 30  # 秒
     WS_MAX_MESSAGE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    AUDIO_RING_BUFFER_S: float = float(os.getenv("AUDIO_RING_BUFFER_S", 60))  # 二进制协议每会话 PCM 环形缓冲区时长
     
     # API 配置
     API_TIMEOUT: int = 30  # 秒
     
+    # 翻译微批处理配置
+    TRANSLATION_BATCH_MAX_SIZE: int = int(os.getenv("TRANSLATION_BATCH_MAX_SIZE", 8))
+    TRANSLATION_BATCH_MAX_WAIT_MS: int = int(os.getenv("TRANSLATION_BATCH_MAX_WAIT_MS", 300))
+    TRANSLATION_BATCH_MAX_CHARS: int = int(os.getenv("TRANSLATION_BATCH_MAX_CHARS", 4000))
+    
+    TRANSLATION_STREAM_MIN_CHARS: int = int(os.getenv("TRANSLATION_STREAM_MIN_CHARS", 40))  # 不短于此长度的片段流式翻译
+    
+    # 翻译缓存配置
+    TRANSLATION_CACHE_MAX_ENTRIES: int = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", 10000))  # 内存 LRU 条目数
+    TRANSLATION_CACHE_PATH: str = os.getenv(
+        "TRANSLATION_CACHE_PATH", os.path.join(DATA_DIR, "translation_cache.db")
+    )
+    
+    # 转录存储（最终转录块和译文按会话追加保存，批量提交）
+    TRANSCRIPT_STORE_PATH: str = os.getenv("TRANSCRIPT_STORE_PATH", os.path.join(DATA_DIR, "transcripts.db"))
+    TRANSCRIPT_FLUSH_MS: int = int(os.getenv("TRANSCRIPT_FLUSH_MS", 200))  # 合并提交的时间窗口
+    TRANSCRIPT_FLUSH_MAX_BATCH: int = int(os.getenv("TRANSCRIPT_FLUSH_MAX_BATCH", 256))  # 攒满多少条立即提交
+    TRANSCRIPT_EXPORT_CHUNK_KB: int = int(os.getenv("TRANSCRIPT_EXPORT_CHUNK_KB", 64))  # 导出时每次发送的数据量
+    
+    # ASR 引擎配置
+    ASR_ENGINE: str = os.getenv("ASR_ENGINE", "whisper")  # whisper / whisper-int8 / faster-whisper
+    WHISPER_MODEL: str = os.getenv("WHISPER_MODEL", "small")
+    ASR_DEVICE: str = os.getenv("ASR_DEVICE", "")  # 为空时自动选择（whisper-int8 固定为 CPU）
+    ASR_COMPUTE_TYPE: str = os.getenv("ASR_COMPUTE_TYPE", "int8")  # faster-whisper 计算精度
+    ASR_CPU_THREADS: int = int(os.getenv("ASR_CPU_THREADS", 0))  # faster-whisper 线程数（0 为自动）
+    
+    # 自适应解码（按推理延迟和队列深度在 束搜索 → 贪心 → 更小模型 之间切换）
+    ADAPTIVE_DECODING_ENABLED: bool = os.getenv("ADAPTIVE_DECODING_ENABLED", "true").lower() == "true"
+    ADAPTIVE_LATENCY_TARGET_MS: float = float(os.getenv("ADAPTIVE_LATENCY_TARGET_MS", 2500))  # 每块目标延迟
+    ADAPTIVE_FALLBACK_MODEL: str = os.getenv("ADAPTIVE_FALLBACK_MODEL", "")  # 最低档使用的小模型（如 base），为空不启用
+    ADAPTIVE_DOWNGRADE_AFTER: int = int(os.getenv("ADAPTIVE_DOWNGRADE_AFTER", 2))  # 连续超标多少批后降档
+    ADAPTIVE_UPGRADE_AFTER: int = int(os.getenv("ADAPTIVE_UPGRADE_AFTER", 10))  # 连续空闲多少批后升档
+    
+    # 模型加载（应用启动后在后台加载，/ready 报告各模型状态）
+    MODEL_READY_WAIT_S: float = float(os.getenv("MODEL_READY_WAIT_S", 30))  # WebSocket 连接等待模型就绪的最长时间
+    MODEL_MMAP_CACHE: bool = os.getenv("MODEL_MMAP_CACHE", "false").lower() == "true"  # 从本地内存映射缓存加载权重
+    MODEL_CACHE_DIR: str = os.getenv("MODEL_CACHE_DIR", os.path.join(DATA_DIR, "models"))
+    
+    # Whisper 批量推理调度配置
+    WHISPER_BATCH_MAX_SIZE: int = int(os.getenv("WHISPER_BATCH_MAX_SIZE", 8))
+    WHISPER_BATCH_MAX_WAIT_MS: int = int(os.getenv("WHISPER_BATCH_MAX_WAIT_MS", 50))
+    WHISPER_QUEUE_MAX_SIZE: int = int(os.getenv("WHISPER_QUEUE_MAX_SIZE", 64))
+    WHISPER_QUEUE_MAX_PER_SESSION: int = int(os.getenv("WHISPER_QUEUE_MAX_PER_SESSION", 4))
+    
+    # 推理工作进程池（0 表示在主进程的线程中推理）
+    INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", 0))  # 工作进程数，每个进程一份模型
+    INFERENCE_WORKER_THREADS: int = int(os.getenv("INFERENCE_WORKER_THREADS", 0))  # 每个进程的 PyTorch 线程数（0 为核心数 / 进程数）
+    INFERENCE_WORKER_PIN_CORES: bool = os.getenv("INFERENCE_WORKER_PIN_CORES", "true").lower() == "true"  # 绑定 CPU 核心（Linux）
+    INFERENCE_WORKER_TIMEOUT_S: float = float(os.getenv("INFERENCE_WORKER_TIMEOUT_S", 120))  # 等待空闲进程和单批推理结果的最长时间
+    
+    # 会话消息总线（memory：单节点；redis：多节点，转录/翻译事件经 Redis 送达持有 WebSocket 的节点）
+    SESSION_BUS: str = os.getenv("SESSION_BUS", "memory")
+    SESSION_BUS_URL: str = os.getenv("SESSION_BUS_URL", "redis://localhost:6379/0")
+    SESSION_BUS_CHANNEL_PREFIX: str = os.getenv("SESSION_BUS_CHANNEL_PREFIX", "class_recorder:session:")
+    
+    # 帧级 VAD 配置（只把语音区间送入 Whisper）
+    VAD_ENABLED: bool = os.getenv("VAD_ENABLED", "true").lower() == "true"
+    VAD_FRAME_MS: int = int(os.getenv("VAD_FRAME_MS", 30))
+    VAD_ENERGY_THRESHOLD: float = float(os.getenv("VAD_ENERGY_THRESHOLD", 0.01))
+    VAD_HANGOVER_MS: int = int(os.getenv("VAD_HANGOVER_MS", 300))
+    
+    # 流式转录配置（/ws/transcribe?mode=streaming）
+    STREAMING_HOP_S: float = float(os.getenv("STREAMING_HOP_S", 1.0))  # 重解码间隔
+    STREAMING_MAX_WINDOW_S: float = float(os.getenv("STREAMING_MAX_WINDOW_S", 20.0))  # 滚动缓冲区最大时长
+    STREAMING_PAUSE_S: float = float(os.getenv("STREAMING_PAUSE_S", 0.6))  # 停顿多久断句提交
+    STREAMING_LATENCY_TARGET_MS: float = float(os.getenv("STREAMING_LATENCY_TARGET_MS", 2000))
+    
+    # 说话人注册表配置
+    SPEAKER_REGISTRY_DIR: str = os.getenv("SPEAKER_REGISTRY_DIR", os.path.join(DATA_DIR, "speakers"))
+    SPEAKER_SIMILARITY_THRESHOLD: float = float(os.getenv("SPEAKER_SIMILARITY_THRESHOLD", 0.7))  # 默认阈值（0-1）
+    SPEAKER_EXECUTOR_WORKERS: int = int(os.getenv("SPEAKER_EXECUTOR_WORKERS", 2))  # 声纹计算线程数（与 Whisper 并行）
+    
+    # 块内说话人分离（滑动窗口声纹，按说话人轮次切分转录块）
+    SPEAKER_DIARIZATION_ENABLED: bool = os.getenv("SPEAKER_DIARIZATION_ENABLED", "false").lower() == "true"
+    DIARIZATION_WINDOW_S: float = float(os.getenv("DIARIZATION_WINDOW_S", 1.5))
+    DIARIZATION_STEP_S: float = float(os.getenv("DIARIZATION_STEP_S", 0.75))
+    DIARIZATION_MAX_WINDOWS: int = int(os.getenv("DIARIZATION_MAX_WINDOWS", 24))  # 每块窗口数上限（超出时加大步长）
+    DIARIZATION_CLUSTER_THRESHOLD: float = float(os.getenv("DIARIZATION_CLUSTER_THRESHOLD", 0.8))  # 未注册说话人聚类阈值
+    DIARIZATION_MIN_TURN_S: float = float(os.getenv("DIARIZATION_MIN_TURN_S", 0.5))  # 更短的切片并入前一个说话人
+    
     # AWS S3 配置
     AWS_ACCESS_KEY_ID: str = os.getenv("AWS_ACCESS_KEY_ID", "")
     AWS_SECRET_ACCESS_KEY: str = os.getenv("AWS_SECRET_ACCESS_KEY", "")
     AWS_S3_BUCKET: str = os.getenv("AWS_S3_BUCKET", "")
     AWS_REGION: str = os.getenv("AWS_REGION", "us-east-1")
     USE_S3_STORAGE: bool = os.getenv("USE_S3_STORAGE", "false").lower() == "true"
+    AWS_S3_ENDPOINT_URL: str = os.getenv("AWS_S3_ENDPOINT_URL", "")  # S3 兼容服务地址（如 MinIO），为空使用 AWS
+    
+    # 录音存储（存储调用在独立线程池中执行；S3 存在性检查和预签名 URL 带缓存，连续失败时熔断）
+    RECORDING_STORE_THREADS: int = int(os.getenv("RECORDING_STORE_THREADS", 8))
+    RECORDING_STORE_CACHE_TTL_S: float = float(os.getenv("RECORDING_STORE_CACHE_TTL_S", 300))  # 存在性检查缓存时间
+    RECORDING_PRESIGN_EXPIRES_S: int = int(os.getenv("RECORDING_PRESIGN_EXPIRES_S", 3600))  # 下载重定向 URL 有效期
+    S3_BREAKER_FAILURES: int = int(os.getenv("S3_BREAKER_FAILURES", 5))  # 连续失败多少次后暂停访问 S3
+    S3_BREAKER_RESET_S: float = float(os.getenv("S3_BREAKER_RESET_S", 30))  # 暂停多久后试探恢复
+    
+    # 录音上传（分片写入本地磁盘，并行分片上传到 S3）
+    RECORDING_UPLOAD_PART_MB: int = int(os.getenv("RECORDING_UPLOAD_PART_MB", 8))  # 分片大小（S3 要求至少 5MB）
+    RECORDING_UPLOAD_CONCURRENCY: int = int(os.getenv("RECORDING_UPLOAD_CONCURRENCY", 4))  # 并行上传的分片数
+    
+    # 服务端录音（WebSocket 收到的音频直接写入录音文件）
+    SERVER_RECORDING_ENABLED: bool = os.getenv("SERVER_RECORDING_ENABLED", "true").lower() == "true"
+    RECORDING_WRITE_BUFFER_KB: int = int(os.getenv("RECORDING_WRITE_BUFFER_KB", 256))  # 攒满多少再写盘
+    RECORDING_RECONNECT_GRACE_S: float = float(os.getenv("RECORDING_RECONNECT_GRACE_S", 60))  # 断开后等待重连续写的时间
+    
+    # 录音压缩（后台用 ffmpeg 生成 FLAC 无损归档和 Opus 播放版本）
+    RECORDING_TRANSCODE_ENABLED: bool = os.getenv("RECORDING_TRANSCODE_ENABLED", "true").lower() == "true"
+    RECORDING_TRANSCODE_FORMATS: str = os.getenv("RECORDING_TRANSCODE_FORMATS", "flac,opus")  # 逗号分隔
+    RECORDING_OPUS_BITRATE_KBPS: int = int(os.getenv("RECORDING_OPUS_BITRATE_KBPS", 24))  # 16kHz 单声道语音
+    RECORDING_TRANSCODE_CONCURRENCY: int = int(os.getenv("RECORDING_TRANSCODE_CONCURRENCY", 1))  # 同时转码的录音数
+    RECORDING_RAW_RETENTION_HOURS: float = float(os.getenv("RECORDING_RAW_RETENTION_HOURS", 24))  # 原始 WAV 保留时长（-1 永久，0 转码后即删）
+    FFMPEG_BINARY: str = os.getenv("FFMPEG_BINARY", "ffmpeg")
+    
+    # 录音目录（录音元数据索引，列表分页查询）
+    RECORDING_CATALOG_PATH: str = os.getenv("RECORDING_CATALOG_PATH", os.path.join(DATA_DIR, "recordings.db"))
 
 settings = Settings()
 
@@ -5,6 +5,7 @@ Class Recorder Backend - FastAPI Application
 import os
 import logging
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
@@ -53,17 +54,51 @@ async def root():
 @app.get("/health")
 async def health_check():
     """健康检查端点"""
+    from services.session_bus import session_bus
     return {
         "status": "healthy",
-        "gemini_api_key_configured": bool(os.getenv("GEMINI_API_KEY"))
+        "gemini_api_key_configured": bool(os.getenv("GEMINI_API_KEY")),
+        "session_bus": session_bus.get_stats()
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """就绪检查端点 - 各模型加载状态，全部就绪前返回 503"""
+    from services.model_loader import model_loader
+    status = model_loader.get_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 # 导入路由
-from api import websocket, notes, speaker_api, recording
+from api import websocket, notes, speaker_api, recording, cache_api, asr_api, transcripts
 app.include_router(websocket.router)
 app.include_router(notes.router)
 app.include_router(speaker_api.router)
 app.include_router(recording.router)
+app.include_router(cache_api.router)
+app.include_router(asr_api.router)
+app.include_router(transcripts.router)
+
+@app.on_event("startup")
+async def startup():
+    """连接会话总线，并在后台加载模型，服务立即开始接受请求（/ready 报告加载进度）"""
+    from services.model_loader import model_loader
+    from services.session_bus import session_bus
+    model_loader.start()
+    await session_bus.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """应用关闭时释放连接池等资源"""
+    from services.transcription_service import transcription_service
+    from services.session_bus import session_bus
+    from services.recording_catalog import recording_catalog
+    from services.transcript_store import transcript_store
+    from api.recording import session_recordings
+    await session_recordings.close()
+    await transcription_service.close()
+    await session_bus.close()
+    recording_catalog.close()
+    await transcript_store.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,407 @@
+"""
+ASR 引擎 - 可插拔的语音识别后端（openai-whisper / int8 动态量化 / CTranslate2）
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Type
+
+import numpy as np
+import torch
+import whisper
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = 30 * SAMPLE_RATE  # Whisper 单个窗口（30 秒）
+
+# 实时率滑动平均的平滑系数
+RTF_EWMA_ALPHA = 0.2
+
+
+def _rss_bytes() -> Optional[int]:
+    """当前进程常驻内存（Linux），用于估算模型加载前后的内存占用"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _torch_module_nbytes(model) -> int:
+    """PyTorch 模型参数、缓冲区和量化权重占用的字节数"""
+    total = sum(t.numel() * t.element_size() for t in model.parameters())
+    total += sum(t.numel() * t.element_size() for t in model.buffers())
+    for module in model.modules():
+        # 动态量化的 Linear 权重打包存放，不在 parameters() 中
+        if hasattr(module, "_packed_params") and callable(getattr(module, "weight", None)):
+            weight = module.weight()
+            total += weight.numel() * weight.element_size()
+            bias = module.bias()
+            if bias is not None:
+                total += bias.numel() * bias.element_size()
+    return total
+
+
+def _cache_path(cache_dir: str, model_name: str) -> str:
+    return os.path.join(cache_dir, f"whisper-{model_name}.pt")
+
+
+def _write_mmap_cache(model, path: str):
+    """
+    把已加载的 whisper 模型写成可内存映射的检查点（torch.save 的 zip 格式）
+
+    非持久化缓冲区（解码掩码、对齐头）不在 state_dict 中，单独以稠密张量保存
+    """
+    persistent = set(model.state_dict())
+    extra_buffers = {}
+    sparse_buffers = []
+    for name, buffer in model.named_buffers():
+        if name in persistent:
+            continue
+        if buffer.is_sparse:
+            sparse_buffers.append(name)
+            buffer = buffer.to_dense()
+        extra_buffers[name] = buffer.cpu()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save({
+        "dims": vars(model.dims),
+        "model_state_dict": {k: v.cpu() for k, v in model.state_dict().items()},
+        "extra_buffers": extra_buffers,
+        "sparse_buffers": sparse_buffers,
+    }, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def _read_mmap_cache(path: str):
+    """
+    以内存映射方式加载检查点：模型在 meta 设备上构建（不分配、不随机初始化），
+    权重直接指向映射的文件页，由操作系统按需读入并在进程间共享页缓存
+    """
+    checkpoint = torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+    with torch.device("meta"):
+        model = whisper.model.Whisper(whisper.model.ModelDimensions(**checkpoint["dims"]))
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+    for name, buffer in checkpoint["extra_buffers"].items():
+        module_name, _, buffer_name = name.rpartition(".")
+        if name in checkpoint["sparse_buffers"]:
+            buffer = buffer.to_sparse()
+        model.get_submodule(module_name).register_buffer(buffer_name, buffer, persistent=False)
+    return model
+
+
+def load_whisper_model(model_name: str, device: Optional[str] = None, cache_dir: Optional[str] = None):
+    """
+    加载 openai-whisper 模型
+
+    配置了 cache_dir 时优先从本地内存映射缓存加载；缓存不存在则正常加载后写入缓存，
+    下次启动（包括 --reload 重启）即可跳过反序列化和权重拷贝
+    """
+    if not cache_dir:
+        return whisper.load_model(model_name, device=device)
+
+    path = _cache_path(cache_dir, model_name)
+    if os.path.exists(path):
+        try:
+            model = _read_mmap_cache(path)
+            logger.info(f"✅ Whisper weights memory-mapped from cache: {path}")
+            return model.to(device) if device and device != "cpu" else model
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to load whisper cache {path}, reloading: {e}")
+
+    model = whisper.load_model(model_name, device="cpu")
+    try:
+        _write_mmap_cache(model, path)
+        logger.info(f"💾 Whisper weights cached for memory-mapped loading: {path}")
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to write whisper cache {path}: {e}")
+    return model.to(device) if device and device != "cpu" else model
+
+
+class ASREngine:
+    """
+    ASR 引擎基类
+    功能：
+    1. 子类实现 _load() 和 _transcribe_batch()，声明支持的解码参数
+    2. 基类负责计时：实时率（RTF = 处理耗时 / 音频时长，越低越好）、加载耗时、内存占用
+    3. 不支持的解码参数自动忽略（启动时记录一次）
+    """
+
+    name = "base"
+    supported_options: Set[str] = set()
+    max_samples = CHUNK_SAMPLES  # 单条音频超过此长度时由引擎自行分窗
+
+    def __init__(self, model_name: str, options: Dict[str, Any], device: Optional[str] = None,
+                 cache_dir: Optional[str] = None):
+        self.model_name = model_name
+        self.device = device
+        self.cache_dir = cache_dir  # 本地模型缓存目录（None 表示使用默认下载位置）
+        self.options = self._filter_options(options)
+        self.model = None
+        self.memory_bytes: Optional[int] = None
+
+        self._lock = threading.Lock()
+        self.recent_rtf: Optional[float] = None
+        self.stats: Dict[str, float] = {
+            "batches": 0,
+            "items": 0,
+            "audio_s": 0.0,
+            "processing_s": 0.0,
+            "load_s": 0.0,
+        }
+
+    def _filter_options(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        ignored = sorted(set(options) - self.supported_options)
+        if ignored:
+            logger.info(f"ℹ️ ASR engine {self.name} ignores options: {', '.join(ignored)}")
+        return {key: value for key, value in options.items() if key in self.supported_options}
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def load(self):
+        """加载模型并记录加载耗时和内存占用"""
+        logger.info(f"🔄 Loading ASR engine {self.name} ({self.model_name})...")
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        self._load()
+        self.stats["load_s"] = time.perf_counter() - start
+
+        self.memory_bytes = self._model_nbytes()
+        if self.memory_bytes is None and rss_before is not None:
+            rss_after = _rss_bytes()
+            self.memory_bytes = max(0, rss_after - rss_before) if rss_after is not None else None
+
+        memory_mb = f"{self.memory_bytes / 1024 / 1024:.0f}MB" if self.memory_bytes is not None else "unknown"
+        logger.info(f"✅ ASR engine {self.name} loaded in {self.stats['load_s']:.1f}s (memory: {memory_mb})")
+
+    def transcribe_batch(self, audios: List[np.ndarray], options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        批量转录（在调度器的线程池中执行）
+
+        参数:
+            audios: 16kHz float32 音频列表
+            options: 本次调用覆盖的解码参数（不支持的参数忽略）
+
+        返回:
+            与输入等长的结果列表，每项为 {"text": ..., "language": ...}
+        """
+        merged = {**self.options, **{k: v for k, v in (options or {}).items() if k in self.supported_options}}
+        start = time.perf_counter()
+        results = self._transcribe_batch(audios, merged)
+        elapsed = time.perf_counter() - start
+
+        audio_s = sum(len(audio) for audio in audios) / SAMPLE_RATE
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["items"] += len(audios)
+            self.stats["audio_s"] += audio_s
+            self.stats["processing_s"] += elapsed
+            if audio_s > 0:
+                rtf = elapsed / audio_s
+                self.recent_rtf = rtf if self.recent_rtf is None else (
+                    RTF_EWMA_ALPHA * rtf + (1 - RTF_EWMA_ALPHA) * self.recent_rtf
+                )
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """引擎统计：实时率、内存占用、支持的参数"""
+        with self._lock:
+            stats = dict(self.stats)
+            recent_rtf = self.recent_rtf
+        return {
+            "engine": self.name,
+            "model": self.model_name,
+            "loaded": self.loaded,
+            **stats,
+            "rtf": stats["processing_s"] / stats["audio_s"] if stats["audio_s"] else None,
+            "recent_rtf": recent_rtf,
+            "memory_bytes": self.memory_bytes,
+            "supported_options": sorted(self.supported_options),
+            "options": {k: v for k, v in self.options.items() if k != "initial_prompt"},
+        }
+
+    # ---------- 子类实现 ----------
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _transcribe_batch(self, audios: List[np.ndarray], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def _model_nbytes(self) -> Optional[int]:
+        """模型权重字节数；无法直接统计时返回 None（改用加载前后的常驻内存差）"""
+        return None
+
+
+class WhisperEngine(ASREngine):
+    """
+    openai-whisper 后端（fp32/fp16）
+
+    不超过 30 秒的音频统一填充为 30 秒 mel 频谱，堆叠后执行一次批量编码/解码；
+    超过 30 秒的音频回退到逐条 transcribe（需要滑动窗口）
+    """
+
+    name = "whisper"
+    supported_options = {
+        "language", "task", "fp16", "initial_prompt", "temperature", "beam_size", "best_of",
+        "condition_on_previous_text", "no_speech_threshold", "logprob_threshold",
+        "compression_ratio_threshold", "word_timestamps",
+    }
+
+    def _load(self):
+        self.model = load_whisper_model(self.model_name, self.device, self.cache_dir)
+
+    def _model_nbytes(self) -> Optional[int]:
+        return _torch_module_nbytes(self.model)
+
+    def _transcribe_batch(self, audios: List[np.ndarray], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        results: List[Optional[Dict[str, Any]]] = [None] * len(audios)
+        if options.get("beam_size") == 1:
+            # 单路束搜索等价于贪心解码，直接用更快的 GreedyDecoder
+            options = {**options, "beam_size": None}
+
+        batch_indices = []
+        for i, audio in enumerate(audios):
+            if len(audio) <= whisper.audio.N_SAMPLES:
+                batch_indices.append(i)
+            else:
+                results[i] = self.model.transcribe(audio, **options)
+
+        if batch_indices:
+            mel_batch = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audios[i]), n_mels=self.model.dims.n_mels)
+                for i in batch_indices
+            ]).to(self.model.device)
+
+            # temperature=0 时 transcribe 会忽略 best_of，这里保持一致
+            decoding_options = whisper.DecodingOptions(
+                language=options.get("language"),
+                task=options.get("task", "transcribe"),
+                fp16=options.get("fp16", False),
+                prompt=options.get("initial_prompt"),
+                temperature=options.get("temperature", 0.0),
+                beam_size=options.get("beam_size"),
+            )
+            decoded = whisper.decode(self.model, mel_batch, decoding_options)
+
+            for i, result in zip(batch_indices, decoded):
+                text = result.text
+                # 与 transcribe 相同的静音判定：无语音概率高且置信度低时丢弃
+                if (result.no_speech_prob > options.get("no_speech_threshold", 0.6)
+                        and result.avg_logprob < options.get("logprob_threshold", -1.0)):
+                    text = ""
+                results[i] = {"text": text, "language": result.language}
+
+        return results
+
+
+class QuantizedWhisperEngine(WhisperEngine):
+    """
+    openai-whisper + PyTorch int8 动态量化（仅 CPU）
+
+    所有 Linear 层（注意力投影和 MLP，占大部分计算）的权重量化为 int8，
+    激活在运行时动态量化；卷积、LayerNorm 和词嵌入保持 fp32
+    """
+
+    name = "whisper-int8"
+
+    def _load(self):
+        model = load_whisper_model(self.model_name, "cpu", self.cache_dir)
+
+        # whisper 自定义的 Linear 子类不会被 quantize_dynamic 识别，先替换为标准 nn.Linear（共享权重）
+        for module in list(model.modules()):
+            for child_name, child in module.named_children():
+                if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                    linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                    linear.weight = child.weight
+                    if child.bias is not None:
+                        linear.bias = child.bias
+                    setattr(module, child_name, linear)
+
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model.eval()
+
+    def _transcribe_batch(self, audios: List[np.ndarray], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # 量化模型只能在 CPU 上以 fp32 激活运行
+        return super()._transcribe_batch(audios, {**options, "fp16": False})
+
+
+class FasterWhisperEngine(ASREngine):
+    """
+    CTranslate2 后端（faster-whisper，可选依赖），默认 int8 计算
+
+    CTranslate2 自行管理批内并行，这里逐条转录
+    """
+
+    name = "faster-whisper"
+    supported_options = {
+        "language", "task", "initial_prompt", "temperature", "beam_size", "best_of",
+        "condition_on_previous_text", "no_speech_threshold", "logprob_threshold",
+        "compression_ratio_threshold", "word_timestamps",
+    }
+
+    def __init__(self, model_name: str, options: Dict[str, Any], device: Optional[str] = None,
+                 cache_dir: Optional[str] = None, compute_type: str = "int8", cpu_threads: int = 0):
+        super().__init__(model_name, options, device, cache_dir)
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+
+    def _load(self):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise RuntimeError("ASR_ENGINE=faster-whisper requires the faster-whisper package") from e
+        self.model = WhisperModel(
+            self.model_name,
+            device=self.device or "cpu",
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads,
+            download_root=self.cache_dir,
+        )
+
+    def _transcribe_batch(self, audios: List[np.ndarray], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        kwargs = dict(options)
+        # faster-whisper 的参数名不同
+        if "logprob_threshold" in kwargs:
+            kwargs["log_prob_threshold"] = kwargs.pop("logprob_threshold")
+
+        results = []
+        for audio in audios:
+            segments, info = self.model.transcribe(audio, **kwargs)
+            results.append({"text": "".join(segment.text for segment in segments), "language": info.language})
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "compute_type": self.compute_type}
+
+
+# 可用的 ASR 引擎（ASR_ENGINE 配置项）
+ASR_ENGINES: Dict[str, Type[ASREngine]] = {
+    WhisperEngine.name: WhisperEngine,
+    QuantizedWhisperEngine.name: QuantizedWhisperEngine,
+    FasterWhisperEngine.name: FasterWhisperEngine,
+}
+
+
+def create_asr_engine(
+    name: str,
+    model_name: str,
+    options: Dict[str, Any],
+    device: Optional[str] = None,
+    compute_type: str = "int8",
+    cpu_threads: int = 0,
+    cache_dir: Optional[str] = None,
+) -> ASREngine:
+    """按名称创建 ASR 引擎（未加载模型）"""
+    engine_cls = ASR_ENGINES.get(name)
+    if engine_cls is None:
+        raise ValueError(f"Unknown ASR engine: {name} (available: {', '.join(ASR_ENGINES)})")
+    if engine_cls is FasterWhisperEngine:
+        return FasterWhisperEngine(
+            model_name, options, device, cache_dir, compute_type=compute_type, cpu_threads=cpu_threads
+        )
+    return engine_cls(model_name, options, device, cache_dir)
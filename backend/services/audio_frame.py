@@ -0,0 +1,93 @@
+"""
+音频帧 - 单个音频块及其按需计算、缓存的派生特征
+"""
+import time
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class AudioFrame:
+    """
+    一个音频块（16-bit PCM, 16kHz, mono）在处理管线中的载体
+
+    各种视图和特征在第一次访问时计算并缓存，之后各阶段直接复用：
+    - int16: PCM 样本（np.frombuffer 视图，不复制）
+    - float32: 归一化到 [-1, 1] 的样本
+    - rms: 能量
+    - vad_mask: 语音活动掩码（由 VAD 阶段填充）
+    - speaker_embedding: 声纹特征（由说话人识别阶段填充）
+    """
+
+    def __init__(self, pcm: Union[bytes, memoryview, None] = None, session_id: str = "default", sample_rate: int = SAMPLE_RATE):
+        self.pcm = pcm
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self.received_at = time.time()  # 接收时间（近似为音频结束时刻）
+
+        self._int16: Optional[np.ndarray] = None
+        self._float32: Optional[np.ndarray] = None
+        self._rms: Optional[float] = None
+
+        self.vad_mask: Optional[np.ndarray] = None
+        self.speaker_embedding: Optional[np.ndarray] = None
+
+        # 各阶段的输出和耗时（毫秒）
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+
+    @classmethod
+    def from_float32(cls, samples: np.ndarray, session_id: str = "default", sample_rate: int = SAMPLE_RATE) -> "AudioFrame":
+        """由已归一化的 float32 样本构建（如流式模式的滚动缓冲区）"""
+        frame = cls(None, session_id=session_id, sample_rate=sample_rate)
+        frame._float32 = samples
+        return frame
+
+    @classmethod
+    def wrap(cls, audio: Union["AudioFrame", bytes, memoryview], session_id: str = "default") -> "AudioFrame":
+        """已是 AudioFrame 则原样返回，否则包装 PCM 字节"""
+        if isinstance(audio, AudioFrame):
+            return audio
+        return cls(audio, session_id=session_id)
+
+    @property
+    def int16(self) -> np.ndarray:
+        if self._int16 is None:
+            if self.pcm is not None:
+                self._int16 = np.frombuffer(self.pcm, dtype=np.int16)
+            else:
+                self._int16 = (np.clip(self._float32, -1.0, 1.0) * 32767.0).astype(np.int16)
+        return self._int16
+
+    @property
+    def float32(self) -> np.ndarray:
+        if self._float32 is None:
+            self._float32 = self.int16.astype(np.float32) / 32768.0
+        return self._float32
+
+    @property
+    def rms(self) -> float:
+        if self._rms is None:
+            samples = self.float32
+            self._rms = float(np.sqrt(np.mean(samples ** 2))) if len(samples) else 0.0
+        return self._rms
+
+    @property
+    def num_samples(self) -> int:
+        return len(self._float32) if self._float32 is not None else len(self.int16)
+
+    @property
+    def duration(self) -> float:
+        """时长（秒）"""
+        return self.num_samples / self.sample_rate
+
+    @property
+    def nbytes(self) -> int:
+        """PCM 字节数"""
+        return self.num_samples * 2
+
+    def wall_time(self, offset_s: float) -> float:
+        """块内偏移（秒）对应的墙上时间"""
+        return self.received_at - self.duration + offset_s
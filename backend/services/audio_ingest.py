@@ -0,0 +1,198 @@
+"""
+音频接入 - 二进制 WebSocket 帧协议与预分配 PCM 环形缓冲区
+"""
+import logging
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 二进制帧格式（小端）：
+#   version         uint8   协议版本（当前为 1）
+#   sample_format   uint8   1 = int16 PCM，2 = float32 PCM（16kHz，单声道）
+#   flags           uint16  bit0 = 块结束（服务端立即转录已累积的音频）
+#   sequence        uint32  帧序号（逐帧递增）
+#   timestamp       uint64  客户端时间戳（毫秒）
+# 之后紧跟原始 PCM 数据
+FRAME_HEADER = struct.Struct("<BBHIQ")
+FRAME_VERSION = 1
+
+SAMPLE_FORMAT_INT16 = 1
+SAMPLE_FORMAT_FLOAT32 = 2
+SAMPLE_DTYPES = {
+    SAMPLE_FORMAT_INT16: np.dtype("<i2"),
+    SAMPLE_FORMAT_FLOAT32: np.dtype("<f4"),
+}
+
+FLAG_END_OF_CHUNK = 0x1
+
+
+class BinaryFrameError(ValueError):
+    """二进制帧格式错误"""
+
+
+def parse_binary_frame(data: bytes) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    解析二进制音频帧
+
+    返回:
+        (帧头字典, PCM 样本) —— 样本是 data 上的只读视图，不复制
+    """
+    if len(data) < FRAME_HEADER.size:
+        raise BinaryFrameError(f"帧长度不足: {len(data)} bytes")
+
+    version, sample_format, flags, sequence, timestamp = FRAME_HEADER.unpack_from(data)
+    if version != FRAME_VERSION:
+        raise BinaryFrameError(f"不支持的协议版本: {version}")
+
+    dtype = SAMPLE_DTYPES.get(sample_format)
+    if dtype is None:
+        raise BinaryFrameError(f"不支持的采样格式: {sample_format}")
+
+    payload = memoryview(data)[FRAME_HEADER.size:]
+    if len(payload) % dtype.itemsize:
+        raise BinaryFrameError(f"PCM 数据长度不是 {dtype.itemsize} 字节的整数倍")
+
+    header = {
+        "version": version,
+        "sample_format": sample_format,
+        "flags": flags,
+        "sequence": sequence,
+        "timestamp": timestamp,
+    }
+    return header, np.frombuffer(payload, dtype=dtype)
+
+
+class PcmRingBuffer:
+    """
+    预分配的 int16 PCM 环形缓冲区
+
+    写满时覆盖最旧的音频（并计数），读取时在不回绕的情况下返回视图
+    """
+
+    def __init__(self, capacity_samples: int):
+        self.buffer = np.zeros(capacity_samples, dtype=np.int16)
+        self.capacity = capacity_samples
+        self.head = 0  # 下一个写入位置
+        self.size = 0  # 当前可读样本数
+        self.dropped_samples = 0
+
+    @property
+    def available(self) -> int:
+        return self.size
+
+    def write(self, samples: np.ndarray) -> int:
+        """
+        写入样本（int16 直接拷贝；float32 在拷贝时转换为 int16）
+
+        返回:
+            写入的样本数
+        """
+        if len(samples) > self.capacity:
+            # 单次写入超过容量，只保留最新的部分
+            self.dropped_samples += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+
+        n = len(samples)
+        overflow = self.size + n - self.capacity
+        if overflow > 0:
+            self.dropped_samples += overflow
+            self.size -= overflow
+            logger.warning(f"⚠️ PCM ring buffer overflow, dropped {overflow} samples")
+
+        first = min(n, self.capacity - self.head)
+        self._copy_into(self.buffer[self.head:self.head + first], samples[:first])
+        if first < n:
+            self._copy_into(self.buffer[:n - first], samples[first:])
+
+        self.head = (self.head + n) % self.capacity
+        self.size += n
+        return n
+
+    @staticmethod
+    def _copy_into(target: np.ndarray, source: np.ndarray):
+        if source.dtype.kind == "f":
+            np.multiply(np.clip(source, -1.0, 1.0), 32767.0, out=target, casting="unsafe")
+        else:
+            target[:] = source
+
+    def peek_last(self, n: int) -> np.ndarray:
+        """
+        查看最近写入的 n 个样本（不消费）
+
+        不回绕时返回缓冲区视图（在下一次 write 之前有效）；回绕时拼接为新数组
+        """
+        n = min(n, self.size)
+        start = (self.head - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.buffer[start:start + n]
+        return np.concatenate((self.buffer[start:], self.buffer[:self.head]))
+
+    def read(self, n: Optional[int] = None) -> np.ndarray:
+        """
+        读取并消费最多 n 个样本（默认全部）
+
+        不回绕时返回缓冲区视图（在下一次 write 之前有效）；回绕时拼接为新数组
+        """
+        n = self.size if n is None else min(n, self.size)
+        start = (self.head - self.size) % self.capacity
+        end = start + n
+        self.size -= n
+
+        if end <= self.capacity:
+            return self.buffer[start:end]
+        return np.concatenate((self.buffer[start:], self.buffer[:end - self.capacity]))
+
+
+class AudioIngestSession:
+    """
+    单个 WebSocket 连接的二进制音频接入状态
+    功能：
+    1. 将帧中的 PCM 直接写入预分配环形缓冲区
+    2. 跟踪帧序号（检测丢帧、乱序、重复）
+    3. 记录客户端到服务端的传输延迟
+    """
+
+    def __init__(self, session_id: str, capacity_s: float = 60.0, sample_rate: int = 16000):
+        self.session_id = session_id
+        self.ring = PcmRingBuffer(int(capacity_s * sample_rate))
+        self.last_sequence: Optional[int] = None
+        self.frames = 0
+        self.lost_frames = 0
+        self.last_transit_ms = 0.0
+        self.last_frame_samples = 0  # 最近一帧写入环形缓冲区的样本数
+
+    def ingest(self, data: bytes) -> Optional[Dict[str, Any]]:
+        """
+        接收一个二进制帧
+
+        返回:
+            帧头字典；重复或过期的帧返回 None（已丢弃）
+        """
+        header, samples = parse_binary_frame(data)
+        sequence = header["sequence"]
+
+        if self.last_sequence is not None:
+            if sequence <= self.last_sequence:
+                logger.warning(f"⚠️ Dropping stale frame {sequence} from {self.session_id} (last: {self.last_sequence})")
+                return None
+            if sequence > self.last_sequence + 1:
+                self.lost_frames += sequence - self.last_sequence - 1
+                logger.warning(f"⚠️ Frame gap for {self.session_id}: {self.last_sequence} -> {sequence}")
+
+        self.last_sequence = sequence
+        self.frames += 1
+        self.last_transit_ms = time.time() * 1000 - header["timestamp"]
+        self.last_frame_samples = self.ring.write(samples)
+        return header
+
+    def last_frame(self) -> memoryview:
+        """最近一帧的 int16 PCM 字节视图（不消费，可直接写入录音）"""
+        return memoryview(self.ring.peek_last(self.last_frame_samples)).cast("B")
+
+    def take_chunk(self) -> memoryview:
+        """取出已累积的全部 PCM，作为字节视图（可直接 np.frombuffer）"""
+        return memoryview(self.ring.read()).cast("B")
@@ -0,0 +1,220 @@
+"""
+音频处理管线 - 可插拔、分阶段计时的音频块处理流程
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Dict, List, Optional
+
+from services.audio_frame import AudioFrame
+from services.vad import VoiceActivityDetector
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStage:
+    """
+    管线阶段基类
+
+    子类实现 process()：读取/填充 AudioFrame 上的缓存特征和结果，
+    返回 False 表示该块无需继续处理（如静音）
+    """
+
+    name = "stage"
+
+    async def process(self, frame: AudioFrame) -> bool:
+        raise NotImplementedError
+
+
+class SilenceGateStage(PipelineStage):
+    """静音门：整块能量低于阈值时跳过后续阶段"""
+
+    name = "silence_gate"
+
+    def __init__(self, service):
+        self.service = service
+
+    async def process(self, frame: AudioFrame) -> bool:
+        if self.service.is_silence(frame):
+            logger.debug(f"⏭️ Skipping silence ({frame.nbytes} bytes)")
+            frame.results["silent"] = True
+            return False
+        return True
+
+
+class VADStage(PipelineStage):
+    """
+    帧级语音活动检测：填充 frame.vad_mask 和 frame.results["speech_regions"]，
+    没有语音区间时停止（不送入 Whisper）
+    """
+
+    name = "vad"
+
+    def __init__(self, detector: VoiceActivityDetector, max_region_s: float = 28.0):
+        self.detector = detector
+        self.max_region_s = max_region_s
+
+    async def process(self, frame: AudioFrame) -> bool:
+        frame.vad_mask = self.detector.detect(frame.float32)
+        regions = self.detector.speech_regions(frame.float32, frame.vad_mask, self.max_region_s)
+        frame.results["speech_regions"] = regions
+        if not regions:
+            logger.debug(f"⏭️ No speech regions in {frame.duration:.1f}s chunk")
+            return False
+        speech = sum(end - start for start, end in regions) / frame.sample_rate
+        logger.debug(f"🗣️ VAD kept {speech:.1f}s of {frame.duration:.1f}s in {len(regions)} regions")
+        return True
+
+
+class WhisperStage(PipelineStage):
+    """Whisper 转录：结果写入 frame.results["text"]，空文本时停止"""
+
+    name = "whisper"
+
+    def __init__(self, service):
+        self.service = service
+
+    async def process(self, frame: AudioFrame) -> bool:
+        text = await self.service.transcribe_audio_with_whisper(frame)
+        frame.results["text"] = text
+        if not text:
+            logger.info("ℹ️ No transcription (silence or noise)")
+        return bool(text)
+
+
+class SpeakerStage(PipelineStage):
+    """
+    说话人识别：结果写入 frame.results["speaker"] / ["speaker_confidence"]
+
+    声纹前向计算在线程池中执行，不阻塞事件循环
+    """
+
+    name = "speaker"
+
+    def __init__(self, service, executor: Optional[Executor] = None):
+        self.service = service
+        self.executor = executor
+
+    async def process(self, frame: AudioFrame) -> bool:
+        loop = asyncio.get_running_loop()
+        speaker_type, confidence = await loop.run_in_executor(self.executor, self.service.detect_speaker, frame)
+        frame.results["speaker"] = speaker_type
+        frame.results["speaker_confidence"] = confidence
+        return True
+
+
+class DiarizationStage(PipelineStage):
+    """
+    块内说话人分离（在 Whisper 之前）：轮次写入 frame.results["speaker_spans"]，
+    Whisper 阶段据此在说话人切换处切分语音；时长最长的说话人作为整块的说话人
+    """
+
+    name = "diarization"
+
+    def __init__(self, service, executor: Optional[Executor] = None):
+        self.service = service
+        self.executor = executor
+
+    async def process(self, frame: AudioFrame) -> bool:
+        loop = asyncio.get_running_loop()
+        spans = await loop.run_in_executor(self.executor, self.service.diarize_speakers, frame)
+        frame.results["speaker_spans"] = spans
+        dominant = max(spans, key=lambda span: span["end"] - span["start"])
+        frame.results["speaker"] = dominant["speaker"]
+        frame.results["speaker_confidence"] = dominant["confidence"]
+        if dominant["speaker_match"]:
+            frame.results["speaker_match"] = dominant["speaker_match"]
+        return True
+
+
+class ParallelStage(PipelineStage):
+    """
+    并行阶段：同时执行多个互不依赖的子阶段（如 Whisper 和说话人识别），全部完成后汇合
+
+    整体耗时为各子阶段的最大值而不是总和；任一子阶段返回 False 时后续阶段不再执行，
+    任一子阶段出错时取消其余子阶段
+    """
+
+    def __init__(self, name: str, stages: List[PipelineStage]):
+        self.name = name
+        self.stages = stages
+
+    async def _timed(self, stage: PipelineStage, frame: AudioFrame) -> bool:
+        start = time.perf_counter()
+        try:
+            return await stage.process(frame)
+        finally:
+            frame.timings[stage.name] = (time.perf_counter() - start) * 1000
+
+    async def process(self, frame: AudioFrame) -> bool:
+        tasks = [asyncio.ensure_future(self._timed(stage, frame)) for stage in self.stages]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return all(results)
+
+
+class AudioPipeline:
+    """
+    按顺序执行各阶段，记录每个阶段的耗时
+
+    阶段可在运行时增删（如 VAD）。管线只处理块模式下需要转录的音频：
+    静音门之后的阶段可能被跳过，流式模式不经过管线，所以录音写入不作为阶段，
+    由 WebSocket 端点在收到音频时直接写入
+    """
+
+    def __init__(self, stages: Optional[List[PipelineStage]] = None):
+        self.stages: List[PipelineStage] = list(stages or [])
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def add_stage(self, stage: PipelineStage, before: Optional[str] = None):
+        """添加阶段（默认追加到末尾，或插入到指定阶段之前）"""
+        if before is not None:
+            for i, existing in enumerate(self.stages):
+                if existing.name == before:
+                    self.stages.insert(i, stage)
+                    return
+        self.stages.append(stage)
+
+    def remove_stage(self, name: str):
+        """按名称移除阶段"""
+        self.stages = [stage for stage in self.stages if stage.name != name]
+
+    async def run(self, frame: AudioFrame) -> bool:
+        """
+        依次执行各阶段
+
+        返回:
+            是否所有阶段都执行完毕（某阶段返回 False 时提前结束）
+        """
+        for stage in self.stages:
+            start = time.perf_counter()
+            try:
+                proceed = await stage.process(frame)
+            finally:
+                self._record(stage.name, frame, (time.perf_counter() - start) * 1000)
+                # 并行阶段的子阶段各自计时
+                for substage in getattr(stage, "stages", ()):
+                    if substage.name in frame.timings:
+                        self._record(substage.name, frame, frame.timings[substage.name])
+            if not proceed:
+                return False
+        return True
+
+    def _record(self, name: str, frame: AudioFrame, elapsed_ms: float):
+        frame.timings[name] = elapsed_ms
+        stat = self.stats.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stat["calls"] += 1
+        stat["total_ms"] += elapsed_ms
+        stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """各阶段耗时统计"""
+        return {
+            name: {**stat, "avg_ms": stat["total_ms"] / stat["calls"] if stat["calls"] else 0.0}
+            for name, stat in self.stats.items()
+        }
@@ -0,0 +1,160 @@
+"""
+自适应解码策略 - 按实时负载在解码质量档位之间切换
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from services.asr_engines import ASREngine
+
+logger = logging.getLogger(__name__)
+
+# 每档实时率滑动平均的平滑系数
+RTF_EWMA_ALPHA = 0.3
+
+
+class DecodingTier:
+    """一个解码质量档位：使用的 ASR 引擎 + 覆盖的解码参数"""
+
+    def __init__(self, name: str, engine: ASREngine, options: Dict[str, Any]):
+        self.name = name
+        self.engine = engine
+        self.options = options
+
+
+class AdaptiveDecodingPolicy:
+    """
+    自适应解码策略
+    功能：
+    1. 档位从高质量到低开销排列（如束搜索 → 贪心 → 更小的模型）
+    2. 每个批次完成后观测：块的端到端延迟（排队 + 推理）和推理队列深度
+    3. 延迟超过目标或队列积压连续若干次 → 降一档
+    4. 延迟远低于目标、队列为空连续若干次，且按上一档的实时率估算不会超标 → 升一档
+    5. 切换后重新计数（滞回），避免来回抖动；切换记录在统计中
+    """
+
+    def __init__(
+        self,
+        tiers: List[DecodingTier],
+        latency_target_ms: float = 2500,
+        queue_high: int = 8,
+        downgrade_after: int = 2,
+        upgrade_after: int = 10,
+        upgrade_ratio: float = 0.5,
+        enabled: bool = True,
+    ):
+        """
+        参数:
+            latency_target_ms: 每个音频块的目标延迟（毫秒）
+            queue_high: 排队数达到此值视为过载
+            downgrade_after / upgrade_after: 连续多少次观测后降档/升档
+            upgrade_ratio: 延迟低于目标的该比例才考虑升档
+            enabled: 关闭时固定使用最高档
+        """
+        if not tiers:
+            raise ValueError("At least one decoding tier is required")
+        self.tiers = tiers
+        self.latency_target_ms = latency_target_ms
+        self.queue_high = max(1, queue_high)
+        self.downgrade_after = max(1, downgrade_after)
+        self.upgrade_after = max(1, upgrade_after)
+        self.upgrade_ratio = upgrade_ratio
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._level = 0
+        self._over = 0
+        self._under = 0
+        self._since = time.monotonic()
+        self._tier_rtf: Dict[str, float] = {}
+        self._last_latency_ms: Optional[float] = None
+
+        self.time_in_tier: Dict[str, float] = {tier.name: 0.0 for tier in tiers}
+        self.transitions: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self.stats = {"observations": 0, "downgrades": 0, "upgrades": 0}
+
+    @property
+    def current(self) -> DecodingTier:
+        return self.tiers[self._level]
+
+    def record_batch(self, tier: DecodingTier, audio_s: float, elapsed_s: float):
+        """记录某档位一次批量推理的实时率（在推理线程中调用）"""
+        if audio_s <= 0:
+            return
+        rtf = elapsed_s / audio_s
+        with self._lock:
+            previous = self._tier_rtf.get(tier.name)
+            self._tier_rtf[tier.name] = rtf if previous is None else (
+                RTF_EWMA_ALPHA * rtf + (1 - RTF_EWMA_ALPHA) * previous
+            )
+
+    def observe(self, latency_ms: float, queue_depth: int):
+        """
+        每个批次完成后调用：根据端到端延迟和队列深度决定是否切换档位
+
+        参数:
+            latency_ms: 本批次中最慢一个块的延迟（排队 + 推理）
+            queue_depth: 批次完成时仍在排队的块数
+        """
+        with self._lock:
+            self.stats["observations"] += 1
+            self._last_latency_ms = latency_ms
+            if not self.enabled:
+                return
+
+            overloaded = latency_ms > self.latency_target_ms or queue_depth >= self.queue_high
+            idle = latency_ms < self.latency_target_ms * self.upgrade_ratio and queue_depth == 0
+            self._over = self._over + 1 if overloaded else 0
+            self._under = self._under + 1 if idle else 0
+
+            if self._over >= self.downgrade_after and self._level < len(self.tiers) - 1:
+                self._switch(self._level + 1, f"latency {latency_ms:.0f}ms, queue {queue_depth}")
+            elif self._under >= self.upgrade_after and self._level > 0 and self._upgrade_fits(latency_ms):
+                self._switch(self._level - 1, f"latency {latency_ms:.0f}ms, queue idle")
+
+    def _upgrade_fits(self, latency_ms: float) -> bool:
+        """按两档的实时率之比估算升档后的延迟，仍低于目标才升档（调用方持有锁）"""
+        current_rtf = self._tier_rtf.get(self.current.name)
+        higher_rtf = self._tier_rtf.get(self.tiers[self._level - 1].name)
+        if not current_rtf or higher_rtf is None:
+            return True
+        return latency_ms * higher_rtf / current_rtf < self.latency_target_ms
+
+    def _switch(self, level: int, reason: str):
+        """切换档位（调用方持有锁）"""
+        now = time.monotonic()
+        previous = self.current
+        self.time_in_tier[previous.name] += now - self._since
+        self._since = now
+        self._level = level
+        self._over = self._under = 0
+
+        direction = "downgrades" if level > self.tiers.index(previous) else "upgrades"
+        self.stats[direction] += 1
+        self.transitions.append({
+            "time": time.time(),
+            "from": previous.name,
+            "to": self.current.name,
+            "reason": reason,
+        })
+        icon = "⬇️" if direction == "downgrades" else "⬆️"
+        logger.info(f"{icon} Decoding tier {previous.name} → {self.current.name} ({reason})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """策略统计：当前档位、切换次数和记录、各档停留时间和实时率"""
+        with self._lock:
+            time_in_tier = dict(self.time_in_tier)
+            time_in_tier[self.current.name] += time.monotonic() - self._since
+            return {
+                **self.stats,
+                "enabled": self.enabled,
+                "current_tier": self.current.name,
+                "tiers": [tier.name for tier in self.tiers],
+                "latency_target_ms": self.latency_target_ms,
+                "last_latency_ms": self._last_latency_ms,
+                "time_in_tier_s": time_in_tier,
+                "tier_rtf": dict(self._tier_rtf),
+                "transitions": list(self.transitions),
+            }
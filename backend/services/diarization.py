@@ -0,0 +1,119 @@
+"""
+块内说话人分离 - 滑动窗口、窗口聚类和说话人轮次切分
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+from services.vad import Region
+
+
+def window_starts(num_samples: int, window: int, step: int, max_windows: int) -> np.ndarray:
+    """
+    滑动窗口起点（样本坐标）
+
+    窗口数超过 max_windows 时加大步长，单块的计算量有上限；最后一个窗口对齐块尾
+    """
+    if num_samples <= window:
+        return np.zeros(1, dtype=np.int64)
+    span = num_samples - window
+    step = max(step, int(np.ceil(span / max(1, max_windows - 1))))
+    starts = np.arange(0, span + 1, step, dtype=np.int64)
+    if starts[-1] != span:
+        starts = np.append(starts, span)
+    return starts
+
+
+def speech_overlap(starts: np.ndarray, window: int, regions: List[Region]) -> np.ndarray:
+    """每个窗口中语音所占的比例"""
+    ends = starts + window
+    overlap = np.zeros(len(starts), dtype=np.float64)
+    for start, end in regions:
+        overlap += np.clip(np.minimum(ends, end) - np.maximum(starts, start), 0, None)
+    return overlap / window
+
+
+def cluster_embeddings(embeddings: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    在线质心聚类（声纹已归一化）
+
+    依次把每个窗口分给最相似的簇，相似度（映射到 0-1）低于阈值时新建簇
+
+    返回:
+        每个窗口的簇编号
+    """
+    labels = np.zeros(len(embeddings), dtype=np.int64)
+    centroids: List[np.ndarray] = []
+    counts: List[int] = []
+    for i, embedding in enumerate(embeddings):
+        if centroids:
+            scores = (np.stack(centroids) @ embedding + 1.0) * 0.5
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                counts[best] += 1
+                centroid = centroids[best] + (embedding - centroids[best]) / counts[best]
+                centroids[best] = centroid / (np.linalg.norm(centroid) + 1e-8)
+                labels[i] = best
+                continue
+        centroids.append(embedding)
+        counts.append(1)
+        labels[i] = len(centroids) - 1
+    return labels
+
+
+def smooth_labels(labels: List[str]) -> List[str]:
+    """前后窗口同属一个说话人时，修正夹在中间的单个异常窗口"""
+    smoothed = list(labels)
+    for i in range(1, len(labels) - 1):
+        if labels[i - 1] == labels[i + 1] != labels[i]:
+            smoothed[i] = labels[i - 1]
+    return smoothed
+
+
+def window_turns(starts: np.ndarray, window: int, labels: List[str], num_samples: int) -> List[Tuple[int, int, str]]:
+    """
+    相邻同标签窗口合并为说话人轮次（样本坐标）
+
+    窗口之间的边界取相邻窗口中心的中点，首尾轮次延伸到块的起止
+    """
+    centers = starts + window // 2
+    bounds = np.concatenate([[0], (centers[:-1] + centers[1:]) // 2, [num_samples]])
+    turns: List[Tuple[int, int, str]] = []
+    for i, label in enumerate(labels):
+        if turns and turns[-1][2] == label:
+            turns[-1] = (turns[-1][0], int(bounds[i + 1]), label)
+        else:
+            turns.append((int(bounds[i]), int(bounds[i + 1]), label))
+    return turns
+
+
+def split_regions_by_turns(
+    regions: List[Region],
+    turns: List[Tuple[int, int, int]],
+    min_samples: int
+) -> List[Tuple[int, List[Region]]]:
+    """
+    在说话人轮次边界处切分语音区间
+
+    参数:
+        turns: (起点, 终点, 轮次编号)，按时间排序且覆盖整个块
+        min_samples: 短于此长度的切片并入前一个说话人，避免送入 Whisper 的碎片
+
+    返回:
+        [(轮次编号, 该说话人连续的语音区间), ...]，同一说话人的相邻切片合并在一起
+    """
+    runs: List[Tuple[int, List[Region]]] = []
+    for start, end in regions:
+        for turn_start, turn_end, turn in turns:
+            piece_start, piece_end = max(start, turn_start), min(end, turn_end)
+            if piece_end <= piece_start:
+                continue
+            if runs and (runs[-1][0] == turn or piece_end - piece_start < min_samples):
+                last_regions = runs[-1][1]
+                if last_regions[-1][1] == piece_start:
+                    last_regions[-1] = (last_regions[-1][0], piece_end)
+                else:
+                    last_regions.append((piece_start, piece_end))
+            else:
+                runs.append((turn, [(piece_start, piece_end)]))
+    return runs
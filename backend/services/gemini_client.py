@@ -0,0 +1,163 @@
+"""
+Gemini HTTP 客户端 - 长连接池 + 带抖动的指数退避重试
+"""
+import asyncio
+import json
+import logging
+import random
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# 需要重试的 HTTP 状态码（限流和服务端错误）
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeminiAPIError(Exception):
+    """Gemini API 返回错误状态"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"API error: {status}")
+        self.status = status
+        self.message = message
+
+
+class GeminiClient:
+    """
+    Gemini API 客户端（服务级单例，复用连接）
+    功能：
+    1. 一个长期存在的 ClientSession：keep-alive 连接池、DNS 缓存
+    2. 可配置的总连接数和每主机连接数
+    3. 429/5xx 和网络错误时按带抖动的指数退避重试（支持 Retry-After）
+    4. 应用关闭时显式释放连接
+    """
+
+    def __init__(
+        self,
+        proxy: Optional[str] = None,
+        timeout: float = 30,
+        pool_limit: int = 100,
+        pool_limit_per_host: int = 20,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 60,
+        max_retries: int = 3,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 8.0,
+    ):
+        self.proxy = proxy
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """懒创建会话（必须在事件循环中创建）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"Content-Type": "application/json"},
+            )
+            logger.info(f"🔌 Gemini HTTP pool created (limit: {self.pool_limit}, per host: {self.pool_limit_per_host})")
+        return self._session
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """第 attempt 次重试前的等待时间（full jitter；服务端给出 Retry-After 时优先）"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.retry_max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    async def post_json(self, url: str, payload: Dict[str, Any]) -> Any:
+        """
+        POST JSON 并返回解析后的响应，可重试的错误自动重试
+
+        异常:
+            GeminiAPIError: 非 200 响应（重试耗尽或不可重试）
+            asyncio.TimeoutError / aiohttp.ClientError: 网络错误（重试耗尽）
+        """
+        session = self._get_session()
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                async with session.post(url, json=payload, proxy=self.proxy) as response:
+                    if response.status == 200:
+                        return await response.json(content_type=None)
+
+                    error_text = await response.text()
+                    logger.error(f"Gemini API error: {response.status} - {error_text}")
+                    if response.status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                        raise GeminiAPIError(response.status, error_text)
+                    retry_after = response.headers.get("Retry-After")
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"⚠️ Gemini request failed ({type(e).__name__}: {e})")
+
+            delay = self._backoff_delay(attempt, retry_after)
+            attempt += 1
+            logger.info(f"🔁 Retrying Gemini request in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    async def stream_sse(self, url: str, payload: Dict[str, Any]) -> AsyncIterator[Any]:
+        """
+        POST JSON 并逐个产出服务端推送的 SSE 事件（`data: {...}` 行解析后的对象）
+
+        只在收到第一个事件之前重试；开始产出后出错直接抛出，避免重复内容
+        """
+        session = self._get_session()
+        attempt = 0
+        while True:
+            retry_after = None
+            started = False
+            try:
+                async with session.post(url, json=payload, proxy=self.proxy) as response:
+                    if response.status == 200:
+                        async for line in response.content:
+                            line = line.strip()
+                            if not line.startswith(b"data:"):
+                                continue
+                            started = True
+                            yield json.loads(line[5:])
+                        return
+
+                    error_text = await response.text()
+                    logger.error(f"Gemini API error: {response.status} - {error_text}")
+                    if response.status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                        raise GeminiAPIError(response.status, error_text)
+                    retry_after = response.headers.get("Retry-After")
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if started or attempt >= self.max_retries:
+                    raise
+                logger.warning(f"⚠️ Gemini stream failed ({type(e).__name__}: {e})")
+
+            delay = self._backoff_delay(attempt, retry_after)
+            attempt += 1
+            logger.info(f"🔁 Retrying Gemini stream in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("🔌 Gemini HTTP pool closed")
+        self._session = None
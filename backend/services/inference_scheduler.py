@@ -0,0 +1,248 @@
+"""
+推理调度服务 - 跨会话批量 Whisper 推理
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerQueueFull(Exception):
+    """推理队列已满（过载保护）"""
+
+
+class InferenceScheduler:
+    """
+    跨会话推理调度器
+    功能：
+    1. 收集所有会话的待推理音频块，凑批后执行一次批量推理
+    2. 可配置最大批大小和最大等待时间
+    3. 会话间轮询取样（每个会话每轮最多取一个），保证公平性
+    4. 有界队列，过载时快速拒绝，而不是无限堆积；一个音频块的多个分段作为一个请求整体接受或拒绝
+    5. 可同时执行多个批次（推理工作进程池有几个进程就并发几个批次）
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: int = 50,
+        max_queue_size: int = 64,
+        max_per_session: int = 4,
+        max_concurrency: int = 1,
+        on_batch: Optional[Callable[[Dict[str, float]], None]] = None,
+    ):
+        """
+        参数:
+            batch_fn: 批量推理函数（在线程池中执行），输入列表，返回等长结果列表
+            max_batch_size: 单批最大条数
+            max_wait_ms: 凑批最大等待时间（毫秒），从批次中最早的请求开始计时
+            max_queue_size: 全局最大排队数（按条数）
+            max_per_session: 单个会话最多同时排队的请求数（submit_many 的一次提交算一个请求）
+            max_concurrency: 同时执行的批次数
+            on_batch: 每个批次完成后回调（批大小、最长排队时间、推理耗时、剩余排队数），
+                用于自适应解码等负载控制
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self.max_queue_size = max(1, max_queue_size)
+        self.max_per_session = max(1, max_per_session)
+        self.max_concurrency = max(1, max_concurrency)
+        self.on_batch = on_batch
+
+        # session_id -> [(输入, future, 入队时间)]，按轮询顺序排列
+        self._queues: "OrderedDict[str, Deque[Tuple[Any, asyncio.Future, float]]]" = OrderedDict()
+        self._pending = 0
+        self._session_requests: Dict[str, int] = {}  # session_id -> 未完成的请求数
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+        # 运行统计
+        self.stats: Dict[str, float] = {
+            "batches": 0,
+            "items": 0,
+            "rejected": 0,
+            "total_queue_ms": 0.0,
+            "total_infer_ms": 0.0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        """当前排队数"""
+        return self._pending
+
+    def _ensure_worker(self):
+        """在当前事件循环中启动调度协程（首次提交时懒启动）"""
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, session_id: str, item: Any) -> Any:
+        """
+        提交一个推理请求并等待结果
+
+        异常:
+            SchedulerQueueFull: 全局或该会话的队列已满
+        """
+        return (await self.submit_many(session_id, [item]))[0]
+
+    async def submit_many(self, session_id: str, items: List[Any]) -> List[Any]:
+        """
+        作为一个请求提交多条推理（如一个音频块的多个分段）并等待全部结果
+
+        全部入队或全部拒绝：不会出现部分分段已在推理、其余被拒绝而整块作废的情况；
+        各条仍分别参与跨会话轮询合批
+
+        异常:
+            SchedulerQueueFull: 全局队列已满，或该会话未完成的请求数已达上限
+        """
+        if not items:
+            return []
+        self._ensure_worker()
+
+        if self._pending >= self.max_queue_size or (
+            self._session_requests.get(session_id, 0) >= self.max_per_session
+        ):
+            self.stats["rejected"] += 1
+            logger.warning(f"⚠️ Inference queue full, rejecting chunk from {session_id} (pending: {self._pending})")
+            raise SchedulerQueueFull("推理队列已满，请稍后重试")
+
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(session_id)
+        if queue is None:
+            queue = self._queues[session_id] = deque()
+        now = time.monotonic()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            queue.append((item, future, now))
+            futures.append(future)
+        self._pending += len(items)
+        self._session_requests[session_id] = self._session_requests.get(session_id, 0) + 1
+        self._wakeup.set()
+
+        try:
+            # 调用方取消时 gather 会取消尚未完成的 future，调度时跳过
+            return await asyncio.gather(*futures)
+        finally:
+            remaining = self._session_requests[session_id] - 1
+            if remaining:
+                self._session_requests[session_id] = remaining
+            else:
+                del self._session_requests[session_id]
+
+    def _take_batch(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        """按会话轮询取出一个批次"""
+        batch = []
+        while len(batch) < self.max_batch_size and self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            batch.append(queue.popleft())
+            self._pending -= 1
+            if queue:
+                # 该会话还有剩余，排到队尾，让其他会话先取
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+        return batch
+
+    def _oldest_enqueue_time(self) -> float:
+        return min(queue[0][2] for queue in self._queues.values())
+
+    async def _run(self):
+        """调度主循环"""
+        while True:
+            try:
+                if not self._pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                # 等待空闲的执行槽（全部忙碌时队列继续积累，下一批更大）
+                await self._slots.acquire()
+
+                # 等待批次凑满，或最早的请求等待超时
+                deadline = self._oldest_enqueue_time() + self.max_wait
+                while self._pending < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+
+                # 跳过已取消的请求（例如客户端断开）
+                batch = [entry for entry in self._take_batch() if not entry[1].done()]
+                if not batch:
+                    self._slots.release()
+                    continue
+
+                task = asyncio.create_task(self._execute(batch))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Inference scheduler loop error: {e}")
+
+    async def _execute(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        """在线程池中执行一个批次，并分发结果，完成后释放执行槽"""
+        try:
+            await self._execute_batch(batch)
+        finally:
+            self._slots.release()
+
+    async def _execute_batch(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        start = time.monotonic()
+        try:
+            results = await asyncio.to_thread(self.batch_fn, [entry[0] for entry in batch])
+        except Exception as e:
+            logger.error(f"❌ Batch inference failed ({len(batch)} items): {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        end = time.monotonic()
+        self.stats["batches"] += 1
+        self.stats["items"] += len(batch)
+        self.stats["total_infer_ms"] += (end - start) * 1000
+        self.stats["total_queue_ms"] += sum(start - enqueued for _, _, enqueued in batch) * 1000
+        logger.info(f"⚡ Batch inference: {len(batch)} chunks in {(end - start) * 1000:.0f} ms (pending: {self._pending})")
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+        if self.on_batch is not None:
+            try:
+                self.on_batch({
+                    "batch_size": len(batch),
+                    "max_queue_ms": max(start - enqueued for _, _, enqueued in batch) * 1000,
+                    "infer_ms": (end - start) * 1000,
+                    "queue_depth": self._pending,
+                })
+            except Exception as e:
+                logger.error(f"❌ Batch callback failed: {e}")
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取调度统计"""
+        batches = self.stats["batches"] or 1
+        items = self.stats["items"] or 1
+        return {
+            **self.stats,
+            "queue_depth": self._pending,
+            "inflight_batches": len(self._inflight),
+            "avg_batch_size": self.stats["items"] / batches,
+            "avg_queue_ms": self.stats["total_queue_ms"] / items,
+            "avg_infer_ms": self.stats["total_infer_ms"] / batches,
+        }
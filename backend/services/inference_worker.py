@@ -0,0 +1,110 @@
+"""
+推理工作进程入口 - 由 InferenceWorkerPool 以 `python -m services.inference_worker` 启动
+
+独立的入口模块，不经过 multiprocessing 的 spawn（spawn 会在子进程中重新导入 main.py，
+连带导入全部路由、创建 TranscriptionService 和日志文件），子进程只导入 ASR 引擎
+"""
+import logging
+import os
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+def worker_main(conn, config: Dict[str, Any]):
+    """
+    工作进程主循环
+
+    协议（连接上只传小消息）：
+        启动完成：("ready", 信息) 或 ("error", 错误)
+        请求：(共享内存名, 各条音频长度, 模型名, 解码参数)；None 表示退出
+        响应：("ok", 结果列表, 推理耗时) 或 ("error", 错误)
+    """
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - worker-{config['index']} - %(levelname)s - %(message)s")
+    try:
+        if config["cores"] and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, config["cores"])
+
+        import torch
+        from services.asr_engines import create_asr_engine
+
+        torch.set_num_threads(config["threads"])
+        torch.set_num_interop_threads(1)
+
+        engines = {}
+        for model_name in config["models"]:
+            engine = create_asr_engine(
+                config["engine"],
+                model_name,
+                config["options"],
+                device=config["device"],
+                compute_type=config["compute_type"],
+                cpu_threads=config["threads"],
+                cache_dir=config["cache_dir"],
+            )
+            engine.load()
+            engines[model_name] = engine
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+
+    conn.send(("ready", {
+        "pid": os.getpid(),
+        "memory_bytes": sum(engine.memory_bytes or 0 for engine in engines.values()),
+    }))
+
+    shm: Optional[shared_memory.SharedMemory] = None
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            shm_name, lengths, model_name, options = message
+            if shm is None or shm.name != shm_name:
+                # 主进程扩容后换了新的共享内存块
+                if shm is not None:
+                    shm.close()
+                shm = shared_memory.SharedMemory(name=shm_name)
+                # 共享内存归主进程所有：本进程的 resource_tracker 不应在退出时删除它
+                resource_tracker.unregister(shm._name, "shared_memory")
+
+            # 直接在共享内存上构造视图，不复制音频
+            buffer = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+            offsets = np.cumsum([0] + list(lengths))
+            audios = [buffer[offsets[i]:offsets[i + 1]] for i in range(len(lengths))]
+            try:
+                start = time.perf_counter()
+                results = engines[model_name].transcribe_batch(audios, options)
+                conn.send(("ok", results, time.perf_counter() - start))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+            finally:
+                # 释放对共享内存的引用，之后才能关闭
+                del audios, buffer
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if shm is not None:
+            shm.close()
+
+
+def main():
+    """
+    从 stdin 读取主进程监听地址和认证密钥（不出现在命令行和环境变量中），
+    连接后第一条消息是配置
+    """
+    address = sys.stdin.readline().strip()
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    conn = Client(address, authkey=authkey)
+    try:
+        worker_main(conn, conn.recv())
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+推理工作进程池 - 每个进程持有独立的 ASR 模型，音频经共享内存传递
+"""
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.asr_engines import CHUNK_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+# 工作进程入口模块（独立进程启动，只导入 ASR 引擎，见 services/inference_worker.py）
+WORKER_MODULE = "services.inference_worker"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 工作进程连回主进程的最长等待时间（秒）
+WORKER_CONNECT_TIMEOUT_S = 60
+
+# 工作进程加载模型的最长等待时间（秒）
+WORKER_START_TIMEOUT_S = 600
+
+# 关闭时等待工作进程退出的时间（秒）
+WORKER_STOP_TIMEOUT_S = 5
+
+# 重启失败后的重试间隔（秒）：从 BASE 开始每次翻倍，最长 MAX
+WORKER_RESTART_BACKOFF_BASE_S = 1
+WORKER_RESTART_BACKOFF_MAX_S = 60
+
+# 等待空闲进程时检查存活进程的间隔（秒）
+WORKER_ACQUIRE_POLL_S = 1
+
+
+class WorkerPoolUnavailable(RuntimeError):
+    """没有存活的工作进程（全部退出且正在重启），或等待空闲进程超时"""
+
+
+class _Worker:
+    """主进程中对一个工作进程的句柄：进程、管道和输入共享内存"""
+
+    def __init__(self, index: int, cores: List[int]):
+        self.index = index
+        self.cores = cores
+        self.process = None
+        self.conn = None
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.info: Dict[str, Any] = {}
+        self.restarting = False
+        self.stats = {"batches": 0, "items": 0, "busy_s": 0.0, "errors": 0, "timeouts": 0, "restarts": 0}
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def ensure_capacity(self, num_samples: int):
+        """输入共享内存不足时换一块更大的（工作进程按名称重新映射）"""
+        num_bytes = num_samples * 4
+        if self.shm is not None and self.shm.size >= num_bytes:
+            return
+        self.release_memory()
+        self.shm = shared_memory.SharedMemory(create=True, size=num_bytes)
+
+    def release_memory(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class InferenceWorkerPool:
+    """
+    推理工作进程池
+    功能：
+    1. N 个工作进程，各自加载一份模型，推理不与主进程（WebSocket、事件循环）争用 GIL
+    2. 每个进程限定 PyTorch 线程数，并可绑定到互不重叠的 CPU 核心，避免线程过度订阅
+    3. 音频写入该进程专属的共享内存块，管道上只传长度和参数，不序列化音频
+    4. 空闲进程放在队列中，调用方（调度器的线程）取到即用，N 个批次可同时推理
+    5. 进程异常退出或单批推理超时（被杀掉）时在后台重启，启动失败按指数退避重试
+    6. 等待空闲进程和推理结果都有超时；没有存活进程时立即报错，不会无限挂起
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        engine: str,
+        models: List[str],
+        options: Dict[str, Any],
+        device: Optional[str] = None,
+        compute_type: str = "int8",
+        cache_dir: Optional[str] = None,
+        threads_per_worker: int = 0,
+        pin_cores: bool = True,
+        slot_samples: int = CHUNK_SAMPLES,
+        timeout_s: float = 120,
+    ):
+        """
+        参数:
+            models: 每个进程加载的模型（各解码档位用到的模型）
+            threads_per_worker: 每个进程的 PyTorch 线程数（0 表示可用核心数 / 进程数）
+            pin_cores: 是否把每个进程绑定到各自的核心（仅 Linux）
+            slot_samples: 每个进程输入共享内存的初始容量（样本数）
+            timeout_s: 等待空闲进程、等待单批推理结果的最长时间（秒）
+        """
+        self.num_workers = max(1, num_workers)
+        self.engine = engine
+        self.models = models
+        self.options = options
+        self.device = device
+        self.compute_type = compute_type
+        self.cache_dir = cache_dir
+        self.slot_samples = slot_samples
+        self.timeout_s = timeout_s
+
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        self.threads = threads_per_worker or max(1, len(cores) // self.num_workers)
+        self.pin_cores = pin_cores and hasattr(os, "sched_setaffinity") and self.threads * self.num_workers <= len(cores)
+        self._workers = [
+            _Worker(i, cores[i * self.threads:(i + 1) * self.threads] if self.pin_cores else [])
+            for i in range(self.num_workers)
+        ]
+
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._closed = False
+        self._closing = threading.Event()  # 关闭时打断重启退避等待
+
+    # ---------- 生命周期 ----------
+
+    def _spawn(self, worker: _Worker):
+        """
+        启动一个工作进程并等待其加载完模型（阻塞）
+
+        以 `python -m services.inference_worker` 启动全新的解释器，而不是 multiprocessing 的 spawn：
+        spawn 会在子进程中重新导入主模块（main.py），连带创建整个应用。
+        （CUDA 和 PyTorch 线程池在 fork 后不可用，也不能用 fork）
+        """
+        authkey = os.urandom(32)
+        listener = Listener(authkey=authkey)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")]))
+        try:
+            process = subprocess.Popen([sys.executable, "-m", WORKER_MODULE], stdin=subprocess.PIPE, env=env)
+            # 监听地址和密钥经 stdin 传递，不出现在命令行和环境变量中
+            process.stdin.write(f"{listener.address}\n{authkey.hex()}\n".encode())
+            process.stdin.close()
+            parent_conn = self._accept(listener, authkey, process, worker)
+        finally:
+            listener.close()
+        parent_conn.send({
+            "index": worker.index,
+            "engine": self.engine,
+            "models": self.models,
+            "options": self.options,
+            "device": self.device,
+            "compute_type": self.compute_type,
+            "cache_dir": self.cache_dir,
+            "threads": self.threads,
+            "cores": worker.cores,
+        })
+
+        if not parent_conn.poll(WORKER_START_TIMEOUT_S):
+            process.kill()
+            parent_conn.close()
+            raise RuntimeError(f"Inference worker {worker.index} did not start within {WORKER_START_TIMEOUT_S}s")
+        try:
+            status, info = parent_conn.recv()
+        except EOFError:
+            status, info = "error", f"process exited with code {process.poll()}"
+        if status != "ready":
+            parent_conn.close()
+            self._wait(process)
+            raise RuntimeError(f"Inference worker {worker.index} failed to load models: {info}")
+
+        worker.process, worker.conn, worker.info = process, parent_conn, info
+        worker.ensure_capacity(self.slot_samples)
+        cores = f", cores {worker.cores[0]}-{worker.cores[-1]}" if worker.cores else ""
+        logger.info(f"✅ Inference worker {worker.index} ready (pid {info['pid']}, {self.threads} threads{cores})")
+
+    @staticmethod
+    def _accept(listener: Listener, authkey: bytes, process: subprocess.Popen, worker: _Worker):
+        """等待工作进程连回（进程提前退出或超时则杀掉并报错）"""
+        accepted: List[Any] = []
+
+        def accept():
+            try:
+                accepted.append(listener.accept())
+            except Exception as e:
+                accepted.append(e)
+
+        thread = threading.Thread(target=accept, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + WORKER_CONNECT_TIMEOUT_S
+        while thread.is_alive() and process.poll() is None and time.monotonic() < deadline:
+            thread.join(0.1)
+
+        if thread.is_alive():
+            # 自己连一次，让阻塞的 accept 返回
+            process.kill()
+            try:
+                Client(listener.address, authkey=authkey).close()
+            except Exception:
+                pass
+            thread.join(WORKER_STOP_TIMEOUT_S)
+            if accepted and not isinstance(accepted[0], Exception):
+                accepted[0].close()
+            exitcode = InferenceWorkerPool._wait(process)
+            raise RuntimeError(f"Inference worker {worker.index} did not connect (exit code {exitcode})")
+        if isinstance(accepted[0], Exception):
+            process.kill()
+            InferenceWorkerPool._wait(process)
+            raise RuntimeError(f"Inference worker {worker.index} failed to connect: {accepted[0]}")
+        return accepted[0]
+
+    @staticmethod
+    def _wait(process: subprocess.Popen, timeout: float = WORKER_STOP_TIMEOUT_S) -> Optional[int]:
+        """等待进程退出，超时则杀掉；返回退出码"""
+        try:
+            return process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            return process.wait()
+
+    def start(self) -> Dict[str, Any]:
+        """并行启动所有工作进程并等待模型加载完成（由 model_loader 在后台线程中调用）"""
+        errors: List[Exception] = []
+
+        def spawn(worker: _Worker):
+            try:
+                self._spawn(worker)
+                self._idle.put(worker)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=spawn, args=(worker,)) for worker in self._workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            self.close()
+            raise errors[0]
+        return {
+            "workers": self.num_workers,
+            "threads_per_worker": self.threads,
+            "models": self.models,
+        }
+
+    def _schedule_restart(self, worker: _Worker, kill: bool = False):
+        """在后台线程中重启工作进程（kill：不等待正常退出，用于卡住的进程）"""
+        worker.restarting = True
+        threading.Thread(target=self._restart, args=(worker, kill), daemon=True).start()
+
+    def _restart(self, worker: _Worker, kill: bool = False):
+        """工作进程异常退出或超时后重启（后台线程）；启动失败按指数退避一直重试，直到成功或池关闭"""
+        self._terminate(worker, kill=kill)
+        attempt = 0
+        while not self._closed:
+            worker.stats["restarts"] += 1
+            logger.warning(f"⚠️ Restarting inference worker {worker.index}")
+            try:
+                self._spawn(worker)
+            except Exception as e:
+                delay = min(WORKER_RESTART_BACKOFF_MAX_S, WORKER_RESTART_BACKOFF_BASE_S * 2 ** attempt)
+                attempt += 1
+                logger.error(f"❌ Failed to restart inference worker {worker.index}: {e} (retrying in {delay}s)")
+                self._terminate(worker, kill=True)
+                self._closing.wait(delay)
+                continue
+            worker.restarting = False
+            self._idle.put(worker)
+            return
+        worker.restarting = False
+
+    def _terminate(self, worker: _Worker, kill: bool = False):
+        if worker.conn is not None and not kill:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        if worker.process is not None:
+            if kill:
+                worker.process.kill()
+            self._wait(worker.process)
+        if worker.conn is not None:
+            worker.conn.close()
+        worker.process = worker.conn = None
+        worker.release_memory()
+
+    def close(self):
+        """通知所有工作进程退出并释放共享内存"""
+        self._closed = True
+        self._closing.set()
+        for worker in self._workers:
+            self._terminate(worker)
+
+    # ---------- 推理 ----------
+
+    def transcribe_batch(self, audios: List[np.ndarray], model_name: str, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        在一个空闲工作进程上批量转录（阻塞，线程安全；在调度器的线程池中调用）
+
+        返回:
+            与输入等长的结果列表，格式同 ASREngine.transcribe_batch
+        """
+        worker = self._acquire()
+        start = time.perf_counter()
+        try:
+            lengths = [len(audio) for audio in audios]
+            worker.ensure_capacity(sum(lengths))
+            buffer = np.ndarray((sum(lengths),), dtype=np.float32, buffer=worker.shm.buf)
+            offset = 0
+            for audio, length in zip(audios, lengths):
+                buffer[offset:offset + length] = audio
+                offset += length
+            del buffer
+
+            worker.conn.send((worker.shm.name, lengths, model_name, options))
+            if not worker.conn.poll(self.timeout_s):
+                # 进程没退出但不再响应：杀掉重启（该批结果作废）
+                worker.stats["timeouts"] += 1
+                self._schedule_restart(worker, kill=True)
+                raise TimeoutError(f"Inference worker {worker.index} did not reply within {self.timeout_s}s")
+            reply = worker.conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+            worker.stats["errors"] += 1
+            self._schedule_restart(worker)
+            raise RuntimeError(f"Inference worker {worker.index} exited unexpectedly") from e
+        except TimeoutError:
+            raise
+        except Exception:
+            self._idle.put(worker)
+            raise
+
+        worker.stats["busy_s"] += time.perf_counter() - start
+        self._idle.put(worker)
+        if reply[0] != "ok":
+            worker.stats["errors"] += 1
+            raise RuntimeError(f"Inference worker {worker.index} failed: {reply[1]}")
+
+        worker.stats["batches"] += 1
+        worker.stats["items"] += len(audios)
+        return reply[1]
+
+    def _acquire(self) -> _Worker:
+        """
+        取一个空闲工作进程（阻塞，最多等待 timeout_s）
+        没有存活进程（全部退出、正在重启）时立即抛 WorkerPoolUnavailable，调用方不会一直占着调度槽位
+        """
+        deadline = time.monotonic() + self.timeout_s
+        while True:
+            if self._closed:
+                raise WorkerPoolUnavailable("Inference worker pool is closed")
+            if not any(worker.alive and not worker.restarting for worker in self._workers):
+                restarting = sum(worker.restarting for worker in self._workers)
+                raise WorkerPoolUnavailable(
+                    f"No live inference workers ({restarting}/{self.num_workers} restarting)"
+                )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WorkerPoolUnavailable(f"No idle inference worker within {self.timeout_s}s")
+            try:
+                worker = self._idle.get(timeout=min(WORKER_ACQUIRE_POLL_S, remaining))
+            except queue.Empty:
+                continue
+            if worker.alive:
+                return worker
+            # 空闲期间退出的进程：重启后再回到队列
+            worker.stats["errors"] += 1
+            self._schedule_restart(worker)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各工作进程的状态、核心绑定和负载"""
+        return {
+            "workers": self.num_workers,
+            "threads_per_worker": self.threads,
+            "pin_cores": self.pin_cores,
+            "idle": self._idle.qsize(),
+            "processes": [
+                {
+                    "index": worker.index,
+                    "pid": worker.info.get("pid"),
+                    "alive": worker.alive,
+                    "restarting": worker.restarting,
+                    "cores": worker.cores,
+                    "memory_bytes": worker.info.get("memory_bytes"),
+                    "slot_bytes": worker.shm.size if worker.shm is not None else 0,
+                    **worker.stats,
+                }
+                for worker in self._workers
+            ],
+        }
@@ -0,0 +1,120 @@
+"""
+模型加载服务 - 应用启动后在后台加载模型，并提供就绪状态
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 模型状态
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelLoader:
+    """
+    后台模型加载器
+    功能：
+    1. 各服务在构造时登记加载函数，导入模块时不再阻塞
+    2. 应用启动后在线程池中并行加载，/health 和事件循环不受影响
+    3. 记录每个模型的状态（pending/loading/ready/failed）、耗时和错误
+    4. 连接可以等待全部模型加载结束（带超时）；必需模型失败时视为未就绪
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Dict[str, Any]] = {}
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._settled: Optional[asyncio.Event] = None
+
+    def register(self, name: str, load_fn: Callable[[], Any], required: bool = True):
+        """
+        登记一个模型加载函数（同步函数，在线程池中执行）
+
+        参数:
+            load_fn: 加载函数，可返回一个 dict 作为状态附加信息
+            required: 是否为服务必需（失败时 /ready 返回未就绪）
+        """
+        self._loaders[name] = load_fn
+        self._models[name] = {
+            "state": PENDING,
+            "required": required,
+            "load_s": None,
+            "error": None,
+            "info": None,
+        }
+
+    def start(self):
+        """在当前事件循环中启动所有未开始的加载任务（可重复调用）"""
+        if self._settled is None:
+            self._settled = asyncio.Event()
+        for name in self._loaders:
+            if name not in self._tasks:
+                self._tasks[name] = asyncio.create_task(self._load(name))
+        if not self._tasks:
+            self._settled.set()
+
+    async def _load(self, name: str):
+        model = self._models[name]
+        model["state"] = LOADING
+        start = time.perf_counter()
+        logger.info(f"🔄 Loading model in background: {name}")
+        try:
+            info = await asyncio.to_thread(self._loaders[name])
+            model["state"] = READY
+            model["info"] = info if isinstance(info, dict) else None
+            logger.info(f"✅ Model ready: {name} ({time.perf_counter() - start:.1f}s)")
+        except Exception as e:
+            model["state"] = FAILED
+            model["error"] = str(e)
+            logger.error(f"❌ Model failed to load: {name}: {e}")
+        finally:
+            model["load_s"] = time.perf_counter() - start
+            if self.is_settled():
+                self._settled.set()
+
+    def state(self, name: str) -> Optional[str]:
+        model = self._models.get(name)
+        return model["state"] if model else None
+
+    def is_settled(self, name: Optional[str] = None) -> bool:
+        """指定模型（默认全部）是否已加载结束（成功或失败）"""
+        names = [name] if name else list(self._models)
+        return all(self._models[n]["state"] in (READY, FAILED) for n in names if n in self._models)
+
+    def is_ready(self) -> bool:
+        """全部加载结束，且必需模型全部成功"""
+        return self.is_settled() and all(
+            model["state"] == READY for model in self._models.values() if model["required"]
+        )
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """
+        等待全部模型加载结束
+
+        返回:
+            超时前是否就绪
+        """
+        if self.is_ready():
+            return True
+        self.start()
+        try:
+            await asyncio.wait_for(self._settled.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.is_ready()
+
+    def get_status(self) -> Dict[str, Any]:
+        """就绪状态（/ready）"""
+        return {
+            "ready": self.is_ready(),
+            "models": {name: dict(model) for name, model in self._models.items()},
+        }
+
+
+# 全局实例
+model_loader = ModelLoader()
@@ -0,0 +1,271 @@
+"""
+录音目录 - SQLite 中的录音元数据索引（会话、大小、时长、存储位置、创建时间），支持游标分页
+"""
+import asyncio
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# 列表中默认下载版本的优先顺序（与下载接口一致：原始文件优先，其次无损）
+DEFAULT_FORMAT_ORDER = ["wav", "flac", "opus"]
+
+_COLUMNS = "filename, session_id, created_at, duration, size, storage, formats"
+
+
+def encode_cursor(created_at: float, filename: str) -> str:
+    """把一页最后一条的排序键编码为不透明游标"""
+    return base64.urlsafe_b64encode(json.dumps([created_at, filename]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """解析游标（格式不对时抛 ValueError）"""
+    try:
+        created_at, filename = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(created_at), str(filename)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class RecordingCatalog:
+    """
+    录音元数据目录
+    功能：
+    1. 每条录音一行（以原始 WAV 文件名为键），各版本（wav/flac/opus）的大小和存放位置（本地/S3）存在同一行
+    2. 上传、服务端录音、转码、S3 上传、保留策略清理和删除时更新，列表不再扫描目录
+    3. 按 (创建时间, 文件名) 倒序的游标分页，可按会话和日期过滤；都有索引，每页开销与录音总数无关
+    4. SQLite（WAL 模式），读写在线程池中执行
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库（调用方持有锁）"""
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS recordings (
+                    filename TEXT PRIMARY KEY,
+                    session_id TEXT,
+                    created_at REAL NOT NULL,
+                    duration REAL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    storage TEXT NOT NULL DEFAULT '',
+                    formats TEXT NOT NULL DEFAULT '{}'
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recordings_created ON recordings (created_at, filename)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recordings_session ON recordings (session_id, created_at, filename)"
+            )
+            self._db.commit()
+        return self._db
+
+    # ---------- 写入 ----------
+
+    def _record(
+        self,
+        db: sqlite3.Connection,
+        filename: str,
+        fmt: Optional[str] = None,
+        session_id: Optional[str] = None,
+        created_at: Optional[float] = None,
+        duration: Optional[float] = None,
+        size: Optional[int] = None,
+        local: Optional[bool] = None,
+        s3: Optional[bool] = None,
+    ):
+        """合并一条录音的元数据（调用方持有锁；None 表示不修改该字段）"""
+        row = db.execute(
+            "SELECT session_id, created_at, duration, formats FROM recordings WHERE filename = ?", (filename,)
+        ).fetchone()
+        if row is None:
+            row = (None, created_at or time.time(), None, "{}")
+        current_session, current_created, current_duration, formats_json = row
+        formats: Dict[str, Dict[str, Any]] = json.loads(formats_json)
+
+        if fmt is not None:
+            entry = formats.setdefault(fmt, {"size": 0, "local": False, "s3": False})
+            if size is not None:
+                entry["size"] = size
+            if local is not None:
+                entry["local"] = local
+            if s3 is not None:
+                entry["s3"] = s3
+            if not entry["local"] and not entry["s3"]:
+                # 该版本本地和 S3 都没有了
+                del formats[fmt]
+            if not formats:
+                db.execute("DELETE FROM recordings WHERE filename = ?", (filename,))
+                return
+
+        default_format = next((f for f in DEFAULT_FORMAT_ORDER if f in formats), None)
+        storage = "+".join(
+            location for location in ("local", "s3") if any(entry[location] for entry in formats.values())
+        )
+        db.execute(
+            f"INSERT OR REPLACE INTO recordings ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                filename,
+                session_id if session_id is not None else current_session,
+                created_at if created_at is not None else current_created,
+                duration if duration is not None else current_duration,
+                formats[default_format]["size"] if default_format else 0,
+                storage,
+                json.dumps(formats),
+            ),
+        )
+
+    def _record_many(self, entries: List[Dict[str, Any]]):
+        with self._lock:
+            db = self._connect()
+            for entry in entries:
+                self._record(db, **entry)
+            db.commit()
+
+    async def record(self, filename: str, fmt: Optional[str] = None, **fields):
+        """
+        登记或更新一条录音
+
+        参数:
+            filename: 录音的原始 WAV 文件名（各版本共用）
+            fmt: 要更新的版本（wav/flac/opus）；版本本地和 S3 都不存在时移除，录音没有任何版本时删除该行
+            fields: session_id / created_at / duration / size / local / s3
+        """
+        await self.record_many([{"filename": filename, "fmt": fmt, **fields}])
+
+    async def record_many(self, entries: Iterable[Dict[str, Any]]):
+        """批量登记（单个事务，用于导入已有录音）"""
+        entries = list(entries)
+        if not entries:
+            return
+        try:
+            await asyncio.to_thread(self._record_many, entries)
+        except sqlite3.Error as e:
+            logger.error(f"❌ Recording catalog write failed: {e}")
+
+    def _remove(self, filename: str):
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM recordings WHERE filename = ?", (filename,))
+            db.commit()
+
+    async def remove(self, filename: str):
+        await asyncio.to_thread(self._remove, filename)
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _to_dict(row: tuple) -> Dict[str, Any]:
+        filename, session_id, created_at, duration, size, storage, formats = row
+        return {
+            "filename": filename,
+            "session_id": session_id,
+            "created_at": created_at,
+            "duration": duration,
+            "size": size,
+            "storage": storage,
+            "formats": json.loads(formats),
+        }
+
+    def _get(self, filename: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT {_COLUMNS} FROM recordings WHERE filename = ?", (filename,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    async def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, filename)
+
+    def _list(
+        self,
+        limit: int,
+        cursor: Optional[str],
+        session_id: Optional[str],
+        since: Optional[float],
+        until: Optional[float],
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        conditions, params = [], []
+        if session_id is not None:
+            conditions.append("session_id = ?")
+            params.append(session_id)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        if cursor:
+            cursor_created, cursor_filename = decode_cursor(cursor)
+            conditions.append("(created_at < ? OR (created_at = ? AND filename < ?))")
+            params += [cursor_created, cursor_created, cursor_filename]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {_COLUMNS} FROM recordings {where} "
+                "ORDER BY created_at DESC, filename DESC LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+
+        # 多取一条判断是否还有下一页
+        entries = [self._to_dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = entries[-1]
+            next_cursor = encode_cursor(last["created_at"], last["filename"])
+        return entries, next_cursor
+
+    async def list(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        session_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按创建时间倒序分页列出录音
+
+        参数:
+            cursor: 上一页返回的游标（格式不对时抛 ValueError）
+            since/until: 创建时间范围（时间戳，since 含、until 不含）
+
+        返回:
+            (本页录音, 下一页游标；没有下一页时为 None)
+        """
+        return await asyncio.to_thread(self._list, limit, cursor, session_id, since, until)
+
+    def _is_empty(self) -> bool:
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM recordings LIMIT 1").fetchone() is None
+
+    async def is_empty(self) -> bool:
+        return await asyncio.to_thread(self._is_empty)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# 全局实例
+recording_catalog = RecordingCatalog(settings.RECORDING_CATALOG_PATH)
@@ -0,0 +1,337 @@
+"""
+录音存储 - 本地磁盘和 S3 后端的统一接口；阻塞调用在有界线程池中执行，S3 带缓存和熔断
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from config import settings
+from services.recording_upload import MultipartRecordingUpload
+
+logger = logging.getLogger(__name__)
+
+# 存储调用专用线程池（head_object、签名、删除、列目录等；分片上传另有 upload_executor）
+storage_executor = ThreadPoolExecutor(
+    max_workers=settings.RECORDING_STORE_THREADS,
+    thread_name_prefix="recording-store"
+)
+
+# "不存在" 的缓存时间（秒）：其他节点可能随后上传，比 "存在" 的缓存短
+NEGATIVE_CACHE_TTL_S = 30
+
+# 预签名 URL 在过期前多久重新生成（秒），保证返回给客户端的 URL 至少还有这么久有效
+PRESIGN_REFRESH_MARGIN_S = 300
+
+# 缓存条目数上限
+CACHE_MAX_ENTRIES = 10000
+
+# 表示对象不存在的 S3 错误码（不计入熔断）
+_NOT_FOUND_CODES = {"404", "NoSuchKey", "NotFound"}
+
+
+class StorageUnavailableError(RuntimeError):
+    """存储后端暂不可用（熔断打开或调用失败）"""
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    功能：
+    1. 连续失败达到阈值后打开，期间请求直接失败（不再等待超时），调用方改用其他存储
+    2. 打开一段时间后进入半开状态，放行一个试探请求：成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_s = reset_timeout_s
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.stats = {"failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout_s:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """是否放行本次请求（半开状态只放行一个试探请求）"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record_success(self):
+        if self._opened_at is not None:
+            logger.info("✅ Storage circuit closed")
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                self.stats["opened"] += 1
+                logger.warning(f"⚠️ Storage circuit opened after {self._failures} failures")
+            self._opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._failures, **self.stats}
+
+
+class RecordingStore:
+    """
+    录音存储接口（名称为录音文件名，如 recording_x.flac）
+    功能：
+    1. exists / delete / list_objects：对象的存在性、删除和列表
+    2. local_path：本地后端返回文件路径（由接口直接返回文件，支持 Range）
+    3. presigned_url：远程后端返回可直接下载的临时 URL
+    4. upload_file：把本地文件复制到该后端（本地后端即文件所在处，无需复制）
+    """
+
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        """当前是否可以访问（熔断打开时为 False）"""
+        return True
+
+    async def exists(self, name: str) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, name: str):
+        raise NotImplementedError
+
+    async def list_objects(self) -> List[Dict[str, Any]]:
+        """所有对象：[{"name", "size", "modified"（时间戳）}]"""
+        raise NotImplementedError
+
+    def local_path(self, name: str) -> Optional[str]:
+        return None
+
+    async def presigned_url(self, name: str, expires_in: int = 3600) -> Optional[str]:
+        return None
+
+    async def upload_file(
+        self, filepath: str, content_type: str, metadata: Optional[Dict[str, str]] = None
+    ) -> bool:
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"store": self.name}
+
+
+class LocalRecordingStore(RecordingStore):
+    """本地磁盘存储（录音的工作副本）"""
+
+    name = "local"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def local_path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(storage_executor, fn, *args)
+
+    async def exists(self, name: str) -> bool:
+        return await self._run(os.path.exists, self.local_path(name))
+
+    async def delete(self, name: str):
+        await self._run(os.remove, self.local_path(name))
+
+    def _list_objects(self) -> List[Dict[str, Any]]:
+        objects = []
+        for name in os.listdir(self.directory):
+            stat = os.stat(os.path.join(self.directory, name))
+            objects.append({"name": name, "size": stat.st_size, "modified": stat.st_mtime})
+        return objects
+
+    async def list_objects(self) -> List[Dict[str, Any]]:
+        return await self._run(self._list_objects)
+
+
+class S3RecordingStore(RecordingStore):
+    """
+    S3 存储
+    功能：
+    1. 所有 boto3 调用在 storage_executor 中执行，不阻塞事件循环
+    2. 存在性检查结果和预签名 URL 缓存（URL 缓存到过期前 PRESIGN_REFRESH_MARGIN_S 秒），
+       本进程上传/删除时使对应缓存失效
+    3. 熔断器：连续失败后暂停访问 S3，每个请求各自回退（不修改全局配置）
+    """
+
+    name = "s3"
+
+    def __init__(
+        self,
+        client: Any,
+        bucket: str,
+        prefix: str = "recordings/",
+        cache_ttl_s: float = 300,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_ttl_s = cache_ttl_s
+        self.breaker = breaker or CircuitBreaker()
+
+        self._exists_cache: "OrderedDict[str, tuple]" = OrderedDict()  # 名称 -> (是否存在, 失效时间)
+        self._url_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # (名称, 有效期) -> (URL, 重新生成时间)
+        self.stats = {"calls": 0, "exists_cache_hits": 0, "url_cache_hits": 0}
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}{name}"
+
+    @staticmethod
+    def _cache_put(cache: OrderedDict, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+    def _invalidate(self, name: str):
+        self._exists_cache.pop(name, None)
+        for cache_key in [k for k in self._url_cache if k[0] == name]:
+            del self._url_cache[cache_key]
+
+    async def _call(self, fn, **kwargs):
+        """在线程池中执行一次 boto3 调用，并按结果更新熔断器（对象不存在不算失败）"""
+        if not self.breaker.allow():
+            raise StorageUnavailableError("S3 circuit is open")
+        self.stats["calls"] += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                storage_executor, functools.partial(fn, **kwargs)
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in _NOT_FOUND_CODES:
+                self.breaker.record_success()
+                raise
+            self.breaker.record_failure()
+            raise StorageUnavailableError(str(e)) from e
+        except Exception as e:
+            self.breaker.record_failure()
+            raise StorageUnavailableError(str(e)) from e
+        self.breaker.record_success()
+        return result
+
+    async def exists(self, name: str) -> bool:
+        cached = self._exists_cache.get(name)
+        if cached is not None and time.monotonic() < cached[1]:
+            self.stats["exists_cache_hits"] += 1
+            return cached[0]
+        try:
+            await self._call(self.client.head_object, Bucket=self.bucket, Key=self.key(name))
+            found = True
+        except ClientError:
+            found = False
+        ttl = self.cache_ttl_s if found else min(self.cache_ttl_s, NEGATIVE_CACHE_TTL_S)
+        self._cache_put(self._exists_cache, name, (found, time.monotonic() + ttl))
+        return found
+
+    async def presigned_url(self, name: str, expires_in: int = 3600) -> str:
+        cache_key = (name, expires_in)
+        cached = self._url_cache.get(cache_key)
+        if cached is not None and time.time() < cached[1]:
+            self.stats["url_cache_hits"] += 1
+            return cached[0]
+        url = await self._call(
+            self.client.generate_presigned_url,
+            ClientMethod="get_object",
+            Params={"Bucket": self.bucket, "Key": self.key(name)},
+            ExpiresIn=expires_in,
+        )
+        refresh_at = time.time() + max(0, expires_in - PRESIGN_REFRESH_MARGIN_S)
+        self._cache_put(self._url_cache, cache_key, (url, refresh_at))
+        return url
+
+    async def delete(self, name: str):
+        self._invalidate(name)
+        await self._call(self.client.delete_object, Bucket=self.bucket, Key=self.key(name))
+
+    def _list_pages(self) -> List[Dict[str, Any]]:
+        objects = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                name = obj["Key"][len(self.prefix):]
+                if name and "/" not in name:
+                    objects.append({"name": name, "size": obj["Size"], "modified": obj["LastModified"].timestamp()})
+        return objects
+
+    async def list_objects(self) -> List[Dict[str, Any]]:
+        if not self.breaker.allow():
+            raise StorageUnavailableError("S3 circuit is open")
+        try:
+            objects = await asyncio.get_running_loop().run_in_executor(storage_executor, self._list_pages)
+        except Exception as e:
+            self.breaker.record_failure()
+            raise StorageUnavailableError(str(e)) from e
+        self.breaker.record_success()
+        return objects
+
+    async def upload_file(
+        self, filepath: str, content_type: str, metadata: Optional[Dict[str, str]] = None
+    ) -> bool:
+        """并行分片上传本地文件（可续传）；熔断打开时直接返回 False"""
+        if not self.breaker.allow():
+            return False
+        name = os.path.basename(filepath)
+        upload = await MultipartRecordingUpload.upload_file(
+            filepath,
+            self.client,
+            bucket=self.bucket,
+            key=self.key(name),
+            metadata=metadata,
+            content_type=content_type,
+            part_size=settings.RECORDING_UPLOAD_PART_MB * 1024 * 1024,
+            max_inflight=settings.RECORDING_UPLOAD_CONCURRENCY,
+        )
+        self.record_upload(name, upload)
+        return upload.uses_s3
+
+    def record_upload(self, name: str, upload: MultipartRecordingUpload):
+        """登记一次分片上传的结果（更新熔断器，使缓存失效）"""
+        self._invalidate(name)
+        if upload.s3_error is None:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "store": self.name,
+            "bucket": self.bucket,
+            "breaker": self.breaker.get_stats(),
+            "exists_cache_entries": len(self._exists_cache),
+            "url_cache_entries": len(self._url_cache),
+            **self.stats,
+        }
@@ -0,0 +1,209 @@
+"""
+录音转码服务 - 后台把原始 WAV 压缩为 FLAC（无损归档）和 Opus（播放），并按保留策略清理原始文件
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# 原始录音格式
+RAW_FORMAT = "wav"
+
+# 压缩版本：格式 -> (扩展名, ffmpeg 输出格式, ffmpeg 编码参数)
+RENDITIONS = {
+    "flac": (".flac", "flac", ["-c:a", "flac", "-compression_level", "8"]),
+    "opus": (".opus", "ogg", ["-c:a", "libopus", "-application", "voip"]),
+}
+
+# 各格式的 MIME 类型
+MEDIA_TYPES = {
+    RAW_FORMAT: "audio/wav",
+    "flac": "audio/flac",
+    "opus": "audio/ogg",
+}
+
+# 原始文件删除后，下载原始文件名时按此顺序改用压缩版本（无损优先）
+FALLBACK_FORMATS = ["flac", "opus"]
+
+# ffmpeg 错误输出最多保留的字符数
+FFMPEG_ERROR_CHARS = 500
+
+
+def recording_format(filename: str) -> Optional[str]:
+    """根据扩展名判断录音格式（不是录音文件时返回 None）"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == f".{RAW_FORMAT}":
+        return RAW_FORMAT
+    for fmt, (rendition_ext, _, _) in RENDITIONS.items():
+        if ext == rendition_ext:
+            return fmt
+    return None
+
+
+def format_path(filepath: str, fmt: str) -> str:
+    """同一录音某种格式的文件路径（也可用于文件名和 S3 键）"""
+    ext = f".{RAW_FORMAT}" if fmt == RAW_FORMAT else RENDITIONS[fmt][0]
+    return os.path.splitext(filepath)[0] + ext
+
+
+class RecordingTranscoder:
+    """
+    录音转码器
+    功能：
+    1. 录音结束后在后台调用 ffmpeg 生成配置的压缩版本（先写临时文件再原子替换，已存在的版本跳过）
+    2. 并发转码数有上限，转码不占用事件循环
+    3. 原始 WAV 保留策略：只有 FLAC 无损版本生成后才会删除；-1 永久保留，0 转码后立即删除，
+       N 表示保留 N 小时（由定期清理删除）
+    """
+
+    def __init__(
+        self,
+        formats: List[str],
+        opus_bitrate_kbps: int = 24,
+        concurrency: int = 1,
+        raw_retention_hours: float = 24,
+        ffmpeg: str = "ffmpeg",
+    ):
+        unknown = [fmt for fmt in formats if fmt not in RENDITIONS]
+        if unknown:
+            raise ValueError(f"Unknown recording formats: {', '.join(unknown)} (available: {', '.join(RENDITIONS)})")
+        self.formats = formats
+        self.opus_bitrate_kbps = opus_bitrate_kbps
+        self.raw_retention_hours = raw_retention_hours
+        self.ffmpeg = ffmpeg
+
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._active: Set[str] = set()
+        self.stats: Dict[str, int] = {"transcoded": 0, "failed": 0, "raw_bytes": 0, "compressed_bytes": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.formats)
+
+    def _encoder_args(self, fmt: str) -> List[str]:
+        args = list(RENDITIONS[fmt][2])
+        if fmt == "opus":
+            args += ["-b:a", f"{self.opus_bitrate_kbps}k"]
+        return args
+
+    async def transcode(self, filepath: str) -> Dict[str, str]:
+        """
+        生成录音的各压缩版本
+
+        返回:
+            格式 -> 文件路径（包括之前已生成的版本）
+        """
+        outputs: Dict[str, str] = {}
+        if not self.enabled or filepath in self._active:
+            return outputs
+        self._active.add(filepath)
+        try:
+            async with self._semaphore:
+                start = time.perf_counter()
+                created = []
+                for fmt in self.formats:
+                    output = format_path(filepath, fmt)
+                    if not os.path.exists(output):
+                        await self._run_ffmpeg(filepath, output, fmt)
+                        created.append(fmt)
+                    outputs[fmt] = output
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"❌ Failed to transcode {os.path.basename(filepath)}: {e}")
+            raise
+        finally:
+            self._active.discard(filepath)
+
+        if created:
+            raw_size = os.path.getsize(filepath)
+            sizes = {fmt: os.path.getsize(outputs[fmt]) for fmt in created}
+            self.stats["transcoded"] += 1
+            self.stats["raw_bytes"] += raw_size
+            self.stats["compressed_bytes"] += sum(sizes.values())
+            ratios = ", ".join(f"{fmt} {raw_size / max(1, size):.1f}x" for fmt, size in sizes.items())
+            logger.info(f"🗜️ Transcoded {os.path.basename(filepath)} in {time.perf_counter() - start:.1f}s ({ratios})")
+        return outputs
+
+    async def _run_ffmpeg(self, source: str, output: str, fmt: str):
+        temp_path = output + ".tmp"
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", source, *self._encoder_args(fmt), "-f", RENDITIONS[fmt][1], temp_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            message = stderr.decode(errors="replace").strip()[-FFMPEG_ERROR_CHARS:]
+            raise RuntimeError(f"ffmpeg exited with code {process.returncode}: {message}")
+        os.replace(temp_path, output)
+
+    # ---------- 原始文件保留策略 ----------
+
+    def can_delete_raw(self, filepath: str, now: Optional[float] = None) -> bool:
+        """原始 WAV 是否已过保留期且有无损版本可替代"""
+        if self.raw_retention_hours < 0 or filepath in self._active:
+            return False
+        if not os.path.exists(format_path(filepath, "flac")):
+            return False
+        age_s = (now or time.time()) - os.path.getmtime(filepath)
+        return age_s >= self.raw_retention_hours * 3600
+
+    def expired_raw_recordings(self, directory: str, exclude_suffixes: tuple = ()) -> List[str]:
+        """
+        目录下可以删除的原始 WAV（exclude_suffixes：存在这些旁路文件时跳过，如未完成的上传状态）
+        """
+        if not os.path.isdir(directory):
+            return []
+        now = time.time()
+        expired = []
+        for name in os.listdir(directory):
+            if recording_format(name) != RAW_FORMAT:
+                continue
+            filepath = os.path.join(directory, name)
+            if any(os.path.exists(filepath + suffix) for suffix in exclude_suffixes):
+                continue
+            if self.can_delete_raw(filepath, now):
+                expired.append(filepath)
+        return expired
+
+    def pending_recordings(self, directory: str, exclude_suffixes: tuple = ()) -> List[str]:
+        """目录下还缺少压缩版本的原始 WAV（启动时补做转码）"""
+        if not self.enabled or not os.path.isdir(directory):
+            return []
+        pending = []
+        for name in sorted(os.listdir(directory)):
+            if recording_format(name) != RAW_FORMAT:
+                continue
+            filepath = os.path.join(directory, name)
+            if any(os.path.exists(filepath + suffix) for suffix in exclude_suffixes):
+                continue
+            if not all(os.path.exists(format_path(filepath, fmt)) for fmt in self.formats):
+                pending.append(filepath)
+        return pending
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "formats": self.formats,
+            "raw_retention_hours": self.raw_retention_hours,
+            "active": len(self._active),
+            **self.stats,
+        }
+
+
+# 全局实例
+recording_transcoder = RecordingTranscoder(
+    [fmt.strip() for fmt in settings.RECORDING_TRANSCODE_FORMATS.split(",") if fmt.strip()]
+    if settings.RECORDING_TRANSCODE_ENABLED else [],
+    opus_bitrate_kbps=settings.RECORDING_OPUS_BITRATE_KBPS,
+    concurrency=settings.RECORDING_TRANSCODE_CONCURRENCY,
+    raw_retention_hours=settings.RECORDING_RAW_RETENTION_HOURS,
+    ffmpeg=settings.FFMPEG_BINARY,
+)
@@ -0,0 +1,320 @@
+"""
+录音上传服务 - 分片流式写入本地磁盘，并行分片上传到 S3（可断点续传）
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# S3 分片上传要求除最后一片外每片至少 5MB
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# 上传状态文件后缀（与本地录音文件放在一起）
+STATE_SUFFIX = ".upload.json"
+
+# S3 分片上传专用线程池（所有上传共享，阻塞的 boto3 调用不占用事件循环）
+upload_executor = ThreadPoolExecutor(
+    max_workers=settings.RECORDING_UPLOAD_CONCURRENCY,
+    thread_name_prefix="s3-upload"
+)
+
+
+class MultipartRecordingUpload:
+    """
+    单个录音的流式上传
+    功能：
+    1. 客户端数据按块读入，追加写入本地文件，内存中只保留当前块
+    2. 每写满一个分片，就把该分片（本地文件中的一段）提交到线程池上传到 S3，
+       在途分片数有上限（背压），单个上传的内存占用恒定
+    3. 每完成一片就把 ETag 记入状态文件；进程中断后可据此只补传缺失的分片
+    4. S3 失败时保留本地文件，调用方回退到本地存储
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        s3_client: Any = None,
+        bucket: str = "",
+        key: str = "",
+        metadata: Optional[Dict[str, str]] = None,
+        content_type: str = "audio/wav",
+        part_size: int = 8 * 1024 * 1024,
+        max_inflight: int = 4,
+    ):
+        self.filepath = filepath
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.metadata = metadata or {}
+        self.content_type = content_type
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.max_inflight = max(1, max_inflight)
+
+        self.size = 0
+        self.upload_id: Optional[str] = None
+        self.s3_error: Optional[Exception] = None
+
+        self._file = None
+        self._next_part_offset = 0
+        self._inflight: List[Future] = []
+        self._parts: Dict[int, str] = {}  # 分片号 -> ETag
+        self._state_lock = threading.Lock()
+        self._local_complete = False
+        self._aborted = False
+
+    @property
+    def state_path(self) -> str:
+        return self.filepath + STATE_SUFFIX
+
+    @property
+    def uses_s3(self) -> bool:
+        return self.s3_client is not None and self.s3_error is None
+
+    async def open(self):
+        """创建本地文件，启用 S3 时发起分片上传"""
+        self._file = await asyncio.to_thread(open, self.filepath, "wb")
+        await self._create_multipart()
+
+    async def _create_multipart(self):
+        if self.s3_client is None:
+            return
+        try:
+            response = await asyncio.to_thread(
+                self.s3_client.create_multipart_upload,
+                Bucket=self.bucket,
+                Key=self.key,
+                ContentType=self.content_type,
+                Metadata=self.metadata,
+            )
+            self.upload_id = response["UploadId"]
+            self._save_state(local_complete=False)
+        except Exception as e:
+            self._fail_s3(e)
+
+    async def write(self, chunk: bytes):
+        """追加一块数据；凑满的分片提交后台上传"""
+        await asyncio.to_thread(self._file.write, chunk)
+        self.size += len(chunk)
+        while self.uses_s3 and self.size - self._next_part_offset >= self.part_size:
+            await asyncio.to_thread(self._file.flush)
+            await self._submit_part(self._next_part_offset, self.part_size)
+
+    async def complete(self):
+        """写完本地文件，上传最后一片并合并分片（S3 失败时只保留本地文件）"""
+        await asyncio.to_thread(self._file.close)
+        self._file = None
+        if not self.uses_s3:
+            return
+        self._save_state(local_complete=True)
+
+        remaining = self.size - self._next_part_offset
+        if remaining > 0 or (not self._parts and not self._inflight):
+            # 最后一片（可以小于 5MB；空文件也需要一片）
+            await self._submit_part(self._next_part_offset, remaining)
+            if not self.uses_s3:
+                return
+        try:
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in self._inflight))
+            await asyncio.to_thread(self._complete_multipart)
+            self._remove_state()
+            logger.info(f"✅ Multipart upload complete: {self.key} ({len(self._parts)} parts)")
+        except Exception as e:
+            await self.abort_s3()
+            self._fail_s3(e)
+
+    async def abort(self):
+        """放弃上传（客户端中断等）：删除本地文件并取消 S3 分片上传"""
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+        await self.abort_s3()
+
+    async def abort_s3(self):
+        self._aborted = True
+        for future in self._inflight:
+            future.cancel()
+        if self.upload_id is not None:
+            try:
+                await asyncio.to_thread(
+                    self.s3_client.abort_multipart_upload,
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to abort multipart upload {self.key}: {e}")
+        self._remove_state()
+
+    # ---------- 分片 ----------
+
+    async def _submit_part(self, offset: int, length: int):
+        """提交一个分片；在途分片达到上限时先等最早的一片完成"""
+        part_number = offset // self.part_size + 1
+        self._next_part_offset = offset + length
+        self._inflight.append(upload_executor.submit(self._upload_part, part_number, offset, length))
+
+        while len(self._inflight) >= self.max_inflight:
+            done, _ = await asyncio.wait(
+                [asyncio.wrap_future(future) for future in self._inflight],
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            self._inflight = [future for future in self._inflight if not future.done()]
+            for task in done:
+                if task.exception() is not None:
+                    await self.abort_s3()
+                    self._fail_s3(task.exception())
+                    return
+
+    def _upload_part(self, part_number: int, offset: int, length: int):
+        """从本地文件读取一个分片并上传（线程池中执行）"""
+        with open(self.filepath, "rb") as f:
+            f.seek(offset)
+            body = f.read(length)
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        with self._state_lock:
+            self._parts[part_number] = response["ETag"]
+        self._save_state()
+
+    def _complete_multipart(self):
+        with self._state_lock:
+            parts = [{"PartNumber": n, "ETag": etag} for n, etag in sorted(self._parts.items())]
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+
+    def _fail_s3(self, error: Exception):
+        if self.s3_error is None:
+            logger.error(f"❌ S3 upload failed for {self.key}, keeping local copy only: {error}")
+        self.s3_error = error
+
+    # ---------- 断点续传状态 ----------
+
+    def _save_state(self, local_complete: Optional[bool] = None):
+        """记录分片上传进度（写临时文件后原子替换）"""
+        with self._state_lock:
+            if self.upload_id is None or self._aborted:
+                return
+            if local_complete is not None:
+                self._local_complete = local_complete
+            state = {
+                "bucket": self.bucket,
+                "key": self.key,
+                "upload_id": self.upload_id,
+                "part_size": self.part_size,
+                "local_complete": self._local_complete,
+                "parts": {str(n): etag for n, etag in self._parts.items()},
+            }
+            with open(self.state_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(self.state_path + ".tmp", self.state_path)
+
+    def _remove_state(self):
+        with self._state_lock:
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+
+    @classmethod
+    async def resume(cls, state_path: str, s3_client: Any, max_inflight: int = 4) -> bool:
+        """
+        根据状态文件续传中断的上传：本地文件已写完时只补传缺失的分片并合并；
+        本地文件不完整（上传途中进程退出）时删除残缺文件并取消该分片上传
+
+        返回:
+            是否成功完成
+        """
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        upload = cls(
+            state_path[:-len(STATE_SUFFIX)],
+            s3_client,
+            bucket=state["bucket"],
+            key=state["key"],
+            part_size=state["part_size"],
+            max_inflight=max_inflight,
+        )
+        upload.upload_id = state["upload_id"]
+        upload._parts = {int(n): etag for n, etag in state["parts"].items()}
+
+        if not state["local_complete"] or not os.path.exists(upload.filepath):
+            logger.info(f"🗑️ Discarding incomplete upload: {upload.key}")
+            await upload.abort()
+            return False
+
+        upload._local_complete = True
+        upload.size = os.path.getsize(upload.filepath)
+        return await upload._upload_missing_parts()
+
+    @classmethod
+    async def upload_file(
+        cls,
+        filepath: str,
+        s3_client: Any,
+        bucket: str,
+        key: str,
+        metadata: Optional[Dict[str, str]] = None,
+        content_type: str = "audio/wav",
+        part_size: int = 8 * 1024 * 1024,
+        max_inflight: int = 4,
+    ) -> "MultipartRecordingUpload":
+        """上传一个已经写完的本地文件（同样并行分片、记录进度，可续传）"""
+        upload = cls(filepath, s3_client, bucket, key, metadata, content_type, part_size, max_inflight)
+        upload.size = os.path.getsize(filepath)
+        await upload._create_multipart()
+        if upload.uses_s3:
+            upload._save_state(local_complete=True)
+            await upload._upload_missing_parts()
+        return upload
+
+    async def _upload_missing_parts(self) -> bool:
+        """上传本地文件中尚未上传的分片并合并（本地文件已写完）"""
+        num_parts = max(1, -(-self.size // self.part_size))
+        missing = [n for n in range(1, num_parts + 1) if n not in self._parts]
+        logger.info(f"🔄 Uploading {self.key}: {len(missing)}/{num_parts} parts")
+        for part_number in missing:
+            offset = (part_number - 1) * self.part_size
+            await self._submit_part(offset, min(self.part_size, self.size - offset))
+            if self.s3_error is not None:
+                return False
+        try:
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in self._inflight))
+            await asyncio.to_thread(self._complete_multipart)
+            self._remove_state()
+            logger.info(f"✅ Multipart upload complete: {self.key} ({num_parts} parts)")
+            return True
+        except Exception as e:
+            self._fail_s3(e)
+            return False
+
+
+async def resume_pending_uploads(directory: str, s3_client: Any) -> int:
+    """续传目录下所有中断的上传（应用启动时调用），返回成功完成的数量"""
+    if s3_client is None or not os.path.isdir(directory):
+        return 0
+    completed = 0
+    for name in os.listdir(directory):
+        if not name.endswith(STATE_SUFFIX):
+            continue
+        try:
+            if await MultipartRecordingUpload.resume(
+                os.path.join(directory, name), s3_client, max_inflight=settings.RECORDING_UPLOAD_CONCURRENCY
+            ):
+                completed += 1
+        except Exception as e:
+            logger.error(f"❌ Failed to resume upload {name}: {e}")
+    return completed
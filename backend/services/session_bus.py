@@ -0,0 +1,187 @@
+"""
+会话消息总线 - 按会话 ID 发布转录/翻译事件，由持有该 WebSocket 的节点订阅并推送
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# 订阅者回调：收到一条发往该会话的消息
+MessageHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class SessionBus:
+    """
+    会话消息总线基类
+    功能：
+    1. publish(session_id, message)：任何节点（API 节点、推理/翻译节点）按会话发布事件
+    2. subscribe(session_id, handler)：持有该会话 WebSocket 的节点订阅，收到后推送给客户端
+    3. 同一发布者发往同一会话的消息按发布顺序送达
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._handlers: Dict[str, MessageHandler] = {}
+        self.stats: Dict[str, int] = {"published": 0, "delivered": 0, "dropped": 0, "errors": 0}
+
+    async def start(self):
+        """建立连接（可重复调用）"""
+
+    async def close(self):
+        """释放连接"""
+
+    async def subscribe(self, session_id: str, handler: MessageHandler):
+        """在本节点订阅会话（同一会话重复订阅时替换回调）"""
+        self._handlers[session_id] = handler
+
+    async def unsubscribe(self, session_id: str):
+        """取消本节点对会话的订阅"""
+        self._handlers.pop(session_id, None)
+
+    async def publish(self, session_id: str, message: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def _deliver(self, session_id: str, message: Dict[str, Any]):
+        """把消息交给本节点的订阅者；会话不在本节点时丢弃"""
+        handler = self._handlers.get(session_id)
+        if handler is None:
+            self.stats["dropped"] += 1
+            return
+        try:
+            await handler(message)
+            self.stats["delivered"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Failed to deliver message to {session_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"bus": self.name, "local_sessions": len(self._handlers), **self.stats}
+
+
+class InProcessSessionBus(SessionBus):
+    """进程内总线（单节点部署）：发布即直接调用本进程的订阅者"""
+
+    name = "memory"
+
+    async def publish(self, session_id: str, message: Dict[str, Any]):
+        self.stats["published"] += 1
+        await self._deliver(session_id, message)
+
+
+class RedisSessionBus(SessionBus):
+    """
+    基于 Redis Pub/Sub 的跨节点总线（redis 为可选依赖）
+
+    每个会话一个频道（前缀 + 会话 ID）；本节点持有的会话直接本地投递，不经过 Redis。
+    client 可传入兼容 redis.asyncio 的客户端（例如本地替身 broker），便于测试
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, channel_prefix: str = "class_recorder:session:", client: Any = None):
+        super().__init__()
+        self.url = url
+        self.channel_prefix = channel_prefix
+        self._client = client
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+
+    def _channel(self, session_id: str) -> str:
+        return f"{self.channel_prefix}{session_id}"
+
+    async def start(self):
+        async with self._start_lock:
+            if self._reader is not None:
+                return
+            if self._client is None:
+                try:
+                    import redis.asyncio as redis
+                except ImportError as e:
+                    raise RuntimeError("SESSION_BUS=redis requires the redis package") from e
+                self._client = redis.Redis.from_url(self.url)
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            self._reader = asyncio.create_task(self._read_loop())
+            logger.info(f"✅ Session bus connected: {self.url}")
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        for resource in (self._pubsub, self._client):
+            if resource is not None:
+                # redis 5 之前只有 close()
+                await (resource.aclose() if hasattr(resource, "aclose") else resource.close())
+        self._pubsub = self._client = None
+
+    async def subscribe(self, session_id: str, handler: MessageHandler):
+        await self.start()
+        await super().subscribe(session_id, handler)
+        await self._pubsub.subscribe(self._channel(session_id))
+
+    async def unsubscribe(self, session_id: str):
+        await super().unsubscribe(session_id)
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self._channel(session_id))
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to unsubscribe {session_id} from session bus: {e}")
+
+    async def publish(self, session_id: str, message: Dict[str, Any]):
+        self.stats["published"] += 1
+        if session_id in self._handlers:
+            # 会话就在本节点：直接投递，省去一次 Redis 往返
+            await self._deliver(session_id, message)
+            return
+        await self.start()
+        await self._client.publish(self._channel(session_id), json.dumps(message, ensure_ascii=False))
+
+    async def _read_loop(self):
+        """接收本节点已订阅频道的消息并投递（连接断开时 redis 客户端会重连并恢复订阅）"""
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await asyncio.sleep(0.05)
+                    continue
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None or message.get("type") != "message":
+                    continue
+                channel = message["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                await self._deliver(channel[len(self.channel_prefix):], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"❌ Session bus read error: {e}")
+                await asyncio.sleep(1.0)
+
+
+# 可用的会话总线（SESSION_BUS 配置项）
+SESSION_BUSES: Dict[str, Type[SessionBus]] = {
+    InProcessSessionBus.name: InProcessSessionBus,
+    RedisSessionBus.name: RedisSessionBus,
+}
+
+
+def create_session_bus(name: str, url: str = "", channel_prefix: str = "class_recorder:session:") -> SessionBus:
+    """按名称创建会话总线（未连接）"""
+    if name == RedisSessionBus.name:
+        return RedisSessionBus(url, channel_prefix)
+    if name not in SESSION_BUSES:
+        raise ValueError(f"Unknown session bus: {name} (available: {', '.join(SESSION_BUSES)})")
+    return SESSION_BUSES[name]()
+
+
+# 全局实例
+session_bus = create_session_bus(settings.SESSION_BUS, settings.SESSION_BUS_URL, settings.SESSION_BUS_CHANNEL_PREFIX)
@@ -0,0 +1,177 @@
+"""
+会话录音 - 服务端把 WebSocket 收到的 PCM 追加写入 WAV 文件；同一会话的重连续写同一个文件
+"""
+import asyncio
+import logging
+import os
+import struct
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+WAV_HEADER_SIZE = 44
+
+
+def wav_header(data_bytes: int, sample_rate: int = 16000, channels: int = 1, bits: int = 16) -> bytes:
+    """PCM WAV 文件头（44 字节）"""
+    block_align = channels * bits // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits,
+        b"data", data_bytes,
+    )
+
+
+class SessionRecorder:
+    """
+    单个会话的服务端录音
+    功能：
+    1. 连接期间收到的每段 int16 PCM 追加到内存缓冲区，攒满后在线程中写盘（事件循环不做磁盘 IO）
+    2. 文件开头先写占位的 WAV 头，结束时回填 RIFF 和 data 长度
+    3. 结束后文件即是完整录音，客户端无需再上传一遍（何时结束由 SessionRecordings 决定）
+    """
+
+    def __init__(self, session_id: str, directory: str, sample_rate: int = 16000, buffer_bytes: int = 256 * 1024):
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self.buffer_bytes = buffer_bytes
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.filename = f"recording_{session_id}_{timestamp}.wav"
+        self.filepath = os.path.join(directory, self.filename)
+
+        self.data_bytes = 0
+        self._file = None
+        self._buffer = bytearray()
+        self._write_lock = asyncio.Lock()
+        self.finalized = False
+
+    @property
+    def duration(self) -> float:
+        return self.data_bytes / 2 / self.sample_rate
+
+    async def open(self):
+        self._file = await asyncio.to_thread(open, self.filepath, "wb")
+        await asyncio.to_thread(self._file.write, wav_header(0, self.sample_rate))
+
+    async def append(self, pcm: Union[bytes, memoryview]):
+        """追加一段 int16 PCM（数据会被复制，调用方之后可以复用其缓冲区）"""
+        if self.finalized:
+            return
+        self._buffer += pcm
+        self.data_bytes += len(pcm)
+        if len(self._buffer) >= self.buffer_bytes:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+        data, self._buffer = bytes(self._buffer), bytearray()
+        async with self._write_lock:
+            await asyncio.to_thread(self._file.write, data)
+
+    async def finalize(self) -> Optional[Dict[str, Any]]:
+        """
+        写出剩余数据、回填 WAV 头并关闭文件（可重复调用）
+
+        返回:
+            录音信息；没有收到任何音频时删除文件并返回 None
+        """
+        if self.finalized:
+            return None
+        self.finalized = True
+        await self._flush()
+        async with self._write_lock:
+            await asyncio.to_thread(self._close)
+
+        if self.data_bytes == 0:
+            os.remove(self.filepath)
+            return None
+        logger.info(f"💾 Session recording finalized: {self.filename} ({self.duration:.1f}s)")
+        return {
+            "filename": self.filename,
+            "filepath": self.filepath,
+            "size": WAV_HEADER_SIZE + self.data_bytes,
+            "duration": self.duration,
+        }
+
+    def _close(self):
+        self._file.seek(0)
+        self._file.write(wav_header(self.data_bytes, self.sample_rate))
+        self._file.close()
+
+
+class SessionRecordings:
+    """
+    按会话保持录音，跨 WebSocket 重连续写
+    功能：
+    1. 同一会话的每个连接拿到同一个 SessionRecorder，重连后继续追加到同一个文件
+    2. 客户端 stop 时立即结束并登记；断开后在宽限时间内没有重连才结束（录音不会因重连被拆成多个文件）
+    3. 服务关闭时结束所有未完成的录音（回填 WAV 头）
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        on_finalized: Callable[[Dict[str, Any], str], Awaitable[Dict[str, Any]]],
+        grace_s: float = 60.0,
+        buffer_bytes: int = 256 * 1024,
+    ):
+        self.directory = directory
+        self.on_finalized = on_finalized
+        self.grace_s = grace_s
+        self.buffer_bytes = buffer_bytes
+        self._recorders: Dict[str, SessionRecorder] = {}
+        self._expiry: Dict[str, asyncio.Task] = {}
+
+    async def attach(self, session_id: str) -> SessionRecorder:
+        """连接建立时调用：取消待结束的计时，返回会话已有的录音（没有时新建）"""
+        expiry = self._expiry.pop(session_id, None)
+        if expiry is not None:
+            expiry.cancel()
+        recorder = self._recorders.get(session_id)
+        if recorder is None:
+            recorder = SessionRecorder(session_id, self.directory, buffer_bytes=self.buffer_bytes)
+            await recorder.open()
+            self._recorders[session_id] = recorder
+        else:
+            logger.info(f"🔁 Resuming session recording: {recorder.filename} ({recorder.duration:.1f}s so far)")
+        return recorder
+
+    def detach(self, session_id: str):
+        """连接断开（未 stop）时调用：宽限时间内没有重连则结束录音"""
+        if session_id in self._recorders and session_id not in self._expiry:
+            self._expiry[session_id] = asyncio.create_task(self._expire(session_id))
+
+    async def _expire(self, session_id: str):
+        await asyncio.sleep(self.grace_s)
+        self._expiry.pop(session_id, None)
+        logger.info(f"⌛ Session {session_id} did not reconnect, finalizing its recording")
+        await self.finalize(session_id)
+
+    async def finalize(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        结束会话录音并登记（stop 或宽限时间到期时调用，只生效一次）
+
+        返回:
+            登记后的录音信息；没有录音或没有收到音频时返回 None
+        """
+        expiry = self._expiry.pop(session_id, None)
+        if expiry is not None and expiry is not asyncio.current_task():
+            expiry.cancel()
+        recorder = self._recorders.pop(session_id, None)
+        if recorder is None:
+            return None
+        try:
+            recording = await recorder.finalize()
+            return await self.on_finalized(recording, session_id) if recording else None
+        except Exception as e:
+            logger.error(f"Failed to finalize session recording: {e}")
+            return None
+
+    async def close(self):
+        """结束所有未完成的录音"""
+        for session_id in list(self._recorders):
+            await self.finalize(session_id)
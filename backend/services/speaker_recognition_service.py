@@ -1,35 +1,53 @@
 """
-说话人识别服务 - 使用声纹特征识别教授和学生
+说话人识别服务 - 使用声纹特征识别教授、学生和已注册的具名说话人
 """
 import os
 import json
 import logging
 import numpy as np
 import torch
-from typing import Dict, Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple, Union
 import io
 import wave
 
+from config import settings
+from services.audio_frame import AudioFrame
+from services.speaker_registry import SpeakerRegistry, DEFAULT_COURSE
+from services.model_loader import model_loader
+from services.diarization import (
+    window_starts, speech_overlap, cluster_embeddings, smooth_labels, window_turns
+)
+
 logger = logging.getLogger(__name__)
 
+# 旧版单教授声纹文件（启动时迁移到注册表）
+LEGACY_PROFESSOR_EMBEDDING_FILE = "professor_embedding.npy"
+
 class SpeakerRecognitionService:
     """
     说话人识别服务
     功能：
-    1. 声纹注册（录制教授声音样本）
-    2. 实时声纹识别（判断是否是教授）
+    1. 声纹注册（教授声音样本，或按课程注册多个具名说话人）
+    2. 实时声纹识别（在注册表中一次矩阵运算找出最相似的说话人）
     3. 多说话人区分
     """
     
     def __init__(self):
-        self.embeddings_cache: Dict[str, np.ndarray] = {}  # 缓存声纹特征
-        self.professor_embedding: Optional[np.ndarray] = None
-        self.similarity_threshold = 0.7  # 相似度阈值（0-1）
+        self.similarity_threshold = settings.SPEAKER_SIMILARITY_THRESHOLD  # 默认相似度阈值（0-1）
+        self.registry = SpeakerRegistry(settings.SPEAKER_REGISTRY_DIR, default_threshold=self.similarity_threshold)
+        
+        # 声纹特征提取模型（使用 pyannote.audio），应用启动后由后台任务加载；
+        # 加载完成前 model_available 为 False
+        self.model_available = False
+        self.embedding_model = None
+        model_loader.register("speaker", self.load_model, required=False)
         
-        # 声纹特征提取模型（使用 pyannote.audio）
+        # 迁移旧版单教授声纹文件
+        self._migrate_legacy_professor_embedding()
+    
+    def load_model(self) -> Dict[str, bool]:
+        """加载声纹特征提取模型（由 model_loader 在后台线程中调用），不可用时回退到简单特征"""
         try:
-            from pyannote.audio import Model
-            from pyannote.audio.pipelines import SpeakerDiarization
             from pyannote.audio import Inference
             
             logger.info("🔄 Loading speaker embedding model...")
@@ -49,28 +67,19 @@ class SpeakerRecognitionService:
             logger.info("💡 Falling back to simple energy-based detection")
             self.model_available = False
             self.embedding_model = None
-        
-        # 加载已保存的教授声纹
-        self._load_professor_embedding()
+        return {"fallback": not self.model_available}
     
-    def _load_professor_embedding(self):
-        """从文件加载教授的声纹特征"""
-        embedding_file = "professor_embedding.npy"
-        if os.path.exists(embedding_file):
-            try:
-                self.professor_embedding = np.load(embedding_file)
-                logger.info(f"✅ Loaded professor voice profile (shape: {self.professor_embedding.shape})")
-            except Exception as e:
-                logger.error(f"❌ Failed to load professor embedding: {e}")
-    
-    def _save_professor_embedding(self):
-        """保存教授的声纹特征到文件"""
-        if self.professor_embedding is not None:
-            try:
-                np.save("professor_embedding.npy", self.professor_embedding)
-                logger.info("✅ Professor voice profile saved")
-            except Exception as e:
-                logger.error(f"❌ Failed to save professor embedding: {e}")
+    def _migrate_legacy_professor_embedding(self):
+        """把旧版工作目录下的 professor_embedding.npy 导入注册表"""
+        embedding_file = LEGACY_PROFESSOR_EMBEDDING_FILE
+        if not os.path.exists(embedding_file) or self.has_professor_profile():
+            return
+        try:
+            self.registry.add("Professor", np.load(embedding_file), role="professor")
+            os.remove(embedding_file)
+            logger.info("✅ Migrated legacy professor voice profile into speaker registry")
+        except Exception as e:
+            logger.error(f"❌ Failed to migrate professor embedding: {e}")
     
     def extract_embedding(self, audio_data: np.ndarray, sample_rate: int = 16000) -> Optional[np.ndarray]:
         """
@@ -119,49 +128,76 @@ class SpeakerRecognitionService:
             traceback.print_exc()
             return None
     
+    def extract_embeddings_batch(self, windows: np.ndarray, sample_rate: int = 16000) -> Optional[np.ndarray]:
+        """
+        一次批量前向计算多个等长窗口的声纹特征
+        
+        参数:
+            windows: (窗口数, 样本数) float32
+        
+        返回:
+            (窗口数, 维度) 的归一化声纹矩阵
+        """
+        if not self.model_available or self.embedding_model is None:
+            return self._extract_simple_features_batch(windows)
+        
+        try:
+            # (batch, channel, samples)，所有窗口在同一次前向中计算
+            chunks = torch.from_numpy(np.ascontiguousarray(windows, dtype=np.float32)).unsqueeze(1)
+            embeddings = self.embedding_model.infer(chunks)
+            if isinstance(embeddings, torch.Tensor):
+                embeddings = embeddings.detach().cpu().numpy()
+            embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(windows), -1)
+            return embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+            
+        except Exception as e:
+            logger.error(f"❌ Batched embedding extraction failed: {e}")
+            return None
+    
     def _extract_simple_features(self, audio_data: np.ndarray) -> np.ndarray:
         """
         提取简单的音频特征（后备方案）
         包括：能量、过零率、频谱质心等
         """
         try:
-            # 1. 能量（RMS）
-            energy = np.sqrt(np.mean(audio_data ** 2))
-            
-            # 2. 过零率（Zero Crossing Rate）
-            zero_crossings = np.sum(np.abs(np.diff(np.sign(audio_data)))) / (2 * len(audio_data))
-            
-            # 3. 频谱质心（需要 FFT）
-            fft = np.fft.rfft(audio_data)
-            magnitude = np.abs(fft)
-            freqs = np.fft.rfftfreq(len(audio_data), 1/16000)
-            spectral_centroid = np.sum(freqs * magnitude) / (np.sum(magnitude) + 1e-8)
-            
-            # 4. 频谱带宽
-            spectral_bandwidth = np.sqrt(
-                np.sum(((freqs - spectral_centroid) ** 2) * magnitude) / (np.sum(magnitude) + 1e-8)
-            )
-            
-            # 组合成特征向量（4维，需要扩展到更高维度）
-            simple_features = np.array([
-                energy,
-                zero_crossings,
-                spectral_centroid / 8000,  # 归一化
-                spectral_bandwidth / 8000   # 归一化
-            ])
-            
-            # 扩展到 512 维（重复特征）
-            simple_features = np.tile(simple_features, 128)
-            
-            return simple_features
-            
+            return self._extract_simple_features_batch(audio_data[None, :])[0]
         except Exception as e:
             logger.error(f"❌ Simple feature extraction failed: {e}")
             return np.random.rand(512)  # 返回随机向量作为后备
     
+    def _extract_simple_features_batch(self, windows: np.ndarray) -> np.ndarray:
+        """简单音频特征的批量版本（每行一个窗口）"""
+        length = windows.shape[1]
+        
+        # 1. 能量（RMS）
+        energy = np.sqrt(np.mean(windows ** 2, axis=1))
+        
+        # 2. 过零率（Zero Crossing Rate）
+        zero_crossings = np.sum(np.abs(np.diff(np.sign(windows), axis=1)), axis=1) / (2 * length)
+        
+        # 3. 频谱质心（需要 FFT）
+        magnitude = np.abs(np.fft.rfft(windows, axis=1))
+        freqs = np.fft.rfftfreq(length, 1/16000)
+        total = np.sum(magnitude, axis=1) + 1e-8
+        spectral_centroid = (magnitude @ freqs) / total
+        
+        # 4. 频谱带宽
+        spectral_bandwidth = np.sqrt(
+            np.sum(((freqs[None, :] - spectral_centroid[:, None]) ** 2) * magnitude, axis=1) / total
+        )
+        
+        # 组合成特征向量（4维），扩展到 512 维（重复特征）
+        simple_features = np.stack([
+            energy,
+            zero_crossings,
+            spectral_centroid / 8000,  # 归一化
+            spectral_bandwidth / 8000   # 归一化
+        ], axis=1)
+        return np.tile(simple_features, (1, 128))
+    
     def register_professor_voice(self, audio_bytes: bytes) -> bool:
         """
-        注册教授的声音（录制样本）
+        注册教授的声音（录制样本），替换默认课程中已有的教授声纹
         
         参数:
             audio_bytes: 音频数据（PCM，16-bit，16kHz，mono）
@@ -170,20 +206,19 @@ class SpeakerRecognitionService:
             是否成功注册
         """
         try:
-            # 转换为 numpy 数组
-            audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
-            audio_float = audio_array.astype(np.float32) / 32768.0
-            
             # 提取声纹特征
-            embedding = self.extract_embedding(audio_float)
+            embedding = self.extract_embedding(AudioFrame(audio_bytes).float32)
             
             if embedding is None:
                 logger.error("❌ Failed to extract embedding for professor voice")
                 return False
             
             # 保存声纹特征
-            self.professor_embedding = embedding
-            self._save_professor_embedding()
+            existing = self.registry.list(course=DEFAULT_COURSE, role="professor")
+            if existing:
+                self.registry.update(existing[0]["id"], embedding=embedding)
+            else:
+                self.registry.add("Professor", embedding, role="professor")
             
             logger.info(f"✅ Professor voice registered (embedding shape: {embedding.shape})")
             return True
@@ -211,49 +246,97 @@ class SpeakerRecognitionService:
             logger.error(f"❌ Similarity calculation failed: {e}")
             return 0.0
     
-    def identify_speaker(self, audio_bytes: bytes) -> Tuple[str, float]:
+    def enroll_speaker(
+        self,
+        name: str,
+        audio_bytes: bytes,
+        course: str = DEFAULT_COURSE,
+        role: str = "student",
+        threshold: Optional[float] = None,
+    ) -> Optional[Dict]:
         """
-        识别说话人（教授 or 学生）
+        注册具名说话人
+        
+        返回:
+            说话人记录；声纹提取失败时返回 None
+        """
+        embedding = self.extract_embedding(AudioFrame(audio_bytes).float32)
+        if embedding is None:
+            logger.error(f"❌ Failed to extract embedding for speaker: {name}")
+            return None
+        return self.registry.add(name, embedding, course=course, role=role, threshold=threshold)
+    
+    def update_speaker(self, speaker_id: str, audio_bytes: Optional[bytes] = None, **fields) -> Dict:
+        """更新说话人信息；提供音频时重新提取声纹（KeyError：不存在）"""
+        if audio_bytes is not None:
+            embedding = self.extract_embedding(AudioFrame(audio_bytes).float32)
+            if embedding is None:
+                raise ValueError("Failed to extract embedding")
+            fields["embedding"] = embedding
+        return self.registry.update(speaker_id, **fields)
+    
+    def match_speakers(self, audio: Union[AudioFrame, bytes], course: Optional[str] = None, top_k: int = 1) -> List[Dict]:
+        """
+        返回注册表中最相似的 top_k 个说话人（含 similarity 和 accepted）
+        """
+        frame = AudioFrame.wrap(audio)
+        if frame.speaker_embedding is None:
+            frame.speaker_embedding = self.extract_embedding(frame.float32)
+        if frame.speaker_embedding is None:
+            return []
+        return self.registry.match(frame.speaker_embedding, course=course, top_k=top_k)
+    
+    def identify_speaker(self, audio: Union[AudioFrame, bytes], course: Optional[str] = None) -> Tuple[str, float]:
+        """
+        识别说话人（已注册的说话人角色 or 学生）
         
         参数:
-            audio_bytes: 音频数据（PCM，16-bit，16kHz，mono）
+            audio: AudioFrame（复用已缓存的特征），或音频数据（PCM，16-bit，16kHz，mono）
+            course: 只匹配该课程注册的说话人（None 表示全部）
         
         返回:
             (说话人类型, 置信度)
-            - 说话人类型: "professor" 或 "student" 或 "unknown"
+            - 说话人类型: 匹配到的说话人角色（如 "professor"），或 "student" 或 "unknown"
             - 置信度: 0-1
+            匹配成功时说话人记录写入 frame.results["speaker_match"]
         """
         try:
-            # 如果没有注册教授声音，返回 unknown
-            if self.professor_embedding is None:
-                logger.debug("ℹ️ No professor voice profile registered")
+            # 如果没有注册任何声音，返回 unknown
+            if len(self.registry) == 0:
+                logger.debug("ℹ️ No speaker voice profile registered")
                 return "unknown", 0.0
             
-            # 转换音频为 numpy 数组
-            audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
-            audio_float = audio_array.astype(np.float32) / 32768.0
+            frame = AudioFrame.wrap(audio)
             
             # 检查音频能量（过滤静音）
-            energy = np.sqrt(np.mean(audio_float ** 2))
+            energy = frame.rms
             if energy < 0.01:
                 logger.debug(f"🔇 Silence detected (energy: {energy:.4f})")
                 return "unknown", 0.0
             
-            # 提取当前音频的声纹特征
-            current_embedding = self.extract_embedding(audio_float)
+            # 提取当前音频的声纹特征（缓存在帧上）
+            if frame.speaker_embedding is None:
+                frame.speaker_embedding = self.extract_embedding(frame.float32)
+            current_embedding = frame.speaker_embedding
             
             if current_embedding is None:
                 logger.error("❌ Failed to extract embedding for current audio")
                 return "unknown", 0.0
             
-            # 计算与教授声音的相似度
-            similarity = self.calculate_similarity(current_embedding, self.professor_embedding)
+            # 一次矩阵运算找出最相似的已注册说话人
+            matches = self.registry.match(current_embedding, course=course, top_k=1)
+            if not matches:
+                logger.debug(f"ℹ️ No speaker registered for course: {course}")
+                return "unknown", 0.0
+            best = matches[0]
+            similarity = best["similarity"]
             
-            logger.debug(f"📊 Speaker similarity: {similarity:.4f} (threshold: {self.similarity_threshold})")
+            logger.debug(f"📊 Speaker similarity: {best['name']} {similarity:.4f} (threshold: {best['threshold']})")
             
-            # 判断是否是教授
-            if similarity >= self.similarity_threshold:
-                return "professor", similarity
+            # 达到该说话人的阈值才算匹配
+            if best["accepted"]:
+                frame.results["speaker_match"] = best
+                return best["role"], similarity
             else:
                 return "student", 1.0 - similarity
             
@@ -263,15 +346,92 @@ class SpeakerRecognitionService:
             traceback.print_exc()
             return "unknown", 0.0
     
+    def diarize(self, audio: Union[AudioFrame, bytes], course: Optional[str] = None) -> List[Dict]:
+        """
+        块内说话人分离：滑动窗口声纹（一次批量前向）→ 与注册表匹配，未匹配的窗口聚类
+        
+        参数:
+            audio: AudioFrame（有 VAD 结果时跳过以静音为主的窗口）
+            course: 只匹配该课程注册的说话人
+        
+        返回:
+            按时间排序、覆盖整个块的说话人轮次：
+            [{"start", "end"（秒）, "speaker", "confidence", "speaker_match"}, ...]
+        """
+        frame = AudioFrame.wrap(audio)
+        sample_rate = frame.sample_rate
+        window = int(settings.DIARIZATION_WINDOW_S * sample_rate)
+        step = int(settings.DIARIZATION_STEP_S * sample_rate)
+        
+        starts = window_starts(frame.num_samples, window, step, settings.DIARIZATION_MAX_WINDOWS)
+        regions = frame.results.get("speech_regions")
+        if regions is not None and len(starts) > 1:
+            # 以静音为主的窗口不参与（其时间并入相邻轮次）
+            keep = speech_overlap(starts, window, regions) >= 0.5
+            if keep.any():
+                starts = starts[keep]
+        
+        # 块比窗口短或只有一个有效窗口：整块一个说话人
+        if len(starts) == 1:
+            speaker_type, confidence = self.identify_speaker(frame, course=course)
+            return [{
+                "start": 0.0,
+                "end": frame.duration,
+                "speaker": speaker_type,
+                "confidence": confidence,
+                "speaker_match": frame.results.get("speaker_match")
+            }]
+        
+        windows = np.stack([frame.float32[start:start + window] for start in starts])
+        embeddings = self.extract_embeddings_batch(windows, sample_rate)
+        if embeddings is None:
+            return [{"start": 0.0, "end": frame.duration, "speaker": "unknown", "confidence": 0.0, "speaker_match": None}]
+        
+        # 已注册说话人：一次矩阵乘法匹配所有窗口；其余窗口之间聚类
+        matches = self.registry.match_many(embeddings, course=course)
+        has_candidates = any(match is not None for match in matches)
+        unmatched = [i for i, match in enumerate(matches) if not (match and match["accepted"])]
+        clusters = cluster_embeddings(embeddings[unmatched], settings.DIARIZATION_CLUSTER_THRESHOLD) if unmatched else []
+        
+        labels = [match["id"] if match and match["accepted"] else None for match in matches]
+        for i, cluster in zip(unmatched, clusters):
+            labels[i] = f"cluster:{cluster}"
+        labels = smooth_labels(labels)
+        
+        centers = starts + window // 2
+        spans = []
+        for start, end, label in window_turns(starts, window, labels, frame.num_samples):
+            # 轮次内窗口的平均相似度作为置信度
+            members = [i for i in np.flatnonzero((centers >= start) & (centers < end)) if labels[i] == label]
+            match = next((matches[i] for i in members if matches[i] and matches[i]["accepted"] and matches[i]["id"] == label), None)
+            similarity = float(np.mean([matches[i]["similarity"] for i in members if matches[i]])) if has_candidates else 0.0
+            if match is not None:
+                speaker_type, confidence = match["role"], similarity
+            elif has_candidates:
+                speaker_type, confidence = "student", 1.0 - similarity
+            else:
+                speaker_type, confidence = "unknown", 0.0
+            spans.append({
+                "start": start / sample_rate,
+                "end": end / sample_rate,
+                "speaker": speaker_type,
+                "confidence": confidence,
+                "speaker_match": match
+            })
+        
+        logger.debug(f"🎭 Diarized {frame.duration:.1f}s chunk: {len(starts)} windows → {len(spans)} turns")
+        return spans
+    
     def has_professor_profile(self) -> bool:
         """检查是否已注册教授声音"""
-        return self.professor_embedding is not None
+        return bool(self.registry.list(role="professor"))
     
     def clear_professor_profile(self):
         """清除教授声音配置"""
-        self.professor_embedding = None
-        if os.path.exists("professor_embedding.npy"):
-            os.remove("professor_embedding.npy")
+        for speaker in self.registry.list(role="professor"):
+            self.registry.remove(speaker["id"])
+        if os.path.exists(LEGACY_PROFESSOR_EMBEDDING_FILE):
+            os.remove(LEGACY_PROFESSOR_EMBEDDING_FILE)
         logger.info("✅ Professor voice profile cleared")
 
 
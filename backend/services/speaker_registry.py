@@ -0,0 +1,268 @@
+"""
+说话人注册表 - 多说话人声纹库（连续的内存映射矩阵 + 向量化匹配）
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COURSE = "default"
+
+
+class SpeakerRegistry:
+    """
+    说话人注册表
+    功能：
+    1. 每门课程可注册多个具名说话人（教授、助教、学生等）
+    2. 所有声纹存放在一个连续的 float32 矩阵（embeddings.npy，只读内存映射），
+       元数据存放在 speakers.json，两者按行号对应
+    3. 识别 = 一次矩阵-向量乘法 + top-k，每个说话人可单独设置阈值
+    4. 写操作先写临时文件再原子替换，读操作不受影响
+    """
+
+    MATRIX_FILE = "embeddings.npy"
+    METADATA_FILE = "speakers.json"
+
+    def __init__(self, directory: str, default_threshold: float = 0.7):
+        self.directory = directory
+        self.default_threshold = default_threshold
+
+        self._lock = threading.RLock()
+        self._speakers: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None  # (N, D) 已归一化
+        self._thresholds = np.zeros(0, dtype=np.float32)
+        self._course_codes = np.zeros(0, dtype=np.int32)  # 每行的课程编号（比较整数比比较字符串快）
+        self._course_ids: Dict[str, int] = {}
+
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        """加载元数据并以内存映射方式打开声纹矩阵"""
+        metadata_path = self._path(self.METADATA_FILE)
+        matrix_path = self._path(self.MATRIX_FILE)
+        if not (os.path.exists(metadata_path) and os.path.exists(matrix_path)):
+            return
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                speakers = json.load(f)
+            matrix = np.load(matrix_path, mmap_mode="r")
+            if matrix.ndim != 2 or matrix.shape[0] != len(speakers):
+                raise ValueError(f"matrix shape {matrix.shape} does not match {len(speakers)} speakers")
+            self._set_state(speakers, matrix)
+            logger.info(f"✅ Loaded speaker registry ({len(speakers)} speakers, dim: {matrix.shape[1]})")
+        except Exception as e:
+            logger.error(f"❌ Failed to load speaker registry: {e}")
+
+    def _set_state(self, speakers: List[Dict[str, Any]], matrix: Optional[np.ndarray]):
+        self._speakers = speakers
+        self._matrix = matrix if speakers else None
+        self._thresholds = np.array([s["threshold"] for s in speakers], dtype=np.float32)
+        self._course_ids = {}
+        for s in speakers:
+            self._course_ids.setdefault(s["course"], len(self._course_ids))
+        self._course_codes = np.array([self._course_ids[s["course"]] for s in speakers], dtype=np.int32)
+
+    def _persist(self, speakers: List[Dict[str, Any]], matrix: Optional[np.ndarray]):
+        """写入临时文件后原子替换，再重新映射（调用方持有锁）"""
+        os.makedirs(self.directory, exist_ok=True)
+        matrix_path = self._path(self.MATRIX_FILE)
+        metadata_path = self._path(self.METADATA_FILE)
+
+        if speakers:
+            # 释放旧映射后再替换文件
+            self._matrix = None
+            with open(matrix_path + ".tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+            os.replace(matrix_path + ".tmp", matrix_path)
+        elif os.path.exists(matrix_path):
+            self._matrix = None
+            os.remove(matrix_path)
+
+        with open(metadata_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(speakers, f, ensure_ascii=False, indent=2)
+        os.replace(metadata_path + ".tmp", metadata_path)
+
+        self._set_state(speakers, np.load(matrix_path, mmap_mode="r") if speakers else None)
+
+    # ---------- 工具 ----------
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if self.dim is not None and vector.shape[0] != self.dim:
+            raise ValueError(f"Embedding dimension {vector.shape[0]} does not match registry dimension {self.dim}")
+        return vector / (np.linalg.norm(vector) + 1e-8)
+
+    def _index_of(self, speaker_id: str) -> int:
+        for i, speaker in enumerate(self._speakers):
+            if speaker["id"] == speaker_id:
+                return i
+        raise KeyError(speaker_id)
+
+    def _current_matrix(self) -> np.ndarray:
+        return np.asarray(self._matrix) if self._matrix is not None else np.zeros((0, 0), dtype=np.float32)
+
+    # ---------- 增删改查 ----------
+
+    def add(
+        self,
+        name: str,
+        embedding: np.ndarray,
+        course: str = DEFAULT_COURSE,
+        role: str = "student",
+        threshold: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """注册一个说话人，返回其记录"""
+        with self._lock:
+            vector = self._normalize(embedding)
+            now = time.time()
+            record = {
+                "id": uuid.uuid4().hex,
+                "name": name,
+                "course": course or DEFAULT_COURSE,
+                "role": role,
+                "threshold": self.default_threshold if threshold is None else float(threshold),
+                "created_at": now,
+                "updated_at": now,
+            }
+            matrix = vector[None, :] if self._matrix is None else np.vstack([self._matrix, vector])
+            self._persist(self._speakers + [record], matrix)
+            logger.info(f"✅ Speaker enrolled: {name} ({record['role']}, course: {record['course']})")
+            return dict(record)
+
+    def update(
+        self,
+        speaker_id: str,
+        name: Optional[str] = None,
+        course: Optional[str] = None,
+        role: Optional[str] = None,
+        threshold: Optional[float] = None,
+        embedding: Optional[np.ndarray] = None,
+    ) -> Dict[str, Any]:
+        """更新说话人信息或替换声纹（KeyError：不存在）"""
+        with self._lock:
+            index = self._index_of(speaker_id)
+            record = dict(self._speakers[index])
+            for key, value in (("name", name), ("course", course), ("role", role)):
+                if value is not None:
+                    record[key] = value
+            if threshold is not None:
+                record["threshold"] = float(threshold)
+            record["updated_at"] = time.time()
+
+            matrix = self._current_matrix()
+            if embedding is not None:
+                matrix = np.array(matrix)
+                matrix[index] = self._normalize(embedding)
+
+            speakers = list(self._speakers)
+            speakers[index] = record
+            self._persist(speakers, matrix)
+            return dict(record)
+
+    def remove(self, speaker_id: str) -> bool:
+        """删除说话人，返回是否存在"""
+        with self._lock:
+            try:
+                index = self._index_of(speaker_id)
+            except KeyError:
+                return False
+            matrix = np.delete(self._current_matrix(), index, axis=0)
+            self._persist(self._speakers[:index] + self._speakers[index + 1:], matrix)
+            return True
+
+    def get(self, speaker_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            try:
+                return dict(self._speakers[self._index_of(speaker_id)])
+            except KeyError:
+                return None
+
+    def list(self, course: Optional[str] = None, role: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                dict(s) for s in self._speakers
+                if (course is None or s["course"] == course) and (role is None or s["role"] == role)
+            ]
+
+    def __len__(self) -> int:
+        return len(self._speakers)
+
+    # ---------- 匹配 ----------
+
+    def match(self, embedding: np.ndarray, course: Optional[str] = None, top_k: int = 1) -> List[Dict[str, Any]]:
+        """
+        查找最相似的说话人
+
+        参数:
+            course: 只在该课程的说话人中查找（None 表示全部）
+            top_k: 返回的候选数
+
+        返回:
+            按相似度降序的候选列表，每项包含说话人记录、similarity（0-1）和
+            accepted（是否达到该说话人的阈值）
+        """
+        with self._lock:
+            matrix, speakers, thresholds = self._matrix, self._speakers, self._thresholds
+            course_codes, course_ids = self._course_codes, self._course_ids
+        if matrix is None:
+            return []
+        if course is not None and course not in course_ids:
+            return []
+
+        # 余弦相似度映射到 [0, 1]（与 calculate_similarity 一致）
+        scores = (matrix @ self._normalize(embedding) + 1.0) * 0.5
+        if course is not None:
+            scores = np.where(course_codes == course_ids[course], scores, -np.inf)
+
+        k = min(max(1, top_k), scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {**speakers[i], "similarity": float(scores[i]), "accepted": bool(scores[i] >= thresholds[i])}
+            for i in top if np.isfinite(scores[i])
+        ]
+
+    def match_many(self, embeddings: np.ndarray, course: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        一次矩阵乘法为多个声纹（如滑动窗口）各找出最相似的说话人
+
+        返回:
+            与输入等长的列表，每项格式同 match() 的候选；没有候选时为 None
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            matrix, speakers, thresholds = self._matrix, self._speakers, self._thresholds
+            course_codes, course_ids = self._course_codes, self._course_ids
+        if matrix is None or (course is not None and course not in course_ids):
+            return [None] * len(embeddings)
+        if embeddings.shape[1] != matrix.shape[1]:
+            raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match registry dimension {matrix.shape[1]}")
+
+        queries = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+        scores = (queries @ matrix.T + 1.0) * 0.5
+        if course is not None:
+            scores = np.where(course_codes[None, :] == course_ids[course], scores, -np.inf)
+
+        best = np.argmax(scores, axis=1)
+        best_scores = scores[np.arange(len(best)), best]
+        return [
+            {**speakers[i], "similarity": float(score), "accepted": bool(score >= thresholds[i])}
+            for i, score in zip(best, best_scores)
+        ]
@@ -0,0 +1,216 @@
+"""
+流式转录 - 滚动音频缓冲区 + 局部一致性（local agreement）提交
+"""
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    """两个字符串的公共前缀长度"""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def stable_prefix(previous: str, current: str) -> str:
+    """
+    连续两次假设的稳定前缀
+
+    中文按字符比较；前缀截断在英文单词中间时回退到上一个空格，避免提交半个单词
+    """
+    def is_word_char(c: str) -> bool:
+        return c.isascii() and c.isalnum()
+
+    n = common_prefix_length(previous, current)
+    if 0 < n < len(current) and is_word_char(current[n - 1]) and is_word_char(current[n]):
+        boundary = current.rfind(" ", 0, n)
+        n = boundary + 1 if boundary >= 0 else 0
+    return current[:n]
+
+
+class StreamingSession:
+    """
+    单个会话的流式转录状态
+    功能：
+    1. 预分配的滚动音频缓冲区（最长 max_window_s 秒）
+    2. 每积累 hop_s 秒新音频触发一次重解码
+    3. 连续两次假设一致的前缀提交为最终文本，其余作为临时结果
+    4. 检测到停顿或缓冲区写满时整体提交并清空
+    5. 记录每个会话的延迟指标
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        hop_s: float = 1.0,
+        max_window_s: float = 20.0,
+        pause_s: float = 0.6,
+        silence_threshold: float = 0.01,
+        latency_target_ms: float = 2000.0,
+    ):
+        self.session_id = session_id
+        self.hop_samples = int(hop_s * SAMPLE_RATE)
+        self.max_samples = int(max_window_s * SAMPLE_RATE)
+        self.pause_samples = int(pause_s * SAMPLE_RATE)
+        self.silence_threshold = silence_threshold
+        self.latency_target_ms = latency_target_ms
+
+        # 滚动缓冲区（float32，[-1, 1]）
+        self.buffer = np.zeros(self.max_samples, dtype=np.float32)
+        self.length = 0
+        self.samples_since_decode = 0
+        self.start_time: Optional[float] = None  # 缓冲区第一个样本的墙上时间（秒）
+
+        # 假设状态
+        self.previous_hypothesis = ""
+        self.committed = ""  # 当前缓冲区中已提交的前缀
+        self.committed_samples = 0  # 已提交文本对应的音频终点（样本，按文本长度比例估计）
+        self.partial_id = str(uuid.uuid4())  # 临时结果的块 ID（客户端据此替换）
+        self.previous_decode_arrival: Optional[float] = None
+        self.last_arrival: Optional[float] = None
+
+        # 延迟统计（毫秒）
+        self.partial_latencies: List[float] = []
+        self.commit_latencies: List[float] = []
+        self.target_misses = 0
+
+    @property
+    def duration(self) -> float:
+        """缓冲区中音频时长（秒）"""
+        return self.length / SAMPLE_RATE
+
+    def append(self, audio: np.ndarray, start_time: Optional[float] = None) -> np.ndarray:
+        """
+        追加音频到缓冲区
+
+        参数:
+            start_time: 这段音频第一个样本的墙上时间（秒），缓冲区为空时作为时间轴起点
+
+        返回:
+            放不下的剩余音频（缓冲区已满时，调用方需先提交并重置）
+        """
+        self.last_arrival = time.time()
+        if self.length == 0:
+            self.start_time = start_time if start_time is not None else self.last_arrival - len(audio) / SAMPLE_RATE
+        space = self.max_samples - self.length
+        taken = audio[:space]
+        self.buffer[self.length:self.length + len(taken)] = taken
+        self.length += len(taken)
+        self.samples_since_decode += len(taken)
+        return audio[space:]
+
+    def wall_time(self, sample: int) -> float:
+        """缓冲区内样本位置对应的墙上时间（秒）"""
+        return (self.start_time if self.start_time is not None else time.time()) + sample / SAMPLE_RATE
+
+    def window(self) -> np.ndarray:
+        """当前缓冲区音频（视图，不复制）"""
+        return self.buffer[:self.length]
+
+    def is_full(self) -> bool:
+        return self.length >= self.max_samples
+
+    def should_decode(self) -> bool:
+        """新音频是否已达到一个 hop"""
+        return self.length > 0 and self.samples_since_decode >= self.hop_samples
+
+    def ends_with_pause(self) -> bool:
+        """缓冲区末尾是否为停顿（用于断句提交）"""
+        if self.length < self.pause_samples:
+            return False
+        tail = self.buffer[self.length - self.pause_samples:self.length]
+        return float(np.sqrt(np.mean(tail ** 2))) < self.silence_threshold
+
+    def update(self, hypothesis: str) -> Dict[str, Any]:
+        """
+        用新的解码假设更新状态
+
+        返回:
+            {"commit": 新提交的文本, "partial": 尚未稳定的剩余文本,
+             "span": 新提交文本对应的缓冲区样本区间 (开始, 结束)，没有提交时为 None}
+        """
+        now = time.time()
+        self.samples_since_decode = 0
+
+        if self.last_arrival is not None:
+            self._record(self.partial_latencies, (now - self.last_arrival) * 1000)
+
+        stable = stable_prefix(self.previous_hypothesis, hypothesis)
+        commit = ""
+        span = None
+        if len(stable) > len(self.committed) and stable.startswith(self.committed):
+            commit = stable[len(self.committed):]
+            self.committed = stable
+            # 没有逐词时间戳：按已提交文本占整个假设的比例估计对应的音频终点
+            end = max(self.committed_samples, min(self.length, round(self.length * len(stable) / len(hypothesis))))
+            span = (self.committed_samples, end)
+            self.committed_samples = end
+            if self.previous_decode_arrival is not None:
+                self._record(self.commit_latencies, (now - self.previous_decode_arrival) * 1000)
+
+        self.previous_hypothesis = hypothesis
+        self.previous_decode_arrival = self.last_arrival
+        return {"commit": commit, "partial": self._remainder(hypothesis), "span": span}
+
+    def pending_text(self) -> str:
+        """最近一次假设中尚未提交的部分"""
+        return self._remainder(self.previous_hypothesis)
+
+    def pending_span(self) -> tuple:
+        """尚未提交部分对应的缓冲区样本区间 (开始, 结束)"""
+        return self.committed_samples, self.length
+
+    def flush(self) -> str:
+        """取出尚未提交的部分，并清空缓冲区"""
+        remainder = self.pending_text()
+        self.reset()
+        return remainder
+
+    def reset(self):
+        """清空缓冲区，开始新的一句"""
+        self.length = 0
+        self.samples_since_decode = 0
+        self.start_time = None
+        self.previous_hypothesis = ""
+        self.committed = ""
+        self.committed_samples = 0
+        self.partial_id = str(uuid.uuid4())
+        self.previous_decode_arrival = None
+
+    def _remainder(self, hypothesis: str) -> str:
+        if hypothesis.startswith(self.committed):
+            return hypothesis[len(self.committed):]
+        # 模型修改了已提交部分，只保留分歧之后的内容
+        return hypothesis[common_prefix_length(self.committed, hypothesis):]
+
+    def _record(self, samples: List[float], latency_ms: float):
+        samples.append(latency_ms)
+        if len(samples) > 1000:
+            del samples[:len(samples) - 1000]
+        if latency_ms > self.latency_target_ms:
+            self.target_misses += 1
+            logger.debug(f"⏱️ Streaming latency {latency_ms:.0f} ms over target for {self.session_id}")
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取延迟统计"""
+        def percentile(samples: List[float], q: float) -> float:
+            return float(np.percentile(samples, q)) if samples else 0.0
+
+        return {
+            "partial_p50_ms": percentile(self.partial_latencies, 50),
+            "partial_p95_ms": percentile(self.partial_latencies, 95),
+            "commit_p50_ms": percentile(self.commit_latencies, 50),
+            "commit_p95_ms": percentile(self.commit_latencies, 95),
+            "latency_target_ms": self.latency_target_ms,
+            "target_misses": self.target_misses,
+        }
@@ -0,0 +1,167 @@
+"""
+转录导出 - 把会话转录逐块写成 Markdown / 纯文本 / SRT / WebVTT / JSONL，按块流式输出
+"""
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+from config import settings
+from services.transcript_store import transcript_store
+
+logger = logging.getLogger(__name__)
+
+# 格式 -> (扩展名, MIME 类型)
+EXPORT_FORMATS = {
+    "markdown": (".md", "text/markdown; charset=utf-8"),
+    "text": (".txt", "text/plain; charset=utf-8"),
+    "srt": (".srt", "application/x-subrip; charset=utf-8"),
+    "vtt": (".vtt", "text/vtt; charset=utf-8"),
+    "jsonl": (".jsonl", "application/x-ndjson; charset=utf-8"),
+}
+
+# 每次从转录存储读取的块数
+READ_PAGE_SIZE = 500
+
+# 字幕中没有结束时间的块默认显示的时长（毫秒），且不会超过下一块的开始时间
+DEFAULT_CUE_MS = 3000
+
+
+async def store_blocks(session_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """按追加顺序分页读取会话的全部转录块（内存中最多一页）"""
+    after = None
+    while True:
+        blocks, after = await transcript_store.read(session_id, after=after, limit=READ_PAGE_SIZE)
+        for block in blocks:
+            yield block
+        if after is None:
+            return
+
+
+async def list_blocks(blocks: Iterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """请求中直接提供的转录块"""
+    for block in blocks:
+        yield block
+
+
+# ---------- 各格式的写出 ----------
+
+async def _markdown(blocks: AsyncIterator[Dict[str, Any]], notes: str, origin_ms: Optional[int]) -> AsyncIterator[str]:
+    yield "# 课堂录音笔记\n\n"
+    if notes:
+        yield f"## 📝 我的笔记\n\n{notes}\n\n"
+    yield "## 🎤 转录记录\n\n"
+    async for block in blocks:
+        yield f"### {block['startTime']}\n\n**原文** ({block['detectedLanguage']}):\n{block['originalText']}\n\n"
+        if block.get("translatedText"):
+            yield f"**English**:\n{block['translatedText']}\n\n"
+        yield "---\n\n"
+
+
+async def _text(blocks: AsyncIterator[Dict[str, Any]], notes: str, origin_ms: Optional[int]) -> AsyncIterator[str]:
+    yield "课堂录音笔记\n" + "=" * 50 + "\n\n"
+    if notes:
+        yield "我的笔记\n" + "-" * 50 + "\n" + notes + "\n\n"
+    yield "转录记录\n" + "-" * 50 + "\n\n"
+    async for block in blocks:
+        yield f"[{block['startTime']}]\n原文: {block['originalText']}\n"
+        if block.get("translatedText"):
+            yield f"翻译: {block['translatedText']}\n"
+        yield "\n"
+
+
+async def _jsonl(blocks: AsyncIterator[Dict[str, Any]], notes: str, origin_ms: Optional[int]) -> AsyncIterator[str]:
+    async for block in blocks:
+        yield json.dumps(block, ensure_ascii=False) + "\n"
+
+
+def _cue_time(ms: int, separator: str) -> str:
+    ms = max(0, ms)
+    hours, ms = divmod(ms, 3600_000)
+    minutes, ms = divmod(ms, 60_000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+async def _cues(blocks: AsyncIterator[Dict[str, Any]], origin_ms: Optional[int]) -> AsyncIterator[tuple]:
+    """
+    字幕条目 (开始毫秒, 结束毫秒, 文本)，时间相对于 origin_ms（默认第一块的开始时间）
+    结束时间取块的 endTimestamp，没有时用默认时长；都不超过下一块的开始（需要向后看一块）
+    """
+    previous = None
+    async for block in blocks:
+        if origin_ms is None:
+            origin_ms = block["timestamp"]
+        if previous is not None:
+            yield _cue(previous, origin_ms, next_start=block["timestamp"])
+        previous = block
+    if previous is not None:
+        yield _cue(previous, origin_ms)
+
+
+def _cue(block: Dict[str, Any], origin_ms: int, next_start: Optional[int] = None) -> tuple:
+    start = block["timestamp"]
+    end = block.get("endTimestamp") or start + DEFAULT_CUE_MS
+    if next_start is not None and next_start > start:
+        end = min(end, next_start)
+    text = block["originalText"]
+    if block.get("translatedText") and block["translatedText"] != text:
+        text += "\n" + block["translatedText"]
+    # 空行会提前结束字幕条目，"-->" 会被当作时间行
+    text = "\n".join(line for line in text.replace("-->", "->").splitlines() if line.strip())
+    return start - origin_ms, max(end, start + 1) - origin_ms, text
+
+
+async def _srt(blocks: AsyncIterator[Dict[str, Any]], notes: str, origin_ms: Optional[int]) -> AsyncIterator[str]:
+    index = 0
+    async for start, end, text in _cues(blocks, origin_ms):
+        index += 1
+        yield f"{index}\n{_cue_time(start, ',')} --> {_cue_time(end, ',')}\n{text}\n\n"
+
+
+async def _vtt(blocks: AsyncIterator[Dict[str, Any]], notes: str, origin_ms: Optional[int]) -> AsyncIterator[str]:
+    yield "WEBVTT\n\n"
+    async for start, end, text in _cues(blocks, origin_ms):
+        yield f"{_cue_time(start, '.')} --> {_cue_time(end, '.')}\n{text}\n\n"
+
+
+_WRITERS = {
+    "markdown": _markdown,
+    "text": _text,
+    "srt": _srt,
+    "vtt": _vtt,
+    "jsonl": _jsonl,
+}
+
+
+async def export_stream(
+    fmt: str,
+    blocks: AsyncIterator[Dict[str, Any]],
+    notes: str = "",
+    origin_ms: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    流式导出转录
+
+    参数:
+        fmt: EXPORT_FORMATS 中的格式
+        blocks: 转录块来源（store_blocks / list_blocks）
+        notes: 笔记（Markdown 和纯文本格式写在开头）
+        origin_ms: 字幕时间轴的零点（毫秒时间戳，如录音开始时间）
+
+    返回:
+        UTF-8 字节块：小段输出合并到 TRANSCRIPT_EXPORT_CHUNK_KB 再发送，内存占用与转录长度无关
+    """
+    chunk_bytes = settings.TRANSCRIPT_EXPORT_CHUNK_KB * 1024
+    buffer = bytearray()
+    try:
+        async for part in _WRITERS[fmt](blocks, notes, origin_ms):
+            buffer += part.encode("utf-8")
+            if len(buffer) >= chunk_bytes:
+                yield bytes(buffer)
+                buffer.clear()
+    except Exception as e:
+        # 响应头已发出，只能截断输出
+        logger.error(f"❌ Transcript export ({fmt}) failed: {e}")
+        raise
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,136 @@
+"""
+转录全文检索 - 分词（中文二元组 + 英文单词）、检索式构造和命中摘要；倒排索引存放在转录存储的 FTS5 表中
+"""
+import re
+from typing import List, Optional, Set, Tuple
+
+# 汉字（含扩展 A 和兼容汉字）
+_CJK = "㐀-䶿一-鿿豈-﫿"
+
+# 连续汉字，或连续的其他文字/数字（英文单词等）
+_TOKEN_RE = re.compile(rf"([{_CJK}]+)|([^\W_{_CJK}]+)")
+
+# 摘要长度（字符）以及命中位置之前保留的上下文长度
+SNIPPET_CHARS = 80
+SNIPPET_CONTEXT_CHARS = 20
+
+# FTS5 highlight() 在命中词两侧插入的标记（分词结果中不会出现的控制字符）
+HIGHLIGHT_OPEN = "\x01"
+HIGHLIGHT_CLOSE = "\x02"
+
+
+def tokenize_spans(text: str) -> List[Tuple[str, int, int]]:
+    """
+    索引分词，同时记录每个词在原文中的位置 [(词, 开始, 结束)]
+    连续汉字切成相邻二元组，末尾再补一个单字（单字查询可用前缀匹配命中任何位置）；
+    其他文字按单词切分并转小写（英文词干由 FTS5 的 porter 分词器处理）
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        cjk, word = match.groups()
+        start, end = match.span()
+        if word:
+            tokens.append((word.lower(), start, end))
+        elif len(cjk) == 1:
+            tokens.append((cjk, start, end))
+        else:
+            tokens.extend((cjk[i:i + 2], start + i, start + i + 2) for i in range(len(cjk) - 1))
+            tokens.append((cjk[-1], end - 1, end))
+    return tokens
+
+
+def tokenize(text: str) -> List[str]:
+    """索引分词（见 tokenize_spans）"""
+    return [token for token, _, _ in tokenize_spans(text)]
+
+
+def index_text(text: str) -> str:
+    """写入 FTS5 的分词结果（空格分隔，FTS5 记录每个词的位置）"""
+    return " ".join(tokenize(text))
+
+
+def query_terms(query: str) -> List[str]:
+    """查询中的检索词：连续汉字整体一个，其他按单词"""
+    return [cjk or word.lower() for cjk, word in _TOKEN_RE.findall(query)]
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    把用户输入转为 FTS5 检索式（所有检索词都要出现；没有可检索的内容时返回 None）
+    连续汉字转为相邻二元组的短语查询（位置必须相邻），单个汉字用前缀匹配
+    """
+    parts = []
+    for term in query_terms(query):
+        if re.fullmatch(f"[{_CJK}]", term):
+            parts.append(f'"{term}"*')
+        elif re.fullmatch(f"[{_CJK}]+", term):
+            parts.append('"' + " ".join(term[i:i + 2] for i in range(len(term) - 1)) + '"')
+        else:
+            parts.append(f'"{term}"')
+    return " ".join(parts) or None
+
+
+def marked_tokens(highlighted: str) -> Set[int]:
+    """
+    解析 FTS5 highlight() 对分词结果列的输出，返回命中词的序号
+    （短语命中时标记会跨越多个词和中间的空格）
+    """
+    marked = set()
+    index, inside = 0, False
+    for char in highlighted:
+        if char == HIGHLIGHT_OPEN:
+            inside = True
+        elif char == HIGHLIGHT_CLOSE:
+            inside = False
+        elif char == " ":
+            index += 1
+        elif inside:
+            marked.add(index)
+    return marked
+
+
+def match_positions(text: str, marked: Set[int], terms: List[str]) -> List[Tuple[int, int]]:
+    """
+    把命中词序号映射回原文位置并合并相邻/重叠的区间
+    命中词由 FTS5 判定（与检索使用同一套词干和前缀规则），英文变形（如 running / run）也能高亮；
+    单字前缀查询命中的二元组只高亮第一个字
+    """
+    phrases = [term for term in terms if len(term) > 1 and re.fullmatch(f"[{_CJK}]+", term)]
+    spans = []
+    for index, (token, start, end) in enumerate(tokenize_spans(text)):
+        if index not in marked:
+            continue
+        if len(token) == 2 and re.fullmatch(f"[{_CJK}]+", token) and not any(token in p for p in phrases):
+            end = start + 1
+        spans.append((start, end))
+
+    positions: List[Tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if positions and start <= positions[-1][1]:
+            positions[-1] = (positions[-1][0], max(end, positions[-1][1]))
+        else:
+            positions.append((start, end))
+    return positions
+
+
+def make_snippet(text: str, positions: List[Tuple[int, int]]) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    命中摘要：截取第一个命中附近的一段文本
+
+    参数:
+        positions: 原文中的命中位置（match_positions，已排序且不重叠）
+
+    返回:
+        (摘要, 摘要中命中位置 [(开始, 结束)])；前端据此高亮，不需要解析标记
+    """
+    first = positions[0][0] if positions else 0
+    begin = max(0, min(first - SNIPPET_CONTEXT_CHARS, len(text) - SNIPPET_CHARS))
+    end = min(len(text), begin + SNIPPET_CHARS)
+    prefix = "…" if begin > 0 else ""
+    snippet = prefix + text[begin:end] + ("…" if end < len(text) else "")
+
+    offset = len(prefix) - begin
+    highlights = [
+        (start + offset, stop + offset) for start, stop in positions if start >= begin and stop <= end
+    ]
+    return snippet, highlights
@@ -0,0 +1,450 @@
+"""
+转录存储 - 按会话追加保存最终转录块和译文（SQLite WAL，批量提交），支持按块 ID 或时间范围读取和全文检索；
+同时保存会话笔记（导出时使用）
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from services.transcript_search import (
+    HIGHLIGHT_CLOSE,
+    HIGHLIGHT_OPEN,
+    build_match_query,
+    index_text,
+    make_snippet,
+    marked_tokens,
+    match_positions,
+    query_terms,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptStore:
+    """
+    追加式转录存储
+    功能：
+    1. 最终转录块和后台翻译结果只追加写入（转录块表 + 译文表），读取时合并；浏览器崩溃也不会丢失转录
+    2. 写入先进入内存队列，按时间窗口或条数合并为一个事务提交（synchronous=FULL，每批一次 fsync），
+       转录主流程不等待磁盘
+    3. 按会话读取：从某个块 ID 之后、按开始时间范围，分页返回（导出和断线重连只取需要的部分）
+    4. 全文检索：原文和译文在同一事务中写入 FTS5 倒排索引（行号 = 块序号 * 2，译文 + 1），
+       提交即可检索，按 BM25 排序
+    5. 会话笔记单独保存，导出下载时不必随请求上传
+    """
+
+    def __init__(self, db_path: str, flush_ms: int = 200, max_batch: int = 256):
+        self.db_path = db_path
+        self.flush_interval = max(0, flush_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self._pending: List[Tuple[str, tuple]] = []  # (表, 行)，按追加顺序
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        self.stats = {"blocks": 0, "translations": 0, "batches": 0, "write_errors": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库（调用方持有锁）"""
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # 每批提交一次，提交即落盘
+            self._db.execute("PRAGMA synchronous=FULL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS transcript_blocks (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    block_id TEXT NOT NULL UNIQUE,
+                    start_ms INTEGER NOT NULL,
+                    end_ms INTEGER,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transcript_blocks_session ON transcript_blocks (session_id, seq)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transcript_blocks_start ON transcript_blocks (session_id, start_ms)"
+            )
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS transcript_translations (
+                    block_id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    translated_text TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS session_notes (
+                    session_id TEXT PRIMARY KEY,
+                    notes TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            indexed = self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'transcript_search'"
+            ).fetchone()
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS transcript_search "
+                "USING fts5(tokens, session_id UNINDEXED, start_ms UNINDEXED, tokenize='porter unicode61')"
+            )
+            if not indexed:
+                self._rebuild_index(self._db)
+            self._db.commit()
+        return self._db
+
+    def _rebuild_index(self, db: sqlite3.Connection):
+        """为已有的转录建立检索索引（索引表新建时）"""
+        db.execute("DELETE FROM transcript_search")
+        count = 0
+        for seq, session_id, start_ms, data in db.execute(
+            "SELECT seq, session_id, start_ms, data FROM transcript_blocks"
+        ).fetchall():
+            self._index(db, seq * 2, session_id, start_ms, json.loads(data)["originalText"])
+            count += 1
+        for block_id, translated_text in db.execute(
+            "SELECT block_id, translated_text FROM transcript_translations"
+        ).fetchall():
+            self._index_translation(db, block_id, translated_text)
+        if count:
+            logger.info(f"🔎 Indexed {count} existing transcript blocks for search")
+
+    @staticmethod
+    def _index(db: sqlite3.Connection, rowid: int, session_id: str, start_ms: int, text: str):
+        tokens = index_text(text)
+        if tokens:
+            db.execute(
+                "INSERT OR REPLACE INTO transcript_search (rowid, tokens, session_id, start_ms) VALUES (?, ?, ?, ?)",
+                (rowid, tokens, session_id, start_ms),
+            )
+
+    @staticmethod
+    def _index_translation(db: sqlite3.Connection, block_id: str, translated_text: str):
+        tokens = index_text(translated_text)
+        if tokens:
+            db.execute(
+                "INSERT OR REPLACE INTO transcript_search (rowid, tokens, session_id, start_ms) "
+                "SELECT seq * 2 + 1, ?, session_id, start_ms FROM transcript_blocks WHERE block_id = ?",
+                (tokens, block_id),
+            )
+
+    # ---------- 写入 ----------
+
+    def _ensure_worker(self):
+        """在当前事件循环中启动提交协程（首次写入时懒启动）"""
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._worker = asyncio.create_task(self._run())
+
+    def _enqueue(self, table: str, row: tuple):
+        self._ensure_worker()
+        self._pending.append((table, row))
+        self._wakeup.set()
+
+    def append(self, session_id: str, blocks: List[Dict[str, Any]]):
+        """追加最终转录块（不等待写盘）"""
+        now = time.time()
+        for block in blocks:
+            self._enqueue("transcript_blocks", (
+                session_id,
+                block["id"],
+                block["timestamp"],
+                block.get("endTimestamp"),
+                json.dumps(block, ensure_ascii=False),
+                now,
+                block["originalText"],  # 仅用于建索引，不写入转录块表
+            ))
+
+    def add_translation(self, session_id: str, block_id: str, translated_text: str):
+        """追加某个块的译文（不等待写盘）"""
+        self._enqueue("transcript_translations", (block_id, session_id, translated_text, time.time()))
+
+    def _write_batch(self, batch: List[Tuple[str, tuple]]):
+        blocks = [row for table, row in batch if table == "transcript_blocks"]
+        translations = [row for table, row in batch if table == "transcript_translations"]
+        with self._lock:
+            db = self._connect()
+            for row in blocks:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO transcript_blocks (session_id, block_id, start_ms, end_ms, data, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    row[:6],
+                )
+                if cursor.rowcount:
+                    self._index(db, cursor.lastrowid * 2, row[0], row[2], row[6])
+            db.executemany(
+                "INSERT OR REPLACE INTO transcript_translations (block_id, session_id, translated_text, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                translations,
+            )
+            for block_id, _, translated_text, _ in translations:
+                self._index_translation(db, block_id, translated_text)
+            db.commit()
+        self.stats["blocks"] += len(blocks)
+        self.stats["translations"] += len(translations)
+        self.stats["batches"] += 1
+
+    async def flush(self):
+        """立即提交所有待写入的数据（读取前和关闭时调用）"""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except sqlite3.Error as e:
+                self.stats["write_errors"] += 1
+                logger.error(f"❌ Transcript store write failed ({len(batch)} rows): {e}")
+
+    async def _run(self):
+        """提交主循环：等到时间窗口结束或攒满一批后提交"""
+        while True:
+            try:
+                if not self._pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Transcript store loop error: {e}")
+
+    # ---------- 读取 ----------
+
+    def _read(
+        self,
+        session_id: str,
+        after: Optional[str],
+        since_ms: Optional[int],
+        until_ms: Optional[int],
+        limit: int,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        conditions, params = ["b.session_id = ?"], [session_id]
+        with self._lock:
+            db = self._connect()
+            if after is not None:
+                row = db.execute(
+                    "SELECT seq FROM transcript_blocks WHERE block_id = ? AND session_id = ?", (after, session_id)
+                ).fetchone()
+                if row is None:
+                    raise KeyError(after)
+                conditions.append("b.seq > ?")
+                params.append(row[0])
+            if since_ms is not None:
+                conditions.append("b.start_ms >= ?")
+                params.append(since_ms)
+            if until_ms is not None:
+                conditions.append("b.start_ms < ?")
+                params.append(until_ms)
+            rows = db.execute(
+                "SELECT b.data, t.translated_text FROM transcript_blocks b "
+                "LEFT JOIN transcript_translations t ON t.block_id = b.block_id "
+                f"WHERE {' AND '.join(conditions)} ORDER BY b.seq LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+
+        blocks = []
+        for data, translated_text in rows[:limit]:
+            block = json.loads(data)
+            if translated_text is not None:
+                block["translatedText"] = translated_text
+            blocks.append(block)
+        # 多取一条判断是否还有下一页
+        next_after = blocks[-1]["id"] if len(rows) > limit else None
+        return blocks, next_after
+
+    async def read(
+        self,
+        session_id: str,
+        after: Optional[str] = None,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+        limit: int = 500,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按追加顺序读取会话的转录块（译文已合并）
+
+        参数:
+            after: 只返回该块之后追加的块（块 ID 不属于该会话时抛 KeyError）
+            since_ms/until_ms: 块开始时间范围（毫秒时间戳，since 含、until 不含）
+
+        返回:
+            (转录块列表, 下一页的 after；没有更多时为 None)
+        """
+        await self.flush()
+        return await asyncio.to_thread(self._read, session_id, after, since_ms, until_ms, limit)
+
+    # ---------- 笔记 ----------
+
+    def _save_notes(self, session_id: str, notes: str):
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO session_notes (session_id, notes, updated_at) VALUES (?, ?, ?)",
+                (session_id, notes, time.time()),
+            )
+            db.commit()
+
+    def _get_notes(self, session_id: str) -> str:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT notes FROM session_notes WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else ""
+
+    async def save_notes(self, session_id: str, notes: str):
+        """保存会话笔记（覆盖旧内容，立即提交）"""
+        await asyncio.to_thread(self._save_notes, session_id, notes)
+
+    async def get_notes(self, session_id: str) -> str:
+        """读取会话笔记（没有时返回空字符串）"""
+        return await asyncio.to_thread(self._get_notes, session_id)
+
+    # ---------- 检索 ----------
+
+    def _search(
+        self,
+        match: str,
+        terms: List[str],
+        session_id: Optional[str],
+        since_ms: Optional[int],
+        until_ms: Optional[int],
+        limit: int,
+        offset: int,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        conditions, params = ["transcript_search MATCH ?"], [match]
+        if session_id is not None:
+            conditions.append("session_id = ?")
+            params.append(session_id)
+        if since_ms is not None:
+            conditions.append("start_ms >= ?")
+            params.append(since_ms)
+        if until_ms is not None:
+            conditions.append("start_ms < ?")
+            params.append(until_ms)
+        wanted = offset + limit + 1  # 多取一条判断是否还有下一页
+        with self._lock:
+            db = self._connect()
+            # 过滤和 ORDER BY rank LIMIT 都在 FTS5 内完成（只对前 N 条排序）；
+            # 同一块的原文和译文最多两行，取两倍后按块去重（保留得分最好的一条）
+            rows = db.execute(
+                "SELECT rowid, rank FROM transcript_search "
+                f"WHERE {' AND '.join(conditions)} ORDER BY rank LIMIT ?",
+                (*params, wanted * 2),
+            ).fetchall()
+            best: Dict[int, Tuple[int, float]] = {}
+            for rowid, rank in rows:
+                best.setdefault(rowid // 2, (rowid % 2, rank))
+            page = list(best.items())[offset:wanted]
+            seqs = [seq for seq, _ in page]
+            # 只对本页命中的行取 highlight()，命中词的判定与检索一致（词干、前缀、短语）
+            rowids = [seq * 2 + field for seq, (field, _) in page[:limit]]
+            highlighted = dict(db.execute(
+                f"SELECT rowid, highlight(transcript_search, 0, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}') "
+                f"FROM transcript_search WHERE transcript_search MATCH ? AND rowid IN ({','.join('?' * len(rowids))})",
+                (match, *rowids),
+            ).fetchall())
+            blocks = {
+                seq: (hit_session, data, translated_text)
+                for seq, hit_session, data, translated_text in db.execute(
+                    "SELECT b.seq, b.session_id, b.data, t.translated_text FROM transcript_blocks b "
+                    "LEFT JOIN transcript_translations t ON t.block_id = b.block_id "
+                    f"WHERE b.seq IN ({','.join('?' * len(seqs))})",
+                    seqs,
+                ).fetchall()
+            }
+
+        hits = []
+        for seq, (field, rank) in page[:limit]:
+            hit_session, data, translated_text = blocks[seq]
+            block = json.loads(data)
+            if translated_text is not None:
+                block["translatedText"] = translated_text
+            text = block["translatedText"] if field else block["originalText"]
+            marked = marked_tokens(highlighted.get(seq * 2 + field, ""))
+            snippet, highlights = make_snippet(text, match_positions(text, marked, terms))
+            hits.append({
+                "sessionId": hit_session,
+                "block": block,
+                "field": "translation" if field else "original",
+                "score": -rank,  # bm25 越小越相关，取反后越大越相关
+                "snippet": snippet,
+                "highlights": highlights,
+            })
+        return hits, len(page) > limit
+
+    async def search(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        全文检索原文和译文（所有检索词都要出现，汉字按位置相邻匹配），按相关度排序
+
+        参数:
+            session_id: 只检索某个会话
+            since_ms/until_ms: 块开始时间范围（毫秒时间戳，since 含、until 不含）
+
+        返回:
+            (命中列表 [{sessionId, block, field, score, snippet, highlights}], 是否还有更多)
+        """
+        match = build_match_query(query)
+        if match is None:
+            return [], False
+        await self.flush()
+        return await asyncio.to_thread(
+            self._search, match, query_terms(query), session_id, since_ms, until_ms, limit, offset
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"pending": len(self._pending), **self.stats}
+
+    async def close(self):
+        """提交剩余数据并关闭数据库"""
+        await self.flush()
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# 全局实例
+transcript_store = TranscriptStore(
+    settings.TRANSCRIPT_STORE_PATH,
+    flush_ms=settings.TRANSCRIPT_FLUSH_MS,
+    max_batch=settings.TRANSCRIPT_FLUSH_MAX_BATCH,
+)
@@ -7,41 +7,67 @@ import io
 import time
 import uuid
 import logging
-from typing import Optional, Dict, Any
-import aiohttp
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from typing import Optional, Dict, Any, List, Union, AsyncIterator, Awaitable, Callable
 import numpy as np
 from config import settings
 import google.generativeai as genai
 
-# Whisper 导入
-import whisper
-import torch
-
 # 导入声纹识别服务
 from services.speaker_recognition_service import speaker_recognition_service
+from services.gemini_client import GeminiClient
+from services.asr_engines import create_asr_engine, SAMPLE_RATE
+from services.model_loader import model_loader
+from services.inference_workers import InferenceWorkerPool
+from services.decoding_policy import AdaptiveDecodingPolicy, DecodingTier
+from services.translation_batcher import TranslationBatcher
+from services.translation_cache import TranslationCache
+from services.transcript_store import transcript_store
+from services.inference_scheduler import InferenceScheduler, SchedulerQueueFull
+from services.streaming_transcription import StreamingSession
+from services.audio_frame import AudioFrame
+from services.audio_pipeline import (
+    AudioPipeline, SilenceGateStage, VADStage, DiarizationStage, WhisperStage, SpeakerStage, ParallelStage
+)
+from services.vad import VoiceActivityDetector, group_regions, concatenate_regions
+from services.diarization import split_regions_by_turns
 
 logger = logging.getLogger(__name__)
 
+# 翻译提示词版本（修改翻译提示词时递增，使旧缓存失效）
+TRANSLATION_PROMPT_VERSION = "v1"
+
+# VAD 拼接语音区间时插入的静音长度（秒），帮助 Whisper 识别词边界
+VAD_REGION_GAP_S = 0.2
+
 
 class TranscriptionService:
     """
     实时转录服务
-    使用 OpenAI Whisper 进行音频转录，Gemini API 进行翻译
+    使用可插拔的 ASR 引擎（默认 OpenAI Whisper）进行音频转录，Gemini API 进行翻译
     """
 
     def __init__(self):
         self.api_key = settings.GEMINI_API_KEY
         self.generation_model = settings.GEMINI_GENERATION_MODEL
-        self.api_base_url = "https://aiplatform.googleapis.com/v1/publishers/google/models"
+        self.api_base_url = settings.GEMINI_API_BASE_URL
+        
+        # 长期复用的 Gemini HTTP 连接池（应用关闭时调用 close() 释放）
+        self.gemini_client = GeminiClient(
+            proxy=settings.HTTP_PROXY if settings.USE_PROXY else None,
+            timeout=settings.API_TIMEOUT,
+            pool_limit=settings.GEMINI_POOL_LIMIT,
+            pool_limit_per_host=settings.GEMINI_POOL_LIMIT_PER_HOST,
+            dns_cache_ttl=settings.GEMINI_DNS_CACHE_TTL,
+            max_retries=settings.GEMINI_MAX_RETRIES,
+            retry_base_delay=settings.GEMINI_RETRY_BASE_DELAY,
+        )
         
         # 配置 Gemini API
         genai.configure(api_key=self.api_key)
         
-        # 初始化 Whisper 模型（使用 small 模型，准确度更高）
-        logger.info("🔄 Loading Whisper model (small)...")
-        self.whisper_model = whisper.load_model("small")  # small 模型，准确度更高
-        logger.info("✅ Whisper model loaded successfully")
-        
         # 初始化说话人识别模型（可选，需要 HuggingFace token）
         self.diarization_pipeline = None
         self.enable_speaker_detection = False  # 默认关闭，需要配置后开启
@@ -86,6 +112,129 @@ class TranscriptionService:
             "DNA", "蛋白质", "protein"
         ]
         
+        # 构建初始提示（包含常用学术术语）
+        # Whisper 会参考这些词汇来提高准确度
+        self.initial_prompt = "这是一节课程。包含：" + "、".join(self.academic_terms[:20])
+        
+        # Whisper 解码参数（单条 transcribe 与批量 decode 共用）
+        self.whisper_options = {
+            "language": 'zh',  # 强制中文模式（可识别中英混合）
+            "task": "transcribe",
+            "fp16": False,  # 在 CPU 上运行
+            "initial_prompt": self.initial_prompt,  # 提供专业术语提示
+            "temperature": 0.0,  # 降低温度，减少随机性
+            "condition_on_previous_text": True,  # 使用上下文，提高连贯性
+            "no_speech_threshold": 0.6,  # 提高静音检测阈值
+            "logprob_threshold": -1.0,  # 降低置信度阈值，减少幻觉
+            "compression_ratio_threshold": 2.4,  # 压缩率阈值，过滤重复内容
+            "word_timestamps": False,  # 关闭单词时间戳，提高速度
+            "beam_size": 5,  # 使用束搜索，提高准确度
+            "best_of": 5  # 生成5个候选，选最好的
+        }
+        
+        # ASR 引擎（ASR_ENGINE：whisper / whisper-int8 / faster-whisper）
+        self.asr_engine = create_asr_engine(
+            settings.ASR_ENGINE,
+            settings.WHISPER_MODEL,
+            self.whisper_options,
+            device=settings.ASR_DEVICE or None,
+            compute_type=settings.ASR_COMPUTE_TYPE,
+            cpu_threads=settings.ASR_CPU_THREADS,
+            cache_dir=self._model_cache_dir(),
+        )
+        
+        # 自适应解码：负载升高时依次降为贪心解码、更小的模型，负载下降后恢复
+        self.decoding_policy = AdaptiveDecodingPolicy(
+            self._build_decoding_tiers(),
+            latency_target_ms=settings.ADAPTIVE_LATENCY_TARGET_MS,
+            queue_high=settings.WHISPER_BATCH_MAX_SIZE,
+            downgrade_after=settings.ADAPTIVE_DOWNGRADE_AFTER,
+            upgrade_after=settings.ADAPTIVE_UPGRADE_AFTER,
+            enabled=settings.ADAPTIVE_DECODING_ENABLED,
+        )
+        
+        # 推理工作进程池（INFERENCE_WORKERS > 0 时 Whisper 在独立进程中运行，主进程不加载模型）
+        self.worker_pool: Optional[InferenceWorkerPool] = None
+        if settings.INFERENCE_WORKERS > 0:
+            self.worker_pool = InferenceWorkerPool(
+                settings.INFERENCE_WORKERS,
+                settings.ASR_ENGINE,
+                [engine.model_name for engine in self._tier_engines()],
+                self.whisper_options,
+                device=settings.ASR_DEVICE or None,
+                compute_type=settings.ASR_COMPUTE_TYPE,
+                cache_dir=self._model_cache_dir(),
+                threads_per_worker=settings.INFERENCE_WORKER_THREADS,
+                pin_cores=settings.INFERENCE_WORKER_PIN_CORES,
+                timeout_s=settings.INFERENCE_WORKER_TIMEOUT_S,
+                slot_samples=settings.WHISPER_BATCH_MAX_SIZE * self.asr_engine.max_samples,
+            )
+        
+        # 模型权重在应用启动后由后台任务加载（见 load_models），导入模块不再阻塞
+        model_loader.register("asr", self.load_models)
+        
+        # 跨会话批量推理调度器（所有会话共享一个模型）
+        self.inference_scheduler = InferenceScheduler(
+            self._transcribe_batch,
+            max_batch_size=settings.WHISPER_BATCH_MAX_SIZE,
+            max_wait_ms=settings.WHISPER_BATCH_MAX_WAIT_MS,
+            max_queue_size=settings.WHISPER_QUEUE_MAX_SIZE,
+            max_per_session=settings.WHISPER_QUEUE_MAX_PER_SESSION,
+            max_concurrency=settings.INFERENCE_WORKERS or 1,
+            on_batch=self._on_inference_batch,
+        )
+        
+        # 帧级 VAD：只把语音区间送入 Whisper
+        self.vad = VoiceActivityDetector(
+            frame_ms=settings.VAD_FRAME_MS,
+            energy_threshold=settings.VAD_ENERGY_THRESHOLD,
+            hangover_ms=settings.VAD_HANGOVER_MS,
+        )
+        
+        # 说话人声纹计算专用线程池（与 Whisper 推理并行，不占用事件循环）
+        self.speaker_executor = ThreadPoolExecutor(
+            max_workers=settings.SPEAKER_EXECUTOR_WORKERS,
+            thread_name_prefix="speaker"
+        )
+        
+        # 音频块处理管线（各阶段共享同一个 AudioFrame，特征只计算一次）
+        if settings.SPEAKER_DIARIZATION_ENABLED:
+            # 块内说话人分离需要在 Whisper 之前完成，以便在说话人切换处切分
+            recognition = [DiarizationStage(self, self.speaker_executor), WhisperStage(self)]
+        else:
+            # Whisper 和说话人识别互不依赖：并行执行，块延迟取两者的最大值
+            recognition = [ParallelStage("recognition", [
+                WhisperStage(self),
+                SpeakerStage(self, self.speaker_executor),
+            ])]
+        self.pipeline = AudioPipeline([SilenceGateStage(self), *recognition])
+        if settings.VAD_ENABLED:
+            self.pipeline.add_stage(VADStage(self.vad), before=recognition[0].name)
+        
+        # 翻译微批处理（短窗口内的待翻译片段合并为一次 Gemini 请求）
+        self.translation_batcher = TranslationBatcher(
+            self._request_translation,
+            self.translate_batch_to_english,
+            max_batch_size=settings.TRANSLATION_BATCH_MAX_SIZE,
+            max_wait_ms=settings.TRANSLATION_BATCH_MAX_WAIT_MS,
+            max_batch_chars=settings.TRANSLATION_BATCH_MAX_CHARS,
+        )
+        
+        # 两级翻译缓存（内存 LRU + SQLite），相同原文不重复请求
+        self.translation_cache = TranslationCache(
+            settings.TRANSLATION_CACHE_PATH,
+            model=self.generation_model,
+            prompt_version=TRANSLATION_PROMPT_VERSION,
+            max_entries=settings.TRANSLATION_CACHE_MAX_ENTRIES,
+        )
+        self._inflight_translations: Dict[str, asyncio.Future] = {}
+        
+        # 流式模式的会话状态（session_id -> StreamingSession）
+        self.streaming_sessions: Dict[str, StreamingSession] = {}
+        
+        # 会话所属课程（session_id -> course），说话人识别只匹配该课程注册的声音
+        self.session_courses: Dict[str, str] = {}
+        
         logger.info(f"✅ TranscriptionService initialized with {len(self.academic_terms)} academic terms")
 
     async def start_live_session(self):
@@ -101,6 +250,16 @@ class TranscriptionService:
         """
         logger.info("✅ Session stopped")
 
+    async def close(self):
+        """
+        释放服务持有的资源（应用关闭时调用）
+        """
+        await self.gemini_client.close()
+        self.translation_cache.close()
+        self.speaker_executor.shutdown(wait=False)
+        if self.worker_pool is not None:
+            await asyncio.to_thread(self.worker_pool.close)
+
     async def call_gemini_api(
         self, 
         prompt: str, 
@@ -126,43 +285,24 @@ class TranscriptionService:
         }
 
         try:
-            connector = None
-            if settings.USE_PROXY:
-                connector = aiohttp.TCPConnector()
+            data = await self.gemini_client.post_json(url, payload)
             
-            async with aiohttp.ClientSession(connector=connector) as session:
-                proxy = settings.HTTP_PROXY if settings.USE_PROXY else None
-                
-                async with session.post(
-                    url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                    timeout=aiohttp.ClientTimeout(total=settings.API_TIMEOUT),
-                    proxy=proxy
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"Gemini API error: {response.status} - {error_text}")
-                        raise Exception(f"API error: {response.status}")
-
-                    data = await response.json()
-                    
-                    full_text = ""
-                    if isinstance(data, list):
-                        for chunk in data:
-                            if "candidates" in chunk and len(chunk["candidates"]) > 0:
-                                content = chunk["candidates"][0].get("content", {})
-                                parts = content.get("parts", [])
-                                if parts and len(parts) > 0:
-                                    full_text += parts[0].get("text", "")
-                    else:
-                        text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-                        full_text = text
-
-                    if not full_text:
-                        raise Exception("API 返回空响应")
-
-                    return full_text.strip()
+            full_text = ""
+            if isinstance(data, list):
+                for chunk in data:
+                    if "candidates" in chunk and len(chunk["candidates"]) > 0:
+                        content = chunk["candidates"][0].get("content", {})
+                        parts = content.get("parts", [])
+                        if parts and len(parts) > 0:
+                            full_text += parts[0].get("text", "")
+            else:
+                text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+                full_text = text
+
+            if not full_text:
+                raise Exception("API 返回空响应")
+
+            return full_text.strip()
 
         except asyncio.TimeoutError:
             logger.error("Gemini API timeout")
@@ -171,6 +311,45 @@ class TranscriptionService:
             logger.error(f"Gemini API call failed: {e}")
             raise
 
+    async def call_gemini_api_stream(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2048
+    ) -> AsyncIterator[str]:
+        """
+        流式调用 Gemini API，按到达顺序逐段产出文本增量
+        """
+        url = f"{self.api_base_url}/{self.generation_model}:streamGenerateContent?alt=sse&key={self.api_key}"
+
+        payload = {
+            "contents": [
+                {
+                    "role": "user",
+                    "parts": [{"text": prompt}]
+                }
+            ],
+            "generationConfig": {
+                "temperature": temperature,
+                "maxOutputTokens": max_tokens,
+            }
+        }
+
+        try:
+            async for chunk in self.gemini_client.stream_sse(url, payload):
+                candidates = chunk.get("candidates") or [{}]
+                parts = candidates[0].get("content", {}).get("parts", [])
+                text = "".join(part.get("text", "") for part in parts)
+                if text:
+                    yield text
+
+        except asyncio.TimeoutError:
+            logger.error("Gemini API timeout")
+            raise Exception("API 调用超时")
+        except Exception as e:
+            logger.error(f"Gemini API stream failed: {e}")
+            raise
+
     def detect_language(self, text: str) -> str:
         """
         简单的语言检测（只支持中英文）
@@ -187,14 +366,58 @@ class TranscriptionService:
         else:
             return 'en'
 
-    async def translate_to_english(self, text: str, source_lang: str) -> str:
+    async def translate_to_english(
+        self,
+        text: str,
+        source_lang: str,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Optional[str]:
         """
         将文本翻译成英文
+        
+        先查两级缓存；相同原文正在翻译时等待同一个结果；
+        提供 on_delta 且原文较长时流式请求，译文增量到达即回调；
+        否则与同一时间窗口内的其他片段合并请求；成功后写入缓存
+        
+        返回:
+            译文；翻译失败时返回 None（不写入缓存，调用方也不应保存）
         """
         if source_lang == 'en':
             return text
 
-        prompt = f"""Translate the following Chinese text to English. 
+        cached = await self.translation_cache.get(text)
+        if cached is not None:
+            logger.info(f"💾 Translation cache hit: {text[:20]}")
+            return cached
+
+        key = self.translation_cache.make_key(text)
+        inflight = self._inflight_translations.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight_translations[key] = future
+        try:
+            if on_delta is not None and len(text) >= settings.TRANSLATION_STREAM_MIN_CHARS:
+                translation = await self._stream_translation(text, on_delta)
+            else:
+                translation = await self.translation_batcher.translate(text)
+            await self.translation_cache.put(text, translation)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # 失败结果不写入缓存
+            logger.error(f"Translation failed: {e}")
+            translation = None
+        finally:
+            del self._inflight_translations[key]
+        future.set_result(translation)
+        return translation
+
+    def _translation_prompt(self, text: str) -> str:
+        """单条翻译提示词"""
+        return f"""Translate the following Chinese text to English. 
 Only output the English translation, no explanations or additional text.
 
 Text to translate:
@@ -202,23 +425,72 @@ Text to translate:
 
 English translation:"""
 
-        try:
-            translation = await self.call_gemini_api(prompt, temperature=0.2)
-            return translation
-        except Exception as e:
-            logger.error(f"Translation failed: {e}")
-            return f"[Translation failed: {str(e)}]"
+    async def _request_translation(self, text: str) -> str:
+        """
+        单条翻译请求（失败时抛出异常）
+        """
+        return await self.call_gemini_api(self._translation_prompt(text), temperature=0.2)
 
-    def is_silence(self, audio_bytes: bytes) -> bool:
+    async def _stream_translation(self, text: str, on_delta: Callable[[str], Awaitable[None]]) -> str:
+        """
+        单条流式翻译：增量到达即回调，返回完整译文（失败时抛出异常）
+        """
+        full_text = ""
+        async for delta in self.call_gemini_api_stream(self._translation_prompt(text), temperature=0.2):
+            if not full_text:
+                # 去掉开头的空白，避免客户端显示前导空格
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+            full_text += delta
+            await on_delta(delta)
+
+        if not full_text.strip():
+            raise Exception("API 返回空响应")
+        return full_text.strip()
+
+    async def translate_batch_to_english(self, texts: List[str]) -> List[str]:
+        """
+        将多段中文合并为一次请求翻译成英文
+        
+        每段以 [[序号]] 标记，响应按同样的标记解析回各段；
+        有任何一段缺失时抛出 ValueError（由调用方回退为逐条翻译）
+        """
+        segments = "\n".join(f"[[{i}]] {text}" for i, text in enumerate(texts, 1))
+        prompt = f"""Translate each of the following Chinese segments to English.
+Each segment starts with an ID marker like [[1]]. Output every segment's English translation
+on its own line, prefixed with the same ID marker. Only output the translations, no explanations.
+
+Segments to translate:
+{segments}
+
+English translations:"""
+
+        response = await self.call_gemini_api(
+            prompt,
+            temperature=0.2,
+            max_tokens=min(8192, 2048 + 256 * len(texts))
+        )
+        
+        translations = {
+            int(match.group(1)): match.group(2).strip()
+            for match in re.finditer(r'\[\[(\d+)\]\]\s*(.*?)(?=\[\[\d+\]\]|\Z)', response, re.S)
+        }
+        missing = [i for i in range(1, len(texts) + 1) if not translations.get(i)]
+        if missing:
+            raise ValueError(f"无法解析批量翻译结果，缺少片段: {missing}")
+        
+        return [translations[i] for i in range(1, len(texts) + 1)]
+
+    def is_silence(self, audio: Union[AudioFrame, bytes]) -> bool:
         """
         检测音频是否为静音
         """
         try:
-            audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
-            audio_float = audio_array.astype(np.float32) / 32768.0
+            frame = AudioFrame.wrap(audio)
             
-            # 计算音频能量（RMS）
-            energy = np.sqrt(np.mean(audio_float ** 2))
+            # 音频能量（RMS，帧上缓存，后续阶段复用）
+            energy = frame.rms
             
             # 静音阈值（可调整）
             silence_threshold = 0.01
@@ -240,8 +512,6 @@ English translation:"""
         if not text:
             return text
         
-        import re
-        
         # 1. 检测字符级别的异常重复（如"课程"重复100次）
         def remove_excessive_repetition(s: str) -> str:
             # 检测2-10字的重复模式
@@ -281,7 +551,7 @@ English translation:"""
         
         return cleaned
     
-    def detect_speaker(self, audio_bytes: bytes, timestamp: float) -> tuple[str, float]:
+    def detect_speaker(self, frame: AudioFrame) -> tuple[str, float]:
         """
         检测说话人（使用声纹识别）
         
@@ -289,8 +559,10 @@ English translation:"""
             (说话人类型, 置信度)
         """
         try:
-            # 使用声纹识别服务
-            speaker_type, confidence = speaker_recognition_service.identify_speaker(audio_bytes)
+            # 使用声纹识别服务（复用帧上缓存的 float32 和能量）
+            speaker_type, confidence = speaker_recognition_service.identify_speaker(
+                frame, course=self.session_courses.get(frame.session_id)
+            )
             
             logger.debug(f"🎤 Speaker detected: {speaker_type} (confidence: {confidence:.2f})")
             return speaker_type, confidence
@@ -299,46 +571,151 @@ English translation:"""
             logger.error(f"Speaker detection failed: {e}")
             return "unknown", 0.0
 
-    async def transcribe_audio_with_whisper(self, audio_bytes: bytes) -> tuple[str, str, float]:
+    def diarize_speakers(self, frame: AudioFrame) -> List[Dict[str, Any]]:
+        """
+        块内说话人分离
+        
+        返回:
+            覆盖整个块的说话人轮次；失败时整块为 unknown
+        """
+        try:
+            return speaker_recognition_service.diarize(frame, course=self.session_courses.get(frame.session_id))
+        except Exception as e:
+            logger.error(f"Speaker diarization failed: {e}")
+            return [{"start": 0.0, "end": frame.duration, "speaker": "unknown", "confidence": 0.0, "speaker_match": None}]
+
+    def _build_decoding_tiers(self) -> List[DecodingTier]:
+        """
+        解码质量档位（从高到低）：束搜索 → 贪心 → 更小的模型（配置了 ADAPTIVE_FALLBACK_MODEL 时）
+        """
+        greedy = {"beam_size": 1, "best_of": 1, "condition_on_previous_text": False}
+        tiers = [
+            DecodingTier("beam", self.asr_engine, {
+                "beam_size": self.whisper_options["beam_size"],
+                "best_of": self.whisper_options["best_of"],
+                "condition_on_previous_text": self.whisper_options["condition_on_previous_text"],
+            }),
+            DecodingTier("greedy", self.asr_engine, greedy),
+        ]
+        if settings.ADAPTIVE_FALLBACK_MODEL:
+            fallback_engine = create_asr_engine(
+                settings.ASR_ENGINE,
+                settings.ADAPTIVE_FALLBACK_MODEL,
+                self.whisper_options,
+                device=settings.ASR_DEVICE or None,
+                compute_type=settings.ASR_COMPUTE_TYPE,
+                cpu_threads=settings.ASR_CPU_THREADS,
+                cache_dir=self._model_cache_dir(),
+            )
+            tiers.append(DecodingTier(f"greedy-{settings.ADAPTIVE_FALLBACK_MODEL}", fallback_engine, greedy))
+        return tiers
+
+    @staticmethod
+    def _model_cache_dir() -> Optional[str]:
+        return settings.MODEL_CACHE_DIR if settings.MODEL_MMAP_CACHE else None
+
+    def _tier_engines(self) -> List[Any]:
+        """各解码档位用到的 ASR 引擎（去重，保持档位顺序）"""
+        engines = []
+        for tier in self.decoding_policy.tiers:
+            if tier.engine not in engines:
+                engines.append(tier.engine)
+        return engines
+
+    def load_models(self) -> Dict[str, Any]:
+        """
+        加载所有解码档位用到的 ASR 引擎（由 model_loader 在后台线程中调用）；
+        使用工作进程池时改为启动各工作进程，由它们各自加载
+        """
+        engines = self._tier_engines()
+        if self.worker_pool is not None:
+            return {"engine": self.asr_engine.name, **self.worker_pool.start()}
+        for engine in engines:
+            if not engine.loaded:
+                engine.load()
+        return {
+            "engine": self.asr_engine.name,
+            "models": [engine.model_name for engine in engines],
+            "mmap_cache": settings.MODEL_MMAP_CACHE,
+        }
+
+    def _transcribe_batch(self, audios: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        批量转录（在调度器的线程池中执行），按自适应策略的当前档位选择引擎和解码参数
+        
+        返回:
+            与输入等长的结果列表，每项为 {"text": ..., "language": ..., "tier": 解码档位}
+        """
+        tier = self.decoding_policy.current
+        start = time.perf_counter()
+        if self.worker_pool is not None:
+            results = self.worker_pool.transcribe_batch(audios, tier.engine.model_name, tier.options)
+        else:
+            results = tier.engine.transcribe_batch(audios, tier.options)
+        self.decoding_policy.record_batch(
+            tier, sum(len(audio) for audio in audios) / SAMPLE_RATE, time.perf_counter() - start
+        )
+        return [{**result, "tier": tier.name} for result in results]
+
+    def _on_inference_batch(self, batch: Dict[str, float]):
+        """每个推理批次完成后，把端到端延迟和队列深度反馈给自适应解码策略"""
+        self.decoding_policy.observe(batch["max_queue_ms"] + batch["infer_ms"], batch["queue_depth"])
+
+    async def transcribe_audio_with_whisper(self, frame: AudioFrame) -> str:
         """
         使用 Whisper 转录音频（带专业术语提示）
         
         返回:
-            (转录文本, 说话人类型, 置信度)
+            清理后的转录文本（静音、噪声或失败时为空）
         """
         try:
-            # 将 PCM 字节转换为 numpy 数组
-            # 音频格式：16-bit PCM, 16kHz, mono
-            audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
-            
-            # 转换为 float32 并归一化到 [-1, 1]
-            audio_float = audio_array.astype(np.float32) / 32768.0
-            
-            # 构建初始提示（包含常用学术术语）
-            # Whisper 会参考这些词汇来提高准确度
-            initial_prompt = "这是一节课程。包含：" + "、".join(self.academic_terms[:20])
+            # Whisper 需要 16kHz 采样率（我们已经是 16kHz），使用帧上缓存的归一化 float32
+            # 有 VAD 结果时只拼接语音区间，超过 30 秒在停顿处分段
+            # 有块内说话人分离结果时先在说话人切换处切分，每段只属于一个说话人轮次
+            regions = frame.results.get("speech_regions")
+            spans = frame.results.get("speaker_spans") or []
+            if regions is None and len(spans) <= 1:
+                segments = [(0, frame.num_samples, frame.float32, 0 if spans else None)]
+            else:
+                gap = int(VAD_REGION_GAP_S * frame.sample_rate)
+                speech = regions if regions is not None else [(0, frame.num_samples)]
+                if len(spans) > 1:
+                    turns = [
+                        (int(span["start"] * frame.sample_rate), int(span["end"] * frame.sample_rate), i)
+                        for i, span in enumerate(spans)
+                    ]
+                    min_samples = int(settings.DIARIZATION_MIN_TURN_S * frame.sample_rate)
+                    runs = split_regions_by_turns(speech, turns, min_samples)
+                else:
+                    runs = [(0 if spans else None, speech)]
+                segments = [
+                    (group[0][0], group[-1][1], concatenate_regions(frame.float32, group, gap), turn)
+                    for turn, run in runs
+                    for group in group_regions(run, self.asr_engine.max_samples, gap)
+                ]
             
-            # Whisper 需要 16kHz 采样率（我们已经是 16kHz）
-            # 在线程池中运行 Whisper（避免阻塞事件循环）
-            result = await asyncio.to_thread(
-                self.whisper_model.transcribe,
-                audio_float,
-                language='zh',  # 强制中文模式（可识别中英混合）
-                task="transcribe",
-                fp16=False,  # 在 CPU 上运行
-                initial_prompt=initial_prompt,  # 提供专业术语提示
-                temperature=0.0,  # 降低温度，减少随机性
-                condition_on_previous_text=True,  # 使用上下文，提高连贯性
-                no_speech_threshold=0.6,  # 提高静音检测阈值
-                logprob_threshold=-1.0,  # 降低置信度阈值，减少幻觉
-                compression_ratio_threshold=2.4,  # 压缩率阈值，过滤重复内容
-                word_timestamps=False,  # 关闭单词时间戳，提高速度
-                beam_size=5,  # 使用束搜索，提高准确度
-                best_of=5  # 生成5个候选，选最好的
+            # 交给批量调度器，与其他会话的音频块合批推理（不阻塞事件循环）；
+            # 所有分段作为一个请求提交，整体接受或拒绝
+            results = await self.inference_scheduler.submit_many(
+                frame.session_id, [audio for _, _, audio, _ in segments]
             )
             
-            transcript = result["text"].strip()
-            detected_lang = result.get("language", "unknown")
+            # 保留每段在块内的时间（秒）和所属说话人轮次，用于转录时间对齐
+            frame.results["segments"] = [
+                {
+                    "start": start / frame.sample_rate,
+                    "end": end / frame.sample_rate,
+                    "text": result["text"].strip(),
+                    "speaker_turn": turn
+                }
+                for (start, end, _, turn), result in zip(segments, results)
+                if result["text"].strip()
+            ]
+            
+            transcript = self._join_texts([segment["text"] for segment in frame.results["segments"]])
+            detected_lang = results[0].get("language", "unknown") if results else "unknown"
+            if results:
+                frame.results["decoding_tier"] = results[-1].get("tier")
             
             # 清理转录文本（移除异常重复）
             transcript_cleaned = self.clean_transcription(transcript)
@@ -346,52 +723,40 @@ English translation:"""
             # 如果清理后为空，记录原始文本
             if not transcript_cleaned and transcript:
                 logger.warning(f"⚠️ Transcription cleaned to empty. Original: '{transcript}'")
-                return "", "unknown", 0.0
-            
-            # 检测说话人（使用声纹识别）
-            speaker_type, confidence = self.detect_speaker(audio_bytes, time.time())
+                return ""
             
             if transcript != transcript_cleaned:
                 logger.info(f"🧹 Cleaned transcription: '{transcript}' → '{transcript_cleaned}'")
-            logger.info(f"📝 Whisper transcription: '{transcript_cleaned}' (lang: {detected_lang}, speaker: {speaker_type}, confidence: {confidence:.2f})")
+            logger.info(f"📝 Whisper transcription: '{transcript_cleaned}' (lang: {detected_lang})")
             
-            return transcript_cleaned, speaker_type, confidence
+            return transcript_cleaned
             
+        except SchedulerQueueFull:
+            raise
         except Exception as e:
             logger.error(f"Whisper transcription failed: {e}")
             import traceback
             traceback.print_exc()
-            return "", "unknown", 0.0
+            return ""
 
-    async def transcribe_audio(self, audio_base64: str, session_id: str = None, ws_manager = None) -> Dict[str, Any]:
+    async def transcribe_audio(self, audio: Union[str, bytes, memoryview], session_id: str = None, ws_manager = None) -> List[Dict[str, Any]]:
         """
         使用 Whisper 进行真实的音频转录
+        
+        参数:
+            audio: Base64 编码的音频（JSON 协议），或原始 PCM 字节/视图（二进制协议，不复制）
+        
+        返回:
+            转录块列表：通常只有一个；开启块内说话人分离时每个说话人轮次一个块
         """
         try:
-            # 解码 Base64 音频数据
-            audio_bytes = base64.b64decode(audio_base64)
-            
-            # 先检测是否为静音，跳过静音块
-            if self.is_silence(audio_bytes):
-                logger.debug(f"⏭️ Skipping silence ({len(audio_bytes)} bytes)")
-                return {
-                    "id": str(uuid.uuid4()),
-                    "timestamp": int(time.time() * 1000),
-                    "originalText": "",
-                    "translatedText": "",
-                    "detectedLanguage": "unknown",
-                    "startTime": self._format_time(time.time()),
-                    "isFinal": False
-                }
+            frame = AudioFrame(self._decode_audio_payload(audio), session_id=session_id or "default")
             
-            logger.info(f"📤 Processing {len(audio_bytes)} bytes audio with Whisper...")
+            logger.info(f"📤 Processing {frame.nbytes} bytes audio with Whisper...")
 
-            # 使用 Whisper 转录 + 说话人识别
-            transcript_text, speaker_type, speaker_confidence = await self.transcribe_audio_with_whisper(audio_bytes)
-            
-            if not transcript_text:
-                logger.info("ℹ️ No transcription (silence or noise)")
-                return {
+            # 静音门 → Whisper 转录 → 说话人识别（静音或无文本时提前结束）
+            if not await self.pipeline.run(frame):
+                return [{
                     "id": str(uuid.uuid4()),
                     "timestamp": int(time.time() * 1000),
                     "originalText": "",
@@ -399,45 +764,53 @@ English translation:"""
                     "detectedLanguage": "unknown",
                     "startTime": self._format_time(time.time()),
                     "isFinal": False
-                }
-
-            # 检测语言（中英文）
-            detected_lang = self.detect_language(transcript_text)
-            logger.info(f"🌍 Detected language: {detected_lang}")
+                }]
 
             # 先返回原文（不等待翻译）
-            result = {
-                "id": str(uuid.uuid4()),
-                "timestamp": int(time.time() * 1000),
-                "originalText": transcript_text,
-                "translatedText": transcript_text if detected_lang == 'en' else "",  # 英文不翻译
-                "detectedLanguage": detected_lang,
-                "speaker": speaker_type,  # 说话人类型（professor/student/unknown）
-                "speakerConfidence": speaker_confidence,  # 识别置信度
-                "startTime": self._format_time(time.time()),
-                "isFinal": True
-            }
+            segments = frame.results.get("segments") or [{"start": 0.0, "end": frame.duration, "speaker_turn": None}]
+            turns = [list(group) for _, group in groupby(segments, key=lambda segment: segment.get("speaker_turn"))]
+            spans = frame.results.get("speaker_spans")
             
-            # 如果是中文，后台翻译（不阻塞）
-            if detected_lang == 'zh' and session_id and ws_manager:
-                logger.info(f"🔄 Starting background translation...")
-                # 启动后台翻译任务，翻译完成后推送更新
-                asyncio.create_task(
-                    self._translate_in_background(
-                        transcript_text, 
-                        result["id"], 
-                        session_id, 
-                        ws_manager
-                    )
+            blocks = []
+            for turn_segments in turns:
+                if len(turns) == 1:
+                    # 整块一个说话人
+                    text = frame.results["text"]
+                    speaker_type = frame.results["speaker"]
+                    speaker_confidence = frame.results["speaker_confidence"]
+                    speaker_match = frame.results.get("speaker_match")
+                else:
+                    text = self.clean_transcription(self._join_texts([segment["text"] for segment in turn_segments]))
+                    span = spans[turn_segments[0]["speaker_turn"]]
+                    speaker_type, speaker_confidence, speaker_match = span["speaker"], span["confidence"], span["speaker_match"]
+                if not text:
+                    continue
+                
+                block = self._build_final_block(
+                    text,
+                    speaker_type,
+                    speaker_confidence,
+                    start_time=frame.wall_time(turn_segments[0]["start"]),
+                    end_time=frame.wall_time(turn_segments[-1]["end"]),
+                    speaker_match=speaker_match,
+                    decoding_tier=frame.results.get("decoding_tier")
                 )
+                
+                # 如果是中文，后台翻译（不阻塞）
+                self._schedule_translation(block, session_id, ws_manager)
+                blocks.append(block)
             
-            return result
+            self._store_blocks(session_id, blocks)
+            return blocks
 
+        except SchedulerQueueFull:
+            # 过载：交给上层通知客户端
+            raise
         except Exception as e:
             logger.error(f"❌ Transcription error: {e}")
             import traceback
             traceback.print_exc()
-            return {
+            return [{
                 "id": str(uuid.uuid4()),
                 "timestamp": int(time.time() * 1000),
                 "originalText": f"[转录错误: {str(e)}]",
@@ -445,17 +818,314 @@ English translation:"""
                 "detectedLanguage": "unknown",
                 "startTime": self._format_time(time.time()),
                 "isFinal": False
-            }
+            }]
+
+    def _join_texts(self, texts: List[str]) -> str:
+        """拼接多段文本：英文单词之间补空格，中文直接相连"""
+        joined = ""
+        for text in texts:
+            if joined and joined[-1].isascii() and joined[-1].isalnum() and text[0].isascii() and text[0].isalnum():
+                joined += " "
+            joined += text
+        return joined
+
+    def _decode_audio_payload(self, audio: Union[str, bytes, memoryview]) -> Union[bytes, memoryview]:
+        """
+        Base64 字符串解码为 PCM 字节；二进制协议传入的字节/视图原样返回
+        """
+        if isinstance(audio, str):
+            return base64.b64decode(audio)
+        return audio
+
+    def _build_final_block(
+        self,
+        text: str,
+        speaker_type: str,
+        speaker_confidence: float,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        speaker_match: Optional[Dict[str, Any]] = None,
+        decoding_tier: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        构建最终转录块（检测语言，英文直接作为译文）
+        
+        参数:
+            start_time / end_time: 语音起止的墙上时间（秒），未知时使用当前时间
+            speaker_match: 注册表中匹配到的说话人记录（带上 ID 和名字）
+            decoding_tier: 生成该文本的解码档位（自适应解码）
+        """
+        # 检测语言（中英文）
+        detected_lang = self.detect_language(text)
+        logger.info(f"🌍 Detected language: {detected_lang}")
+        
+        start_time = start_time if start_time is not None else time.time()
+        block = {
+            "id": str(uuid.uuid4()),
+            "timestamp": int(start_time * 1000),
+            "originalText": text,
+            "translatedText": text if detected_lang == 'en' else "",  # 英文不翻译
+            "detectedLanguage": detected_lang,
+            "speaker": speaker_type,  # 说话人类型（professor/student/unknown）
+            "speakerConfidence": speaker_confidence,  # 识别置信度
+            "startTime": self._format_time(start_time),
+            "isFinal": True
+        }
+        if end_time is not None:
+            block["endTimestamp"] = int(end_time * 1000)
+        if speaker_match:
+            block["speakerId"] = speaker_match["id"]
+            block["speakerName"] = speaker_match["name"]
+        if decoding_tier:
+            block["decodingTier"] = decoding_tier
+        return block
+
+    def _store_blocks(self, session_id: Optional[str], blocks: List[Dict[str, Any]]):
+        """最终块追加到转录存储（临时结果不保存）"""
+        final_blocks = [block for block in blocks if block.get("isFinal") and block.get("originalText")]
+        if session_id and final_blocks:
+            transcript_store.append(session_id, final_blocks)
+
+    def _schedule_translation(self, block: Dict[str, Any], session_id: Optional[str], ws_manager):
+        """
+        中文块启动后台翻译任务，翻译完成后推送更新
+        """
+        if block["detectedLanguage"] == 'zh' and session_id and ws_manager:
+            logger.info(f"🔄 Starting background translation...")
+            asyncio.create_task(
+                self._translate_in_background(
+                    block["originalText"], 
+                    block["id"], 
+                    session_id, 
+                    ws_manager
+                )
+            )
+
+    def _get_streaming_session(self, session_id: str) -> StreamingSession:
+        """获取（或创建）会话的流式转录状态"""
+        stream = self.streaming_sessions.get(session_id)
+        if stream is None:
+            stream = StreamingSession(
+                session_id,
+                hop_s=settings.STREAMING_HOP_S,
+                max_window_s=settings.STREAMING_MAX_WINDOW_S,
+                pause_s=settings.STREAMING_PAUSE_S,
+                latency_target_ms=settings.STREAMING_LATENCY_TARGET_MS,
+            )
+            self.streaming_sessions[session_id] = stream
+        return stream
+
+    async def transcribe_audio_streaming(self, audio: Union[str, bytes, memoryview], session_id: str, ws_manager = None) -> List[Dict[str, Any]]:
+        """
+        流式转录模式：音频追加到会话的滚动缓冲区，每个 hop 重解码一次
+        
+        返回:
+            本次产生的转录块列表（isFinal=True 为已提交文本，isFinal=False 为临时结果）
+        """
+        frame = AudioFrame(self._decode_audio_payload(audio), session_id=session_id)
+        
+        stream = self._get_streaming_session(session_id)
+        blocks: List[Dict[str, Any]] = []
+        
+        # 按 hop 切片追加：客户端一次发来较长音频时，每个 hop 仍解码一次并检查停顿
+        samples = frame.float32
+        offset = 0
+        while offset < len(samples):
+            # 切到下一个 hop 边界（过载跳过解码时未清零的计数也按 hop 对齐，不会退化为逐样本）
+            step = stream.hop_samples - stream.samples_since_decode % stream.hop_samples
+            piece = samples[offset:offset + step]
+            # 缓冲区写满时放不下的部分留到下一轮（提交并清空之后）；
+            # 记录每段的墙上时间，提交的块按音频时间而不是提交时间打时间戳
+            offset += len(piece) - len(stream.append(piece, start_time=frame.wall_time(offset / frame.sample_rate)))
+            
+            at_pause = stream.ends_with_pause()
+            if stream.should_decode() or stream.is_full() or (at_pause and stream.samples_since_decode):
+                blocks.extend(await self._decode_streaming(stream, session_id, ws_manager))
+            
+            # 停顿或缓冲区写满：整体提交，开始新的一句
+            if stream.is_full() or at_pause:
+                blocks.extend(await self._flush_streaming(stream, session_id, ws_manager))
+        
+        self._store_blocks(session_id, blocks)
+        return blocks
+
+    async def _decode_streaming(self, stream: StreamingSession, session_id: str, ws_manager) -> List[Dict[str, Any]]:
+        """重解码滚动缓冲区，返回新提交的块和临时块"""
+        frame = AudioFrame.from_float32(stream.window(), session_id=session_id)
+        if self.is_silence(frame):
+            # 整个缓冲区都是静音，不送入 Whisper（避免幻觉）
+            stream.samples_since_decode = 0
+            return []
+        
+        try:
+            # 同一会话的消息串行处理，解码期间缓冲区不会被改写，可直接传视图
+            result = await self.inference_scheduler.submit(session_id, frame.float32)
+        except SchedulerQueueFull:
+            # 过载时跳过本次 hop，下次带着更多音频重试
+            return []
+        
+        hypothesis = result["text"].strip()
+        update = stream.update(hypothesis)
+        
+        blocks = []
+        if update["commit"]:
+            # 只在有提交时识别说话人，且只用提交文本对应的那段音频
+            block = self._commit_streaming_text(
+                update["commit"],
+                session_id,
+                ws_manager,
+                await self._detect_speaker_in_span(stream, update["span"], session_id),
+                span_times=tuple(stream.wall_time(sample) for sample in update["span"]),
+                decoding_tier=result.get("tier")
+            )
+            if block:
+                blocks.append(block)
+        
+        blocks.append({
+            "id": stream.partial_id,
+            "timestamp": int(time.time() * 1000),
+            "originalText": update["partial"],
+            "translatedText": "",
+            "detectedLanguage": self.detect_language(update["partial"]),
+            "startTime": self._format_time(time.time()),
+            "isFinal": False,
+            "decodingTier": result.get("tier")
+        })
+        return blocks
+
+    async def _detect_speaker_in_span(self, stream: StreamingSession, span: tuple, session_id: str) -> tuple:
+        """
+        在线程池中识别缓冲区某一段音频的说话人
+
+        返回:
+            (说话人类型, 置信度, 匹配到的说话人记录)
+        """
+        start, end = span
+        if end <= start:
+            # 估计的区间为空（文本比例与音频不符），退回整个缓冲区
+            start, end = 0, stream.length
+        frame = AudioFrame.from_float32(stream.window()[start:end], session_id=session_id)
+        speaker_type, speaker_confidence = await asyncio.get_running_loop().run_in_executor(
+            self.speaker_executor, self.detect_speaker, frame
+        )
+        return speaker_type, speaker_confidence, frame.results.get("speaker_match")
+
+    def _commit_streaming_text(
+        self,
+        text: str,
+        session_id: str,
+        ws_manager,
+        speaker: tuple,
+        span_times: Optional[tuple] = None,
+        decoding_tier: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        将稳定文本提交为最终块
+        
+        参数:
+            speaker: (说话人类型, 置信度, 匹配到的说话人记录)，由调用方在线程池中识别
+            span_times: 提交文本对应音频的 (开始, 结束) 墙上时间（秒），用于时间戳和字幕时间轴
+        """
+        text = self.clean_transcription(text)
+        if not text:
+            return None
+        
+        speaker_type, speaker_confidence, speaker_match = speaker
+        start_time, end_time = span_times or (None, None)
+        block = self._build_final_block(
+            text,
+            speaker_type,
+            speaker_confidence,
+            start_time=start_time,
+            end_time=end_time,
+            speaker_match=speaker_match,
+            decoding_tier=decoding_tier
+        )
+        self._schedule_translation(block, session_id, ws_manager)
+        logger.info(f"📝 Streaming commit ({session_id}): '{text}'")
+        return block
+
+    async def _flush_streaming(self, stream: StreamingSession, session_id: str, ws_manager) -> List[Dict[str, Any]]:
+        """提交缓冲区内剩余的假设并清空，同时清除客户端的临时结果"""
+        partial_id = stream.partial_id
+        had_hypothesis = bool(stream.previous_hypothesis)
+        
+        blocks = []
+        if had_hypothesis and self.clean_transcription(stream.pending_text()):
+            block = self._commit_streaming_text(
+                stream.pending_text(),
+                session_id,
+                ws_manager,
+                await self._detect_speaker_in_span(stream, stream.pending_span(), session_id),
+                span_times=tuple(stream.wall_time(sample) for sample in stream.pending_span())
+            )
+            if block:
+                blocks.append(block)
+        stream.flush()
+        
+        if had_hypothesis:
+            blocks.append({
+                "id": partial_id,
+                "timestamp": int(time.time() * 1000),
+                "originalText": "",
+                "translatedText": "",
+                "detectedLanguage": "unknown",
+                "startTime": self._format_time(time.time()),
+                "isFinal": False
+            })
+        return blocks
+
+    async def finish_streaming_session(self, session_id: str, ws_manager = None) -> List[Dict[str, Any]]:
+        """
+        结束会话的流式转录：提交剩余文本并释放缓冲区
+        """
+        stream = self.streaming_sessions.pop(session_id, None)
+        if stream is None:
+            return []
+        
+        blocks = await self._flush_streaming(stream, session_id, ws_manager)
+        self._store_blocks(session_id, blocks)
+        logger.info(f"⏱️ Streaming latency for {session_id}: {stream.get_stats()}")
+        return blocks
+
+    def get_streaming_stats(self, session_id: str) -> Optional[Dict[str, float]]:
+        """获取会话的流式转录延迟统计"""
+        stream = self.streaming_sessions.get(session_id)
+        return stream.get_stats() if stream else None
 
     async def _translate_in_background(self, text: str, block_id: str, session_id: str, ws_manager):
         """
         后台翻译（不阻塞主流程），完成后推送更新
+
+        ws_manager.send_message 发布到会话总线，翻译可以在不持有该连接的节点上完成
         """
         try:
-            translation = await self.translate_to_english(text, 'zh')
+            async def send_delta(delta: str):
+                # 译文增量（长片段流式翻译时逐段推送）
+                await ws_manager.send_message(session_id, {
+                    "type": "translation_delta",
+                    "data": {
+                        "id": block_id,
+                        "delta": delta
+                    }
+                })
+            
+            # 查缓存；未命中时长片段流式翻译，短片段与同一时间窗口内的其他片段合并请求
+            translation = await self.translate_to_english(text, 'zh', on_delta=send_delta)
+            if translation is None:
+                # 失败：不保存（也就不会进入检索索引），清除客户端已收到的流式增量
+                await ws_manager.send_message(session_id, {
+                    "type": "translation_update",
+                    "data": {
+                        "id": block_id,
+                        "translatedText": ""
+                    }
+                })
+                return
             logger.info(f"✅ Background translation complete for {block_id}: {translation}")
+            transcript_store.add_translation(session_id, block_id, translation)
             
-            # 通过 WebSocket 推送翻译更新
+            # 经会话总线推送翻译更新（送到持有该 WebSocket 的节点）
             await ws_manager.send_message(session_id, {
                 "type": "translation_update",
                 "data": {
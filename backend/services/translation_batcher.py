@@ -0,0 +1,149 @@
+"""
+翻译批处理 - 将短时间窗口内待翻译的片段合并为一次 Gemini 请求
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationBatcher:
+    """
+    翻译微批处理器
+    功能：
+    1. 收集等待窗口内的待翻译片段（跨一个或多个会话）
+    2. 达到最大条数/最大字符数或等待超时后，合并为一个请求
+    3. 批量请求失败（或响应无法解析）时回退为逐条请求
+    4. 多个批次可并发发送（有上限）
+    """
+
+    def __init__(
+        self,
+        translate_one: Callable[[str], Awaitable[str]],
+        translate_many: Callable[[List[str]], Awaitable[List[str]]],
+        max_batch_size: int = 8,
+        max_wait_ms: int = 300,
+        max_batch_chars: int = 4000,
+        max_concurrent_batches: int = 4,
+    ):
+        """
+        参数:
+            translate_one: 单条翻译（回退路径），失败时抛出异常
+            translate_many: 批量翻译，返回等长结果；无法解析时应抛出异常
+        """
+        self.translate_one = translate_one
+        self.translate_many = translate_many
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self.max_batch_chars = max_batch_chars
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._pending_chars = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.stats = {"batches": 0, "segments": 0, "fallbacks": 0}
+
+    def _ensure_worker(self):
+        """在当前事件循环中启动批处理协程（首次提交时懒启动）"""
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._run())
+
+    async def translate(self, text: str) -> str:
+        """提交一个片段并等待其译文"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future, time.monotonic()))
+        self._pending_chars += len(text)
+        self._wakeup.set()
+        return await future
+
+    def _batch_ready(self) -> bool:
+        return len(self._pending) >= self.max_batch_size or self._pending_chars >= self.max_batch_chars
+
+    def _take_batch(self) -> List[Tuple[str, asyncio.Future, float]]:
+        """按条数和字符数上限取出一个批次（至少一条）"""
+        batch, chars = [], 0
+        while self._pending and len(batch) < self.max_batch_size:
+            text = self._pending[0][0]
+            if batch and chars + len(text) > self.max_batch_chars:
+                break
+            batch.append(self._pending.pop(0))
+            chars += len(text)
+        self._pending_chars -= chars
+        return batch
+
+    async def _run(self):
+        """批处理主循环"""
+        while True:
+            try:
+                if not self._pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                # 等待批次凑满，或最早的片段等待超时
+                deadline = self._pending[0][2] + self.max_wait
+                while not self._batch_ready():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+
+                batch = [entry for entry in self._take_batch() if not entry[1].done()]
+                if not batch:
+                    continue
+
+                await self._slots.acquire()
+                asyncio.create_task(self._dispatch(batch))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Translation batcher loop error: {e}")
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        """发送一个批次并分发结果"""
+        texts = [entry[0] for entry in batch]
+        try:
+            if len(texts) == 1:
+                results = [await self.translate_one(texts[0])]
+            else:
+                try:
+                    results = await self.translate_many(texts)
+                    logger.info(f"📦 Batched translation: {len(texts)} segments in one request")
+                except Exception as e:
+                    # 批量失败或解析失败：回退为逐条请求
+                    logger.warning(f"⚠️ Batched translation failed, falling back to single requests: {e}")
+                    self.stats["fallbacks"] += 1
+                    results = await asyncio.gather(
+                        *[self.translate_one(text) for text in texts],
+                        return_exceptions=True
+                    )
+
+            self.stats["batches"] += 1
+            self.stats["segments"] += len(texts)
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
@@ -0,0 +1,169 @@
+"""
+翻译缓存 - 进程内 LRU + SQLite 持久化两级缓存
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """归一化原文（NFKC、去首尾空白、合并连续空白），作为缓存键的一部分"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class TranslationCache:
+    """
+    两级翻译缓存
+    功能：
+    1. 键 = 归一化原文 + 模型名 + 提示词版本（模型或提示词变化后自动失效）
+    2. 第一级：进程内 LRU（条目数上限）
+    3. 第二级：SQLite（WAL 模式），重启后仍然有效；磁盘读写在线程池中执行
+    4. 命中/未命中计数
+    """
+
+    def __init__(self, db_path: str, model: str, prompt_version: str, max_entries: int = 10000):
+        self.db_path = db_path
+        self.model = model
+        self.prompt_version = prompt_version
+        self.max_entries = max(1, max_entries)
+
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库（调用方持有锁）"""
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS translations (
+                    key TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            self._db.commit()
+        return self._db
+
+    def make_key(self, text: str) -> str:
+        raw = "\0".join((normalize_text(text), self.model, self.prompt_version))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, translation: str):
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT translation FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _disk_put_many(self, rows: Iterable[Tuple[str, str, str]]):
+        with self._lock:
+            db = self._connect()
+            db.executemany(
+                "INSERT OR REPLACE INTO translations (key, source, translation, model, prompt_version, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, source, translation, self.model, self.prompt_version, time.time())
+                 for key, source, translation in rows],
+            )
+            db.commit()
+
+    async def get(self, text: str) -> Optional[str]:
+        """查询缓存（先内存后磁盘，磁盘命中回填内存）"""
+        key = self.make_key(text)
+        translation = self._memory.get(key)
+        if translation is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return translation
+
+        try:
+            translation = await asyncio.to_thread(self._disk_get, key)
+        except sqlite3.Error as e:
+            logger.error(f"❌ Translation cache read failed: {e}")
+            translation = None
+
+        if translation is not None:
+            self.stats["disk_hits"] += 1
+            self._remember(key, translation)
+            return translation
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, text: str, translation: str):
+        """写入两级缓存"""
+        await self.put_many([(text, translation)])
+
+    async def put_many(self, pairs: Iterable[Tuple[str, str]]):
+        """批量写入两级缓存（用于预热）"""
+        rows = []
+        for text, translation in pairs:
+            key = self.make_key(text)
+            self._remember(key, translation)
+            rows.append((key, normalize_text(text), translation))
+        if not rows:
+            return
+        try:
+            await asyncio.to_thread(self._disk_put_many, rows)
+            self.stats["writes"] += len(rows)
+        except sqlite3.Error as e:
+            logger.error(f"❌ Translation cache write failed: {e}")
+
+    def _disk_clear(self) -> int:
+        with self._lock:
+            db = self._connect()
+            deleted = db.execute("DELETE FROM translations").rowcount
+            db.commit()
+        return deleted
+
+    async def clear(self) -> int:
+        """清空两级缓存，返回删除的持久化条目数"""
+        self._memory.clear()
+        return await asyncio.to_thread(self._disk_clear)
+
+    def _disk_count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    async def get_stats(self) -> Dict[str, float]:
+        """缓存统计"""
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": await asyncio.to_thread(self._disk_count),
+            "model": self.model,
+            "prompt_version": self.prompt_version,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,171 @@
+"""
+语音活动检测（VAD）- 帧级能量 + 过零率，向量化实现
+"""
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# (起始样本, 结束样本)，左闭右开
+Region = Tuple[int, int]
+
+
+class VoiceActivityDetector:
+    """
+    帧级语音活动检测
+    功能：
+    1. 按 20-30ms 分帧，向量化计算每帧能量（RMS）和过零率
+    2. 能量超过阈值判为语音；能量略低但过零率高（清辅音）也判为语音
+    3. 挂起（hangover）平滑：语音帧前后各延伸若干帧，过短的语音段丢弃
+    4. 输出语音区间，过长区间在最安静的帧处切分
+    """
+
+    def __init__(
+        self,
+        frame_ms: int = 30,
+        energy_threshold: float = 0.01,
+        zcr_threshold: float = 0.25,
+        hangover_ms: int = 300,
+        preroll_ms: int = 90,
+        min_speech_ms: int = 120,
+        sample_rate: int = SAMPLE_RATE,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.energy_threshold = energy_threshold
+        self.zcr_threshold = zcr_threshold
+        self.hangover_frames = max(0, hangover_ms // frame_ms)
+        self.preroll_frames = max(0, preroll_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+
+        # 统计：处理的总样本数 / 判为语音的样本数
+        self.total_samples = 0
+        self.speech_samples = 0
+
+    def frame_features(self, samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        每帧的能量（RMS）和过零率
+
+        不足一帧的尾部样本补零参与计算
+        """
+        n_frames = -(-len(samples) // self.frame_size)
+        padded = np.zeros(n_frames * self.frame_size, dtype=np.float32)
+        padded[:len(samples)] = samples
+        frames = padded.reshape(n_frames, self.frame_size)
+
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_size - 1)
+        return rms, zcr
+
+    def detect(self, samples: np.ndarray) -> np.ndarray:
+        """
+        帧级语音掩码（bool，每帧一个值）
+        """
+        if len(samples) == 0:
+            return np.zeros(0, dtype=bool)
+
+        rms, zcr = self.frame_features(samples)
+        raw = (rms >= self.energy_threshold) | (
+            (rms >= self.energy_threshold * 0.5) & (zcr >= self.zcr_threshold)
+        )
+
+        # 丢弃过短的语音段（咳嗽、敲击等）
+        raw = self._drop_short_runs(raw, self.min_speech_frames)
+
+        # 挂起平滑：每个语音帧向前延伸 preroll 帧，向后延伸 hangover 帧
+        kernel = np.ones(self.preroll_frames + self.hangover_frames + 1)
+        smoothed = np.convolve(raw.astype(np.float32), kernel, mode="full")
+        start = self.preroll_frames
+        mask = smoothed[start:start + len(raw)] > 0
+        return mask
+
+    @staticmethod
+    def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """掩码中连续 True 段的起止帧（左闭右开）"""
+        edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    def _drop_short_runs(self, mask: np.ndarray, min_frames: int) -> np.ndarray:
+        starts, ends = self._runs(mask)
+        mask = mask.copy()
+        for start, end in zip(starts, ends):
+            if end - start < min_frames:
+                mask[start:end] = False
+        return mask
+
+    def speech_regions(self, samples: np.ndarray, mask: np.ndarray, max_region_s: float = 28.0) -> List[Region]:
+        """
+        由帧掩码得到语音区间（样本坐标），超过 max_region_s 的区间在最安静的帧处切分
+        """
+        starts, ends = self._runs(mask)
+        regions: List[Region] = []
+        max_frames = max(1, int(max_region_s * self.sample_rate) // self.frame_size)
+
+        rms = None
+        for start, end in zip(starts, ends):
+            while end - start > max_frames:
+                if rms is None:
+                    rms, _ = self.frame_features(samples)
+                # 在窗口后半段找最安静的帧切分，避免切出过短的片段
+                search_from = start + max_frames // 2
+                cut = search_from + int(np.argmin(rms[search_from:start + max_frames]))
+                regions.append((start, cut))
+                start = cut
+            regions.append((start, end))
+
+        total = len(samples)
+        regions = [
+            (int(start) * self.frame_size, min(int(end) * self.frame_size, total))
+            for start, end in regions
+        ]
+
+        self.total_samples += total
+        self.speech_samples += sum(end - start for start, end in regions)
+        return regions
+
+    def get_stats(self) -> Dict[str, float]:
+        """VAD 统计（speech_ratio 越低，节省的 Whisper 计算越多）"""
+        return {
+            "total_s": self.total_samples / self.sample_rate,
+            "speech_s": self.speech_samples / self.sample_rate,
+            "speech_ratio": self.speech_samples / self.total_samples if self.total_samples else 0.0,
+        }
+
+
+def group_regions(regions: List[Region], max_samples: int, gap_samples: int) -> List[List[Region]]:
+    """
+    将语音区间分组，每组拼接（含组内间隔）后不超过 max_samples
+
+    用于把长音频在停顿处切成若干段，每段各自送入 Whisper
+    """
+    groups: List[List[Region]] = []
+    current: List[Region] = []
+    current_len = 0
+    for start, end in regions:
+        length = end - start
+        extra = length + (gap_samples if current else 0)
+        if current and current_len + extra > max_samples:
+            groups.append(current)
+            current, current_len = [], 0
+            extra = length
+        current.append((start, end))
+        current_len += extra
+    if current:
+        groups.append(current)
+    return groups
+
+
+def concatenate_regions(samples: np.ndarray, regions: List[Region], gap_samples: int) -> np.ndarray:
+    """拼接语音区间，区间之间插入 gap_samples 个静音样本"""
+    total = sum(end - start for start, end in regions) + gap_samples * (len(regions) - 1)
+    out = np.zeros(total, dtype=np.float32)
+    offset = 0
+    for start, end in regions:
+        out[offset:offset + end - start] = samples[start:end]
+        offset += end - start + gap_samples
+    return out
@@ -0,0 +1,181 @@
+"""
+测试 Gemini HTTP 客户端的重试（429/5xx、Retry-After、带抖动的退避）和 SSE 流解析
+
+使用 aiohttp 本地测试服务器，不访问 Gemini API
+"""
+import asyncio
+import json
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from services import gemini_client
+from services.gemini_client import GeminiAPIError, GeminiClient
+
+
+def _serve(handler, scenario):
+    """在本地测试服务器上运行 scenario(client, url)，返回其结果和服务端收到的请求数"""
+    hits = []
+
+    async def counted(request):
+        hits.append(await request.json())
+        return await handler(request, len(hits))
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/generate", counted)
+        server = TestServer(app)
+        await server.start_server()
+        client = GeminiClient(max_retries=3, retry_base_delay=0.01, retry_max_delay=0.05)
+        try:
+            return await scenario(client, str(server.make_url("/generate")))
+        finally:
+            await client.close()
+            await server.close()
+
+    return asyncio.run(run()), hits
+
+
+def _respond_after_failures(statuses, body, headers=None):
+    """前几次请求依次返回 statuses 中的错误状态，之后返回 body"""
+    async def handler(request, hit):
+        if hit <= len(statuses):
+            return web.Response(status=statuses[hit - 1], text="busy", headers=headers)
+        return web.json_response(body)
+    return handler
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_post_json_retries_retryable_status(status):
+    handler = _respond_after_failures([status, status], {"ok": True})
+
+    result, hits = _serve(handler, lambda client, url: client.post_json(url, {"q": 1}))
+
+    assert result == {"ok": True}
+    assert hits == [{"q": 1}] * 3
+
+
+def test_post_json_gives_up_after_max_retries():
+    handler = _respond_after_failures([503] * 10, {"ok": True})
+
+    async def scenario(client, url):
+        with pytest.raises(GeminiAPIError) as info:
+            await client.post_json(url, {})
+        return info.value
+
+    error, hits = _serve(handler, scenario)
+
+    assert error.status == 503
+    assert error.message == "busy"
+    assert len(hits) == 4  # 首次请求 + 3 次重试
+
+
+def test_post_json_does_not_retry_client_errors():
+    handler = _respond_after_failures([400], {"ok": True})
+
+    async def scenario(client, url):
+        with pytest.raises(GeminiAPIError) as info:
+            await client.post_json(url, {})
+        return info.value
+
+    error, hits = _serve(handler, scenario)
+
+    assert error.status == 400
+    assert len(hits) == 1
+
+
+def test_retry_delays_use_full_jitter(monkeypatch):
+    """每次重试在 [0, min(上限, 基数 * 2^n)] 内随机等待"""
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high
+
+    monkeypatch.setattr(gemini_client.random, "uniform", uniform)
+    handler = _respond_after_failures([500, 502, 504], {"ok": True})
+
+    result, _ = _serve(handler, lambda client, url: client.post_json(url, {}))
+
+    assert result == {"ok": True}
+    assert bounds == [(0, 0.01), (0, 0.02), (0, 0.04)]
+    # 超过上限后不再增长
+    assert GeminiClient(retry_base_delay=0.5, retry_max_delay=8.0)._backoff_delay(10) <= 8.0
+
+
+def test_retry_after_header_overrides_jitter(monkeypatch):
+    monkeypatch.setattr(gemini_client.random, "uniform", lambda low, high: pytest.fail("jitter used"))
+    client = GeminiClient(retry_max_delay=5.0)
+
+    assert client._backoff_delay(0, "2") == 2.0
+    assert client._backoff_delay(0, "120") == 5.0  # 不超过上限
+
+    handler = _respond_after_failures([429], {"ok": True}, headers={"Retry-After": "0"})
+    result, hits = _serve(handler, lambda client, url: client.post_json(url, {}))
+
+    assert result == {"ok": True}
+    assert len(hits) == 2
+
+
+def test_invalid_retry_after_falls_back_to_jitter():
+    client = GeminiClient(retry_base_delay=0.5, retry_max_delay=8.0)
+
+    assert 0 <= client._backoff_delay(1, "Wed, 21 Oct 2015 07:28:00 GMT") <= 1.0
+
+
+# ---------- SSE ----------
+
+EVENTS = [{"text": "你好"}, {"text": "world", "done": False}, {"text": "", "done": True}]
+
+
+def _sse_handler(failures=0, abort_after=None):
+    """返回 SSE 流：事件之间夹杂空行和注释行；abort_after 个事件后断开连接"""
+    async def handler(request, hit):
+        if hit <= failures:
+            return web.Response(status=503, text="overloaded")
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": keep-alive\n\n")
+        for i, event in enumerate(EVENTS):
+            if abort_after is not None and i == abort_after:
+                request.transport.close()
+                return response
+            await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode())
+        await response.write_eof()
+        return response
+    return handler
+
+
+async def _collect(client, url):
+    return [event async for event in client.stream_sse(url, {"stream": True})]
+
+
+def test_stream_sse_parses_data_lines():
+    events, hits = _serve(_sse_handler(), _collect)
+
+    assert events == EVENTS
+    assert len(hits) == 1
+
+
+def test_stream_sse_retries_before_first_event():
+    events, hits = _serve(_sse_handler(failures=2), _collect)
+
+    assert events == EVENTS
+    assert len(hits) == 3
+
+
+def test_stream_sse_does_not_retry_after_first_event():
+    """已经产出事件后断开：直接抛出，不重新请求（避免重复内容）"""
+    received = []
+
+    async def scenario(client, url):
+        with pytest.raises(aiohttp.ClientError):
+            async for event in client.stream_sse(url, {}):
+                received.append(event)
+
+    _, hits = _serve(_sse_handler(abort_after=1), scenario)
+
+    assert received == EVENTS[:1]
+    assert len(hits) == 1
@@ -0,0 +1,244 @@
+"""
+测试录音分片上传（MultipartRecordingUpload）和上传接口的 S3 失败回退
+
+使用内存中的 S3 桩客户端，不需要 AWS 凭证
+"""
+import asyncio
+import io
+import json
+import os
+
+import pytest
+from starlette.datastructures import UploadFile
+
+import api.recording as recording_api
+from services import recording_upload
+from services.recording_catalog import RecordingCatalog
+from services.recording_store import S3RecordingStore
+from services.recording_upload import STATE_SUFFIX, MultipartRecordingUpload
+
+PART_SIZE = 1024
+
+
+class StubS3Client:
+    """内存中的 S3 分片上传桩（只实现上传用到的接口）"""
+
+    def __init__(self, fail_parts=(), fail_create=False):
+        self.fail_parts = set(fail_parts)
+        self.fail_create = fail_create
+        self.uploads = {}  # UploadId -> {分片号: 数据}
+        self.objects = {}  # Key -> 合并后的数据
+        self.uploaded_parts = []
+        self.aborted = []
+
+    def create_multipart_upload(self, Bucket, Key, ContentType, Metadata):
+        if self.fail_create:
+            raise ConnectionError("S3 unreachable")
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber in self.fail_parts:
+            raise ConnectionError(f"part {PartNumber} failed")
+        self.uploads[UploadId][PartNumber] = Body
+        self.uploaded_parts.append(PartNumber)
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        assert numbers == sorted(parts), "合并的分片与已上传的分片不一致"
+        self.objects[Key] = b"".join(parts[n] for n in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(UploadId)
+
+
+@pytest.fixture(autouse=True)
+def small_parts(monkeypatch):
+    """把最小分片调小，测试数据不必超过 5MB"""
+    monkeypatch.setattr(recording_upload, "MIN_PART_SIZE", PART_SIZE)
+
+
+def _new_upload(tmp_path, client, **kwargs):
+    return MultipartRecordingUpload(
+        str(tmp_path / "recording.wav"), client, bucket="bucket", key="recordings/recording.wav",
+        part_size=PART_SIZE, **kwargs
+    )
+
+
+async def _write_all(upload, data, chunk_size=300):
+    await upload.open()
+    for i in range(0, len(data), chunk_size):
+        await upload.write(data[i:i + chunk_size])
+    await upload.complete()
+
+
+def test_write_splits_into_parts(tmp_path):
+    """按分片大小切分上传，最后一片可以更小，合并后与本地文件一致"""
+    client = StubS3Client()
+    upload = _new_upload(tmp_path, client, max_inflight=2)
+    data = os.urandom(PART_SIZE * 3 + 100)
+
+    asyncio.run(_write_all(upload, data))
+
+    assert upload.uses_s3
+    assert sorted(client.uploaded_parts) == [1, 2, 3, 4]
+    assert client.objects["recordings/recording.wav"] == data
+    assert (tmp_path / "recording.wav").read_bytes() == data
+    assert not os.path.exists(upload.state_path)
+
+
+def test_empty_recording_uploads_one_part(tmp_path):
+    client = StubS3Client()
+    upload = _new_upload(tmp_path, client)
+
+    asyncio.run(_write_all(upload, b""))
+
+    assert client.uploaded_parts == [1]
+    assert client.objects["recordings/recording.wav"] == b""
+
+
+def test_part_failure_aborts_and_keeps_local_file(tmp_path):
+    """分片失败时取消 S3 分片上传、删除状态文件，本地文件完整保留"""
+    client = StubS3Client(fail_parts={2})
+    upload = _new_upload(tmp_path, client, max_inflight=1)
+    data = os.urandom(PART_SIZE * 3 + 100)
+
+    asyncio.run(_write_all(upload, data))
+
+    assert not upload.uses_s3
+    assert isinstance(upload.s3_error, ConnectionError)
+    assert client.aborted == ["upload-1"]
+    assert client.objects == {}
+    assert (tmp_path / "recording.wav").read_bytes() == data
+    assert not os.path.exists(upload.state_path)
+
+
+def test_abort_removes_local_file(tmp_path):
+    client = StubS3Client()
+    upload = _new_upload(tmp_path, client)
+
+    async def run():
+        await upload.open()
+        await upload.write(os.urandom(PART_SIZE + 10))
+        await upload.abort()
+
+    asyncio.run(run())
+
+    assert client.aborted == ["upload-1"]
+    assert not (tmp_path / "recording.wav").exists()
+    assert not os.path.exists(upload.state_path)
+
+
+def _write_state(tmp_path, client, data, parts, local_complete=True):
+    """模拟进程中断：本地文件和状态文件已写入，S3 上已有部分分片"""
+    filepath = tmp_path / "recording.wav"
+    filepath.write_bytes(data)
+    upload_id = client.create_multipart_upload(
+        Bucket="bucket", Key="recordings/recording.wav", ContentType="audio/wav", Metadata={}
+    )["UploadId"]
+    for n in parts:
+        client.upload_part(
+            Bucket="bucket", Key="recordings/recording.wav", UploadId=upload_id,
+            PartNumber=n, Body=data[(n - 1) * PART_SIZE:n * PART_SIZE]
+        )
+    client.uploaded_parts.clear()
+    state_path = str(filepath) + STATE_SUFFIX
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "bucket": "bucket",
+            "key": "recordings/recording.wav",
+            "upload_id": upload_id,
+            "part_size": PART_SIZE,
+            "local_complete": local_complete,
+            "parts": {str(n): f'"etag-{n}"' for n in parts},
+        }, f)
+    return state_path
+
+
+def test_resume_uploads_only_missing_parts(tmp_path):
+    client = StubS3Client()
+    data = os.urandom(PART_SIZE * 3 + 100)
+    state_path = _write_state(tmp_path, client, data, parts=[1, 3])
+
+    assert asyncio.run(MultipartRecordingUpload.resume(state_path, client))
+
+    assert sorted(client.uploaded_parts) == [2, 4]
+    assert client.objects["recordings/recording.wav"] == data
+    assert not os.path.exists(state_path)
+
+
+def test_resume_pending_uploads_scans_directory(tmp_path):
+    client = StubS3Client()
+    data = os.urandom(PART_SIZE * 2)
+    _write_state(tmp_path, client, data, parts=[1])
+
+    assert asyncio.run(recording_upload.resume_pending_uploads(str(tmp_path), client)) == 1
+    assert client.objects["recordings/recording.wav"] == data
+
+
+def test_resume_discards_incomplete_local_file(tmp_path):
+    """本地文件没写完就中断：删除残缺文件并取消分片上传"""
+    client = StubS3Client()
+    state_path = _write_state(tmp_path, client, os.urandom(PART_SIZE + 10), parts=[1], local_complete=False)
+
+    assert not asyncio.run(MultipartRecordingUpload.resume(state_path, client))
+
+    assert client.aborted == ["upload-1"]
+    assert not (tmp_path / "recording.wav").exists()
+    assert not os.path.exists(state_path)
+
+
+# ---------- 上传接口 ----------
+
+@pytest.fixture
+def recording_env(tmp_path, monkeypatch):
+    """上传接口使用临时目录和临时录音目录，不启动后台转码"""
+    catalog = RecordingCatalog(str(tmp_path / "catalog.db"))
+    monkeypatch.setattr(recording_api, "RECORDINGS_DIR", str(tmp_path))
+    monkeypatch.setattr(recording_api, "recording_catalog", catalog)
+    monkeypatch.setattr(recording_api, "_run_in_background", lambda coro: coro.close())
+    monkeypatch.setattr(recording_api.settings, "RECORDING_UPLOAD_PART_MB", 0)
+    yield catalog
+    catalog.close()
+
+
+def _upload_request(data):
+    return recording_api.upload_recording(UploadFile(io.BytesIO(data), filename="audio.wav"), "session-1")
+
+
+@pytest.mark.parametrize("failure", [{"fail_create": True}, {"fail_parts": {1}}])
+def test_upload_falls_back_to_local_when_s3_fails(failure, recording_env, tmp_path, monkeypatch):
+    """S3 发起上传或分片失败：本地文件作为录音，熔断器记一次失败"""
+    client = StubS3Client(**failure)
+    store = S3RecordingStore(client, "bucket")
+    monkeypatch.setattr(recording_api, "s3_store", store)
+    data = os.urandom(PART_SIZE * 2 + 10)
+
+    response = asyncio.run(_upload_request(data))
+
+    assert response.success
+    assert response.message.endswith("(本地)")
+    assert response.downloadUrl == f"/api/recording/download/{response.filename}"
+    assert (tmp_path / response.filename).read_bytes() == data
+    assert store.breaker.get_stats()["consecutive_failures"] == 1
+
+    entry = asyncio.run(recording_env.get(response.filename))
+    assert entry["storage"] == "local"
+    assert entry["formats"]["wav"] == {"size": len(data), "local": True, "s3": False}
+
+
+def test_upload_to_s3(recording_env, tmp_path, monkeypatch):
+    client = StubS3Client()
+    monkeypatch.setattr(recording_api, "s3_store", S3RecordingStore(client, "bucket"))
+    monkeypatch.setattr(client, "generate_presigned_url", lambda **kwargs: "https://s3.example/presigned", raising=False)
+    data = os.urandom(PART_SIZE * 2 + 10)
+
+    response = asyncio.run(_upload_request(data))
+
+    assert response.message.endswith("(S3)")
+    assert client.objects[f"recordings/{response.filename}"] == data
+    assert (tmp_path / response.filename).read_bytes() == data
@@ -0,0 +1,142 @@
+"""
+测试跨节点会话总线（RedisSessionBus）：两个总线实例共用一个 fakeredis 客户端，
+模拟持有 WebSocket 的节点和发布事件的节点
+"""
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from services.session_bus import RedisSessionBus
+
+PREFIX = "test:session:"
+
+
+async def _wait_for(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+def _run_with_buses(scenario):
+    """创建共用一个 fakeredis 客户端的两个总线，运行 scenario(client, ws_node, worker_node)"""
+    async def run():
+        client = fakeredis.FakeAsyncRedis()
+        ws_node = RedisSessionBus("redis://fake", PREFIX, client=client)
+        worker_node = RedisSessionBus("redis://fake", PREFIX, client=client)
+        try:
+            await scenario(client, ws_node, worker_node)
+        finally:
+            await ws_node.close()
+            await worker_node.close()
+
+    asyncio.run(run())
+
+
+def test_publish_reaches_subscriber_on_other_node():
+    async def scenario(client, ws_node, worker_node):
+        received = []
+
+        async def handler(message):
+            received.append(message)
+
+        await ws_node.subscribe("s1", handler)
+        await _wait_for(lambda: ws_node._pubsub.subscribed)
+
+        messages = [{"type": "transcription", "data": {"id": str(i), "text": "你好"}} for i in range(5)]
+        for message in messages:
+            await worker_node.publish("s1", message)
+
+        assert await _wait_for(lambda: len(received) == len(messages))
+        assert received == messages  # 按发布顺序送达
+        assert worker_node.stats["published"] == 5
+        assert ws_node.stats["delivered"] == 5
+
+    _run_with_buses(scenario)
+
+
+def test_publish_to_local_session_skips_redis():
+    async def scenario(client, ws_node, worker_node):
+        received = []
+
+        async def handler(message):
+            received.append(message)
+
+        await ws_node.subscribe("s1", handler)
+        await ws_node.publish("s1", {"type": "status"})
+
+        # 本地直接投递，已经送达
+        assert received == [{"type": "status"}]
+        await asyncio.sleep(0.1)
+        assert received == [{"type": "status"}]
+
+    _run_with_buses(scenario)
+
+
+def test_sessions_are_isolated():
+    async def scenario(client, ws_node, worker_node):
+        received = {"s1": [], "s2": []}
+
+        async def handler_s1(message):
+            received["s1"].append(message)
+
+        async def handler_s2(message):
+            received["s2"].append(message)
+
+        await ws_node.subscribe("s1", handler_s1)
+        await worker_node.subscribe("s2", handler_s2)
+
+        await worker_node.publish("s1", {"to": "s1"})
+        await ws_node.publish("s2", {"to": "s2"})
+
+        assert await _wait_for(lambda: received["s1"] and received["s2"])
+        assert received == {"s1": [{"to": "s1"}], "s2": [{"to": "s2"}]}
+
+    _run_with_buses(scenario)
+
+
+def test_unsubscribe_stops_delivery():
+    async def scenario(client, ws_node, worker_node):
+        received = []
+
+        async def handler(message):
+            received.append(message)
+
+        await ws_node.subscribe("s1", handler)
+        await worker_node.publish("s1", {"n": 1})
+        assert await _wait_for(lambda: len(received) == 1)
+
+        await ws_node.unsubscribe("s1")
+        assert await client.pubsub_numsub(PREFIX + "s1") == [(f"{PREFIX}s1".encode(), 0)]
+
+        await worker_node.publish("s1", {"n": 2})
+        await asyncio.sleep(0.2)
+        assert received == [{"n": 1}]
+        assert ws_node.get_stats()["local_sessions"] == 0
+
+    _run_with_buses(scenario)
+
+
+def test_failing_handler_does_not_stop_reader():
+    async def scenario(client, ws_node, worker_node):
+        received = []
+
+        async def broken(message):
+            raise RuntimeError("socket closed")
+
+        async def handler(message):
+            received.append(message)
+
+        await ws_node.subscribe("s1", broken)
+        await ws_node.subscribe("s2", handler)
+        await worker_node.publish("s1", {"n": 1})
+        await worker_node.publish("s2", {"n": 2})
+
+        assert await _wait_for(lambda: received == [{"n": 2}])
+        assert ws_node.stats["errors"] == 1
+
+    _run_with_buses(scenario)
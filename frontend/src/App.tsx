@@ -6,15 +6,17 @@ import { TranscriptPanel } from './components/Transcript/TranscriptPanel';
 import { TabsPanel } from './components/AITools/TabsPanel';
 import { BottomControls } from './components/Layout/BottomControls';
 import { VoiceRegistration } from './components/Speaker/VoiceRegistration';
+import type { ExportFormat } from './types';
 
 function App() {
-  const { connectionStatus, connect, disconnect, sendAudioChunk, transcripts } = useWebSocket();
-  const { isRecording, startRecording, stopRecording, error } = useAudioRecorder();
+  const { connectionStatus, connect, disconnect, sendAudioChunk, transcripts, recording, serverRecording } = useWebSocket();
+  const { isRecording, startRecording, stopRecording, setKeepLocalCopy, error } = useAudioRecorder();
   const [sessionId] = useState(() => `session_${Date.now()}`);
   const [duration, setDuration] = useState(0);
   const [notes, setNotes] = useState('');
   const [showVoiceRegistration, setShowVoiceRegistration] = useState(false);
   const [savedRecordingUrl, setSavedRecordingUrl] = useState<string | null>(null);
+  const [recordingStartedAt, setRecordingStartedAt] = useState<number | null>(null);
 
   // 录音时长计时器
   useEffect(() => {
@@ -31,6 +33,18 @@ function App() {
     };
   }, [isRecording]);
 
+  // 服务端确认录音后客户端不再保存整段录音
+  useEffect(() => {
+    setKeepLocalCopy(serverRecording !== true);
+  }, [serverRecording, setKeepLocalCopy]);
+
+  // 录音由服务端在会话结束时写出，拿到下载地址即可
+  useEffect(() => {
+    if (recording) {
+      setSavedRecordingUrl(recording.downloadUrl);
+    }
+  }, [recording]);
+
   const handleStartRecording = async () => {
     try {
       // 连接 WebSocket
@@ -39,7 +53,8 @@ function App() {
       // 等待连接建立
       await new Promise(resolve => setTimeout(resolve, 1000));
 
-      // 开始录音
+      // 开始录音（记下开始时间，作为导出字幕的时间轴零点）
+      setRecordingStartedAt((prev) => prev ?? Date.now());
       await startRecording((audioData, timestamp) => {
         sendAudioChunk(audioData, timestamp);
       });
@@ -49,10 +64,11 @@ function App() {
   };
 
   const handleStopRecording = async () => {
+    // 先发出最后一段音频，再通知服务端结束（录音下载地址随 "stopped" 消息返回）
     const audioBlob = stopRecording();
     disconnect();
-    
-    // 如果有录音，上传到后端
+
+    // 服务端录音未开启或不可用时，上传客户端保存的录音
     if (audioBlob) {
       try {
         const formData = new FormData();
@@ -76,24 +92,26 @@ function App() {
     }
   };
 
-  const handleExport = async (format: 'markdown' | 'text') => {
+  const handleExport = async (format: ExportFormat) => {
     try {
-      const response = await fetch(`http://localhost:8000/api/export/${format}`, {
-        method: 'POST',
+      // 笔记单独保存，下载请求里只带会话 ID
+      const response = await fetch(`http://localhost:8000/api/notes/${encodeURIComponent(sessionId)}`, {
+        method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ transcripts, notes })
+        body: JSON.stringify({ notes })
       });
-      
-      const data = await response.json();
-      
-      // 下载文件
-      const blob = new Blob([data.content], { type: 'text/plain;charset=utf-8' });
-      const url = URL.createObjectURL(blob);
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+
+      // 直接导航到下载地址，浏览器边下载边写盘（不在内存中缓冲整个文件）；字幕时间轴从录音开始算起
+      const params = new URLSearchParams({ session_id: sessionId });
+      if (recordingStartedAt !== null) {
+        params.set('origin_ms', String(recordingStartedAt));
+      }
       const a = document.createElement('a');
-      a.href = url;
-      a.download = data.filename;
+      a.href = `http://localhost:8000/api/export/${format}?${params}`;
       a.click();
-      URL.revokeObjectURL(url);
     } catch (err) {
       console.error('Export failed:', err);
     }
@@ -1,7 +1,7 @@
 /**
  * 底部控制条组件
  */
-import type { ConnectionStatus } from '../../types';
+import type { ConnectionStatus, ExportFormat } from '../../types';
 
 interface BottomControlsProps {
   isRecording: boolean;
@@ -9,7 +9,7 @@ interface BottomControlsProps {
   onStartRecording: () => void;
   onStopRecording: () => void;
   duration: number;
-  onExport: (format: 'markdown' | 'text') => void;
+  onExport: (format: ExportFormat) => void;
   recordingUrl?: string | null;
 }
 
@@ -121,6 +121,27 @@ export const BottomControls = ({
             >
               📝 Text
             </button>
+            <button
+              onClick={() => onExport('srt')}
+              className="px-3 py-1.5 text-xs font-medium text-gray-700 bg-white border border-gray-300 rounded-lg hover:bg-gray-50 transition-colors"
+              title="导出为 SRT 字幕"
+            >
+              🎬 SRT
+            </button>
+            <button
+              onClick={() => onExport('vtt')}
+              className="px-3 py-1.5 text-xs font-medium text-gray-700 bg-white border border-gray-300 rounded-lg hover:bg-gray-50 transition-colors"
+              title="导出为 WebVTT 字幕"
+            >
+              🎬 VTT
+            </button>
+            <button
+              onClick={() => onExport('jsonl')}
+              className="px-3 py-1.5 text-xs font-medium text-gray-700 bg-white border border-gray-300 rounded-lg hover:bg-gray-50 transition-colors"
+              title="导出为 JSONL（每行一个转录块）"
+            >
+              🧾 JSONL
+            </button>
             {/* 下载录音按钮 */}
             {recordingUrl && (
               <button
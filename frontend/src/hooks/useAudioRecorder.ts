@@ -7,29 +7,67 @@ interface UseAudioRecorderReturn {
   isRecording: boolean;
   startRecording: (onAudioData: (base64Data: string, timestamp: number) => void) => Promise<void>;
   stopRecording: () => Blob | null;
+  setKeepLocalCopy: (keep: boolean) => void;
   error: string | null;
-  recordingBlob: Blob | null;
 }
 
+// 发送间隔（毫秒）：流式模式下服务端按 hop（约 1 秒）解码并自行检测停顿断句
+const SEND_INTERVAL_MS = 1000;
+
 export const useAudioRecorder = (): UseAudioRecorderReturn => {
   const [isRecording, setIsRecording] = useState(false);
   const [error, setError] = useState<string | null>(null);
-  const [recordingBlob, setRecordingBlob] = useState<Blob | null>(null);
   
   const mediaStreamRef = useRef<MediaStream | null>(null);
   const audioContextRef = useRef<AudioContext | null>(null);
   const processorRef = useRef<ScriptProcessorNode | null>(null);
   const audioBufferRef = useRef<Int16Array[]>([]);
-  const allAudioDataRef = useRef<Int16Array[]>([]); // 保存完整录音
+  const allAudioDataRef = useRef<Int16Array[]>([]); // 本地完整录音（服务端不录音时上传）
+  const keepLocalCopyRef = useRef<boolean>(true);
+  const onAudioDataRef = useRef<((base64Data: string, timestamp: number) => void) | null>(null);
   const lastSendTimeRef = useRef<number>(0);
-  const silenceCountRef = useRef<number>(0); // 连续静音帧计数
-  const isFirstChunkRef = useRef<boolean>(true); // 是否是第一次发送
+
+  // 服务端确认录音后丢弃本地副本并不再保存；服务端录音不可用时保留，结束后由客户端上传
+  const setKeepLocalCopy = useCallback((keep: boolean) => {
+    keepLocalCopyRef.current = keep;
+    if (!keep) {
+      allAudioDataRef.current = [];
+    }
+  }, []);
+
+  // 把缓冲区中的音频合并为一段发送
+  const flushBuffer = useCallback((timestamp: number) => {
+    if (audioBufferRef.current.length === 0 || !onAudioDataRef.current) return;
+
+    // 合并所有缓冲的音频数据
+    const totalLength = audioBufferRef.current.reduce((sum, arr) => sum + arr.length, 0);
+    const mergedData = new Int16Array(totalLength);
+    let offset = 0;
+    for (const chunk of audioBufferRef.current) {
+      mergedData.set(chunk, offset);
+      offset += chunk.length;
+    }
+
+    // 转换为 Base64（分块处理避免栈溢出）
+    const uint8Data = new Uint8Array(mergedData.buffer);
+    let base64 = '';
+    const chunkSize = 8192; // 每次处理 8KB
+    for (let i = 0; i < uint8Data.length; i += chunkSize) {
+      const chunk = uint8Data.subarray(i, Math.min(i + chunkSize, uint8Data.length));
+      base64 += String.fromCharCode.apply(null, Array.from(chunk));
+    }
+    base64 = btoa(base64);
+
+    onAudioDataRef.current(base64, timestamp);
+    audioBufferRef.current = [];
+  }, []);
 
   const startRecording = useCallback(async (
     onAudioData: (base64Data: string, timestamp: number) => void
   ) => {
     try {
       setError(null);
+      onAudioDataRef.current = onAudioData;
 
       // 1. 请求麦克风权限
       const stream = await navigator.mediaDevices.getUserMedia({
@@ -69,21 +107,8 @@ export const useAudioRecorder = (): UseAudioRecorderReturn => {
 
         // 累积音频数据
         audioBufferRef.current.push(int16Data);
-        allAudioDataRef.current.push(int16Data); // 同时保存到完整录音
-
-        // 计算当前帧的音频能量（用于静音检测）
-        let sumSquare = 0;
-        for (let i = 0; i < float32Data.length; i++) {
-          sumSquare += float32Data[i] * float32Data[i];
-        }
-        const rms = Math.sqrt(sumSquare / float32Data.length);
-        const isSilent = rms < 0.01; // 静音阈值
-
-        // 更新静音计数
-        if (isSilent) {
-          silenceCountRef.current++;
-        } else {
-          silenceCountRef.current = 0;
+        if (keepLocalCopyRef.current) {
+          allAudioDataRef.current.push(int16Data);
         }
 
         const now = Date.now();
@@ -92,50 +117,11 @@ export const useAudioRecorder = (): UseAudioRecorderReturn => {
         if (lastSendTimeRef.current === 0) {
           lastSendTimeRef.current = now;
         }
-        
-        const timeSinceLastSend = now - lastSendTimeRef.current;
-        const bufferDuration = audioBufferRef.current.length * 4096 / 16000; // 秒
-
-        // 智能发送策略：
-        // 第一次：3秒快速发送（避免初始延迟）
-        // 后续：5-10秒智能断句
-        const shouldSend = isFirstChunkRef.current
-          ? timeSinceLastSend >= 3000 // 第一次：3秒快速发送
-          : (
-              (timeSinceLastSend >= 5000 && silenceCountRef.current >= 10) || // 5秒后遇到停顿
-              timeSinceLastSend >= 10000 // 最长10秒
-            );
-
-        if (shouldSend && audioBufferRef.current.length > 0) {
-          // 合并所有缓冲的音频数据
-          const totalLength = audioBufferRef.current.reduce((sum, arr) => sum + arr.length, 0);
-          const mergedData = new Int16Array(totalLength);
-          let offset = 0;
-          for (const chunk of audioBufferRef.current) {
-            mergedData.set(chunk, offset);
-            offset += chunk.length;
-          }
-
-          // 转换为 Base64（分块处理避免栈溢出）
-          const uint8Data = new Uint8Array(mergedData.buffer);
-          let base64 = '';
-          const chunkSize = 8192; // 每次处理 8KB
-          for (let i = 0; i < uint8Data.length; i += chunkSize) {
-            const chunk = uint8Data.subarray(i, Math.min(i + chunkSize, uint8Data.length));
-            base64 += String.fromCharCode.apply(null, Array.from(chunk));
-          }
-          base64 = btoa(base64);
-
-          // 发送音频数据
-          const chunkType = isFirstChunkRef.current ? '[FIRST]' : '[NORMAL]';
-          console.log(`📤 Sending ${bufferDuration.toFixed(1)}s audio ${chunkType} (silence: ${isSilent})`);
-          onAudioData(base64, now);
-
-          // 清空缓冲区和静音计数
-          audioBufferRef.current = [];
-          silenceCountRef.current = 0;
+
+        // 约每秒发送一次（断句由服务端的停顿检测完成）
+        if (now - lastSendTimeRef.current >= SEND_INTERVAL_MS) {
+          flushBuffer(now);
           lastSendTimeRef.current = now;
-          isFirstChunkRef.current = false; // 标记为非首次
         }
       };
 
@@ -151,16 +137,18 @@ export const useAudioRecorder = (): UseAudioRecorderReturn => {
       setError(errorMessage);
       console.error('录音错误:', err);
     }
-  }, []);
+  }, [flushBuffer]);
 
   const stopRecording = useCallback(() => {
     console.log('🛑 Stopping recording...');
     
-    // 生成完整的录音文件（WAV格式）
+    // 发送最后一段未满的音频，服务端录音才完整
+    flushBuffer(Date.now());
+    onAudioDataRef.current = null;
+
+    // 服务端没有录音时生成本地录音文件（WAV 格式）
     let audioBlob: Blob | null = null;
-    
     if (allAudioDataRef.current.length > 0) {
-      // 合并所有音频数据
       const totalLength = allAudioDataRef.current.reduce((sum, arr) => sum + arr.length, 0);
       const mergedData = new Int16Array(totalLength);
       let offset = 0;
@@ -168,19 +156,14 @@ export const useAudioRecorder = (): UseAudioRecorderReturn => {
         mergedData.set(chunk, offset);
         offset += chunk.length;
       }
-      
-      // 创建 WAV 文件
       audioBlob = createWavBlob(mergedData, 16000, 1);
-      setRecordingBlob(audioBlob);
-      console.log(`📼 Recording saved: ${(audioBlob.size / 1024 / 1024).toFixed(2)} MB`);
+      console.log(`📼 Local recording saved: ${(audioBlob.size / 1024 / 1024).toFixed(2)} MB`);
     }
     
     // 清空音频缓冲区
     audioBufferRef.current = [];
     allAudioDataRef.current = [];
     lastSendTimeRef.current = 0;
-    silenceCountRef.current = 0;
-    isFirstChunkRef.current = true; // 重置首次标记
 
     // 断开音频处理器（必须先断开，再停止轨道）
     if (processorRef.current) {
@@ -208,16 +191,16 @@ export const useAudioRecorder = (): UseAudioRecorderReturn => {
 
     setIsRecording(false);
     console.log('✅ Recording stopped successfully');
-    
+
     return audioBlob;
-  }, []);
+  }, [flushBuffer]);
 
   return {
     isRecording,
     startRecording,
     stopRecording,
-    error,
-    recordingBlob
+    setKeepLocalCopy,
+    error
   };
 };
 
@@ -2,9 +2,19 @@
  * WebSocket Hook - 管理 WebSocket 连接
  */
 import { useState, useEffect, useCallback, useRef } from 'react';
-import type { ConnectionStatus, TranscriptBlock } from '../types';
+import type { ConnectionStatus, RecordingInfo, TranscriptBlock } from '../types';
 
 const WS_URL = 'ws://localhost:8000/ws/transcribe';
+const API_URL = 'http://localhost:8000';
+
+// 流式转录：服务端每秒重解码并推送临时结果，稳定的前缀提交为最终结果
+const TRANSCRIBE_MODE = 'streaming';
+
+// 发送 stop 后等待服务端写完录音（"stopped" 消息）的最长时间
+const STOP_TIMEOUT_MS = 5000;
+
+// 断线重连期间最多暂存的音频段数（约每秒一段），重连后补发，服务端录音和转录不缺这一段
+const MAX_PENDING_CHUNKS = 300;
 
 interface UseWebSocketReturn {
   connectionStatus: ConnectionStatus;
@@ -12,14 +22,69 @@ interface UseWebSocketReturn {
   disconnect: () => void;
   sendAudioChunk: (audioData: string, timestamp: number) => void;
   transcripts: TranscriptBlock[];
+  recording: RecordingInfo | null;
+  serverRecording: boolean | null;
 }
 
 export const useWebSocket = (): UseWebSocketReturn => {
   const [connectionStatus, setConnectionStatus] = useState<ConnectionStatus>('disconnected');
   const [transcripts, setTranscripts] = useState<TranscriptBlock[]>([]);
+  const [recording, setRecording] = useState<RecordingInfo | null>(null);
+  // 服务端是否在录音（连接就绪前为 null）
+  const [serverRecording, setServerRecording] = useState<boolean | null>(null);
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectAttempts = useRef(0);
   const maxReconnectAttempts = 5;
+  const transcriptsRef = useRef<TranscriptBlock[]>([]);
+  const pendingChunksRef = useRef<string[]>([]);
+
+  useEffect(() => {
+    transcriptsRef.current = transcripts;
+  }, [transcripts]);
+
+  // 重连后从服务端转录存储补齐断线期间错过的最终结果和译文
+  const backfill = useCallback(async (sessionId: string) => {
+    const finals = transcriptsRef.current.filter(t => t.isFinal);
+    // 从第一个还没有译文的中文块之前开始取，这样断线期间完成的翻译也能补上
+    const untranslated = finals.findIndex(t => t.detectedLanguage === 'zh' && !t.translatedText);
+    const anchor = untranslated > 0
+      ? finals[untranslated - 1]
+      : untranslated === 0 ? undefined : finals[finals.length - 1];
+
+    const fetched: TranscriptBlock[] = [];
+    let after: string | null | undefined = anchor?.id;
+    try {
+      do {
+        const params = new URLSearchParams(after ? { after } : {});
+        const response = await fetch(`${API_URL}/api/transcripts/${sessionId}?${params}`);
+        if (!response.ok) break;
+        const data = await response.json();
+        fetched.push(...data.blocks);
+        after = data.nextAfter;
+      } while (after);
+    } catch (error) {
+      console.warn('Failed to backfill transcripts:', error);
+      return;
+    }
+    if (fetched.length === 0) return;
+
+    setTranscripts((prev) => {
+      const byId = new Map(fetched.map(b => [b.id, b]));
+      // 已有的块补上译文，缺少的块插到临时结果之前
+      const merged = prev.map(t => {
+        const stored = byId.get(t.id);
+        return stored?.translatedText && !t.translatedText
+          ? { ...t, translatedText: stored.translatedText }
+          : t;
+      });
+      const known = new Set(prev.map(t => t.id));
+      const missing = fetched.filter(b => !known.has(b.id));
+      const finalsMerged = merged.filter(t => t.isFinal);
+      const partials = merged.filter(t => !t.isFinal);
+      return [...finalsMerged, ...missing, ...partials];
+    });
+    console.log(`🔄 Backfilled ${fetched.length} transcript blocks`);
+  }, []);
 
   const connect = useCallback((sessionId: string = 'default') => {
     if (wsRef.current?.readyState === WebSocket.OPEN) {
@@ -28,11 +93,19 @@ export const useWebSocket = (): UseWebSocketReturn => {
     }
 
     setConnectionStatus('connecting');
-    const ws = new WebSocket(`${WS_URL}?session_id=${sessionId}`);
+    const ws = new WebSocket(`${WS_URL}?session_id=${sessionId}&mode=${TRANSCRIBE_MODE}`);
 
     ws.onopen = () => {
       console.log('✅ WebSocket connected');
       setConnectionStatus('connected');
+      if (reconnectAttempts.current > 0) {
+        backfill(sessionId);
+      }
+      // 补发断线期间的音频
+      for (const chunk of pendingChunksRef.current) {
+        ws.send(chunk);
+      }
+      pendingChunksRef.current = [];
       reconnectAttempts.current = 0;
     };
 
@@ -42,7 +115,25 @@ export const useWebSocket = (): UseWebSocketReturn => {
         console.log('Received message:', message);
 
         if (message.type === 'transcript' && message.data) {
-          setTranscripts((prev) => [...prev, message.data]);
+          const block: TranscriptBlock = message.data;
+          setTranscripts((prev) => {
+            // 流式模式：同 ID 的临时结果被替换，临时结果始终排在最终结果之后
+            const finals = prev.filter(t => t.isFinal && t.id !== block.id);
+            const partials = prev.filter(t => !t.isFinal && t.id !== block.id);
+            if (block.isFinal) {
+              return [...finals, block, ...partials];
+            }
+            return block.originalText ? [...finals, ...partials, block] : [...finals, ...partials];
+          });
+        } else if (message.type === 'translation_delta' && message.data) {
+          // 流式翻译增量：追加到已有译文
+          setTranscripts((prev) =>
+            prev.map(t =>
+              t.id === message.data.id
+                ? { ...t, translatedText: (t.translatedText || '') + message.data.delta }
+                : t
+            )
+          );
         } else if (message.type === 'translation_update' && message.data) {
           // 更新翻译结果
           console.log('📝 Translation update received:', message.data);
@@ -53,6 +144,15 @@ export const useWebSocket = (): UseWebSocketReturn => {
                 : t
             )
           );
+        } else if (message.type === 'status' && typeof message.serverRecording === 'boolean') {
+          setServerRecording(message.serverRecording);
+        } else if (message.type === 'stopped') {
+          // 服务端已写完本次会话的录音
+          if (message.recording) {
+            setRecording(message.recording);
+            console.log('📼 Recording saved:', message.recording.downloadUrl);
+          }
+          ws.close();
         } else if (message.type === 'error') {
           console.error('Server error:', message.message);
         } else if (message.type === 'ping') {
@@ -85,37 +185,43 @@ export const useWebSocket = (): UseWebSocketReturn => {
     };
 
     wsRef.current = ws;
-  }, []);
+  }, [backfill]);
 
   const disconnect = useCallback(() => {
     if (wsRef.current) {
       reconnectAttempts.current = maxReconnectAttempts; // 阻止自动重连
       
-      // 发送停止信号给后端
-      if (wsRef.current.readyState === WebSocket.OPEN) {
-        wsRef.current.send(JSON.stringify({ type: 'stop' }));
+      const ws = wsRef.current;
+      wsRef.current = null;
+      pendingChunksRef.current = [];
+
+      // 发送停止信号给后端；收到 "stopped"（录音已写完）后关闭，超时则直接关闭
+      if (ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({ type: 'stop' }));
         console.log('📤 Sent stop signal to server');
+        setTimeout(() => ws.close(), STOP_TIMEOUT_MS);
+      } else {
+        ws.close();
       }
       
-      // 延迟关闭，确保停止信号发送成功
-      setTimeout(() => {
-        if (wsRef.current) {
-          wsRef.current.close();
-          wsRef.current = null;
-        }
-      }, 100);
-      
       setConnectionStatus('disconnected');
     }
   }, []);
 
   const sendAudioChunk = useCallback((audioData: string, timestamp: number) => {
+    const chunk = JSON.stringify({
+      type: 'audio_chunk',
+      data: audioData,
+      timestamp
+    });
     if (wsRef.current?.readyState === WebSocket.OPEN) {
-      wsRef.current.send(JSON.stringify({
-        type: 'audio_chunk',
-        data: audioData,
-        timestamp
-      }));
+      wsRef.current.send(chunk);
+    } else if (wsRef.current && reconnectAttempts.current < maxReconnectAttempts) {
+      // 正在重连：暂存，连接恢复后补发
+      pendingChunksRef.current.push(chunk);
+      if (pendingChunksRef.current.length > MAX_PENDING_CHUNKS) {
+        pendingChunksRef.current.shift();
+      }
     } else {
       console.warn('WebSocket is not connected');
     }
@@ -133,7 +239,9 @@ export const useWebSocket = (): UseWebSocketReturn => {
     connect,
     disconnect,
     sendAudioChunk,
-    transcripts
+    transcripts,
+    recording,
+    serverRecording
   };
 };
 
@@ -10,10 +10,24 @@ export interface TranscriptBlock {
   detectedLanguage: string;
   speaker?: string;  // 说话人类型 (professor/student/unknown)
   speakerConfidence?: number;  // 识别置信度 (0-1)
+  speakerId?: string;  // 注册表中匹配到的说话人 ID
+  speakerName?: string;  // 注册表中匹配到的说话人名字
+  decodingTier?: string;  // 生成该文本的解码档位（beam/greedy/...，负载高时自动降档）
   startTime: string;
   isFinal: boolean;
 }
 
+// 转录导出格式（/api/export/{format}）
+export type ExportFormat = 'markdown' | 'text' | 'srt' | 'vtt' | 'jsonl';
+
+// 服务端录制完成的录音（WebSocket "stopped" 消息）
+export interface RecordingInfo {
+  filename: string;
+  downloadUrl: string;
+  size: number;
+  duration: number;
+}
+
 export type ConnectionStatus = 'connected' | 'connecting' | 'disconnected';
 
 export type ViewMode = 'original' | 'translated' | 'bilingual';